@@ -0,0 +1,179 @@
+import errno
+import os
+import threading
+from pathlib import Path
+
+
+# 落盘策略：
+#   FSYNC_NONE   不主动落盘，由系统择机写回；程序崩溃时输出仍是完整的旧文件或新文件，断电时新文件可能丢失
+#   FSYNC_BATCH  批量任务结束时统一落盘，见 SyncBatch
+#   FSYNC_FILE   每个文件替换前落盘，替换后再落盘所在目录，断电也不会丢失已完成的文件
+FSYNC_NONE: str = "none"
+FSYNC_BATCH: str = "batch"
+FSYNC_FILE: str = "file"
+FSYNC_POLICIES: tuple[str, ...] = (FSYNC_NONE, FSYNC_BATCH, FSYNC_FILE)
+TEMP_SUFFIX: str = ".part"
+
+
+def temp_path(path: Path) -> Path:
+    """
+    写入 path 时使用的临时文件，与目标文件在同一目录下，替换时不需要跨文件系统复制
+    """
+    return path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}{TEMP_SUFFIX}")
+
+
+def remove_stale(path: Path) -> None:
+    """
+    删除写入 path 时崩溃残留的临时文件
+    """
+    for temp in path.parent.glob(f".{path.name}.*{TEMP_SUFFIX}"):
+        temp.unlink(missing_ok=True)
+
+
+def fsync_dir(path: Path) -> None:
+    """
+    落盘目录，使其中新建、替换的文件名在断电后仍然有效；不支持打开目录的系统（Windows）上忽略
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def preallocate(fd: int, size: int) -> None:
+    """
+    预先为文件分配 size 字节的空间，减少碎片，空间不足时在写入前就失败
+    不支持预分配的系统或文件系统上忽略
+    """
+    if size <= 0 or not hasattr(os, "posix_fallocate"):
+        return
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except OSError as e:
+        if e.errno == errno.ENOSPC:
+            raise
+
+
+class SyncBatch:
+    """
+    FSYNC_BATCH 策略下记录批量任务写出的文件，任务结束时统一落盘
+
+    多个文件一起落盘时系统可以合并写回，比每个文件单独落盘快得多；
+    代价是任务结束前断电时，已替换的文件可能丢失。
+    """
+
+    def __init__(self):
+        self._paths: set[Path] = set()
+        self._lock: threading.Lock = threading.Lock()
+
+    def add(self, path: Path) -> None:
+        with self._lock:
+            self._paths.add(path)
+
+    def sync(self) -> None:
+        """
+        落盘记录的所有文件及其所在目录，已被删除的文件忽略
+        """
+        with self._lock:
+            paths, self._paths = self._paths, set()
+        for path in paths:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        for directory in {path.parent for path in paths}:
+            fsync_dir(directory)
+
+
+class AtomicWriter:
+    """
+    流式写入同目录下的临时文件，写完后原子地替换目标文件
+
+    目标文件要么是旧内容，要么是完整的新内容，中途崩溃或出错不会留下写了一半的文件；
+    数据只写一次，替换是重命名而不是复制。用法：
+
+        with AtomicWriter(path, size) as f:
+            for data in chunks:
+                f.write(data)
+
+    with 块正常结束时替换目标文件，抛出异常或调用 abort 时删除临时文件、保留目标文件。
+    """
+
+    def __init__(self, path: str | Path, size: int | None = None, fsync: str = FSYNC_FILE,
+                 batch: SyncBatch | None = None):
+        """
+        Args:
+            path: 目标文件路径，所在文件夹必须已存在
+            size: 预计写入的字节数，已知时预先分配空间
+            fsync: 落盘策略，FSYNC_NONE、FSYNC_BATCH 或 FSYNC_FILE
+            batch: FSYNC_BATCH 策略下登记写出的文件，为 None 时不落盘
+        """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"未知的落盘策略：{fsync}")
+        self.path: Path = Path(path)
+        self.temp: Path = temp_path(self.path)
+        self.size: int | None = size
+        self.fsync: str = fsync
+        self.batch: SyncBatch | None = batch
+        self.written: int = 0
+        self._aborted: bool = False
+        self._file = None
+
+    def __enter__(self) -> "AtomicWriter":
+        self._file = open(self.temp, "wb")
+        try:
+            if self.size:
+                preallocate(self._file.fileno(), self.size)
+        except BaseException:
+            self._discard()
+            raise
+        return self
+
+    def write(self, data: bytes) -> None:
+        self._file.write(data)
+        self.written += len(data)
+
+    def abort(self) -> None:
+        """
+        放弃写入，退出 with 块时删除临时文件
+        """
+        self._aborted = True
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None or self._aborted:
+            self._discard()
+            return
+        try:
+            self._commit()
+        except BaseException:
+            self._discard()
+            raise
+
+    def _commit(self) -> None:
+        f = self._file
+        # 预分配会扩展文件长度，实际写入更少时截去多余部分
+        if self.size and self.written < self.size:
+            f.truncate(self.written)
+        f.flush()
+        if self.fsync == FSYNC_FILE:
+            os.fsync(f.fileno())
+        f.close()
+        os.replace(self.temp, self.path)
+        if self.fsync == FSYNC_FILE:
+            fsync_dir(self.path.parent)
+        elif self.fsync == FSYNC_BATCH and self.batch is not None:
+            self.batch.add(self.path)
+
+    def _discard(self) -> None:
+        self._file.close()
+        self.temp.unlink(missing_ok=True)
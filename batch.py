@@ -0,0 +1,885 @@
+import argparse
+import getpass
+import hashlib
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from queue import Queue, Empty
+from typing import Callable, Iterator
+from atomic_file import AtomicWriter, SyncBatch, remove_stale, TEMP_SUFFIX, FSYNC_NONE, FSYNC_BATCH, FSYNC_FILE, FSYNC_POLICIES
+from encrip import KeyCache, iter_encrypt, iter_decrypt, recover_header
+from encpack import PackReader, EXTENSION as PACK_EXTENSION
+from filetype import make_header, guess_mime, SNIFF_SIZE
+
+
+# 同时处理的文件数，解密时每个文件只占用一块的内存
+WORKERS: int = os.cpu_count() or 4
+# 并行遍历文件夹的线程数，网络盘、机械盘上多个目录同时读取能显著缩短遍历时间
+WALK_WORKERS: int = 8
+# 遍历与加密之间的队列长度，遍历领先太多时阻塞
+QUEUE_SIZE: int = 256
+# 批量加密的日志，放在输出文件夹中，任务中断后据此继续
+JOURNAL_FILE: str = ".filelocker-batch.journal"
+# 增量加密的清单，放在输出文件夹中
+MANIFEST_FILE: str = ".filelocker-manifest.json"
+# 增量加密时每加密多少个文件保存一次清单
+MANIFEST_SAVE_EVERY: int = 1000
+# 输出路径已存在时的处理方式
+SKIP: str = "skip"
+OVERWRITE: str = "overwrite"
+RENAME: str = "rename"
+# 无界面运行时从该环境变量读取密码，未设置时在终端中询问
+PASSWORD_ENV: str = "FILE_LOCKER_PASSWORD"
+
+
+_DONE = object()
+
+
+def parallel_walk(root: Path,
+                  workers: int = WALK_WORKERS,
+                  on_error: Callable[[Path, OSError], None] | None = None,
+                  exclude: Path | None = None) -> Iterator[Path]:
+    """
+    多个线程同时遍历文件夹（不跟随符号链接），边遍历边产出
+
+    Args:
+        root: 文件夹
+        workers: 同时读取目录的线程数
+        on_error: 无法读取的目录及其错误，在迭代的线程中调用；为 None 时抛出该错误，
+            以免其中的文件被悄悄遗漏
+        exclude: 不进入的子文件夹，须以 root 开头，如位于其中的输出文件夹
+
+    Returns:
+        文件相对于 root 的路径的迭代器，顺序不固定；提前结束迭代时遍历线程随之退出
+    """
+    directories: Queue = Queue()
+    files: Queue = Queue(maxsize=QUEUE_SIZE)
+    closed = threading.Event()
+    lock = threading.Lock()
+    pending = [1]
+
+    def scan():
+        while True:
+            directory = directories.get()
+            if directory is _DONE:
+                return
+            if not closed.is_set():
+                try:
+                    with os.scandir(directory) as it:
+                        for item in it:
+                            if item.is_dir(follow_symlinks=False):
+                                if exclude is not None and Path(item.path) == exclude:
+                                    continue
+                                with lock:
+                                    pending[0] += 1
+                                directories.put(item.path)
+                            elif item.is_file():
+                                files.put(item.path)
+                except OSError as e:
+                    files.put((directory, e))
+            with lock:
+                pending[0] -= 1
+                finished = pending[0] == 0
+            if finished:
+                for _ in range(workers):
+                    directories.put(_DONE)
+                files.put(_DONE)
+
+    directories.put(root)
+    threads = [threading.Thread(target=scan, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    try:
+        while (item := files.get()) is not _DONE:
+            if isinstance(item, tuple):
+                if on_error is None:
+                    raise item[1]
+                on_error(Path(item[0]), item[1])
+                continue
+            yield Path(item).relative_to(root)
+    finally:
+        # 提前结束时取走剩余的结果，让阻塞在队列上的线程退出
+        closed.set()
+        while any(thread.is_alive() for thread in threads):
+            try:
+                files.get(timeout=0.05)
+            except Empty:
+                pass
+
+
+def encrypted_name(stem: str, suffix: str) -> str:
+    """
+    加密后的文件名，"a" 与 ".mp3" -> "a.encmp3"
+    """
+    return stem + ".enc" + suffix[1:]
+
+
+def _relative_to(path: Path, folder: Path) -> Path | None:
+    """
+    path 解析后相对于 folder 的路径，不在 folder 中时返回 None
+    """
+    try:
+        return path.resolve().relative_to(folder.resolve())
+    except ValueError:
+        return None
+
+
+def walk_sources(items: list[tuple[str | Path, str]],
+                 target: Path,
+                 on_error: Callable[[Path, OSError], None] | None = None) -> Iterator[tuple[Path, Path]]:
+    """
+    展开要加密的文件与文件夹
+
+    Args:
+        items: (源路径, 命名) 的列表，命名为空时使用源文件名（文件不含扩展名）
+        target: 输出文件夹
+        on_error: 文件夹中无法读取的目录，见 parallel_walk
+
+    Returns:
+        (源文件, 输出路径) 的迭代器；文件夹以命名或其名称为输出中的子文件夹，并保留内部的目录结构。
+        输出文件夹位于源文件夹中时不遍历输出文件夹，以免加密自己的输出；
+        与源文件夹相同、或输出会写回源文件夹时抛出 ValueError
+    """
+    for path, name in items:
+        path = Path(path)
+        if path.is_dir():
+            base = target / (name or path.name)
+            inside = _relative_to(target, path)
+            if inside == Path(".") or _relative_to(base, path) == Path("."):
+                raise ValueError(f'输出会写入源文件夹"{path}"中，请另选输出文件夹')
+            exclude = path / inside if inside is not None else None
+            for relative in parallel_walk(path, on_error=on_error, exclude=exclude):
+                # 以前中断的任务留下的日志、清单与临时文件不是要加密的文件
+                if relative.name in (JOURNAL_FILE, MANIFEST_FILE) or relative.name.endswith(TEMP_SUFFIX):
+                    continue
+                yield path / relative, base / relative.parent / encrypted_name(relative.stem, relative.suffix)
+        else:
+            yield path, target / encrypted_name(name or path.stem, path.suffix)
+
+
+def read_journal(root: Path) -> tuple[set[str], set[str], dict[str, str]]:
+    """
+    读取输出文件夹中的日志，见 Journal
+
+    Returns:
+        (已完成的输出, 未写完的输出, {源文件: 输出})，输出路径相对于输出文件夹
+    """
+    done: set[str] = set()
+    partial: set[str] = set()
+    outputs: dict[str, str] = {}
+    try:
+        lines = (root / JOURNAL_FILE).read_text(encoding="utf-8").splitlines()
+    except FileNotFoundError:
+        return done, partial, outputs
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        # 同一输出以最后一条记录为准
+        if "start" in record:
+            done.discard(record["start"])
+            partial.add(record["start"])
+        elif "done" in record:
+            partial.discard(record["done"])
+            done.add(record["done"])
+        if "source" in record:
+            outputs[record["source"]] = record.get("start", record.get("done"))
+    return done, partial, outputs
+
+
+class Journal:
+    """
+    批量任务的日志，任务被停止、程序崩溃或断电后据此继续
+
+    每条记录追加写入后立即交给系统，程序崩溃也不会丢失；是否落盘与输出文件使用同一落盘策略：
+    FSYNC_FILE 每条记录落盘，FSYNC_BATCH 在关闭时落盘，FSYNC_NONE 不主动落盘。
+
+    记录为 JSON 行，输出路径相对于输出文件夹：
+        {"start": 输出路径, "source": 源文件}  开始写入输出前记录
+        {"done": 输出路径, "source": 源文件}   输出完整写入并落盘后记录
+    继续时有 done 记录的输出视为已完成，只有 start 记录的输出视为未写完，需重新生成；
+    源文件沿用记录中的输出路径，上次因冲突改名的输出不会再次询问、再次改名。
+    """
+
+    def __init__(self, root: Path, resume: bool, fsync: str = FSYNC_FILE):
+        """
+        Args:
+            root: 输出文件夹
+            resume: 是否读取已有的日志继续，否则从头开始
+            fsync: 落盘策略，见 atomic_file
+        """
+        self.root: Path = root
+        self.path: Path = root / JOURNAL_FILE
+        self.fsync: str = fsync
+        self.done: set[str] = set()
+        self.partial: set[str] = set()
+        # 源文件 -> 输出路径（相对于输出文件夹）
+        self.outputs: dict[str, str] = {}
+        root.mkdir(parents=True, exist_ok=True)
+        if resume:
+            self.done, self.partial, self.outputs = read_journal(root)
+        # 先整理为只含当前状态的日志，崩溃时写了一半的最后一行也随之丢弃
+        sources = {key: source for source, key in self.outputs.items()}
+        lines = [json.dumps(self._record("done", key, sources.get(key))) for key in self.done] + \
+                [json.dumps(self._record("start", key, sources.get(key))) for key in self.partial]
+        with AtomicWriter(self.path, fsync=fsync) as f:
+            f.write("".join(line + "\n" for line in lines).encode())
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._lock: threading.Lock = threading.Lock()
+
+    def key(self, output: Path) -> str:
+        return output.relative_to(self.root).as_posix()
+
+    @staticmethod
+    def _record(state: str, key: str, source: str | None) -> dict:
+        return {state: key} if source is None else {state: key, "source": source}
+
+    def output_of(self, source: Path, output: Path) -> Path:
+        """
+        源文件在日志中记录的输出路径，没有记录时为 output
+        """
+        key = self.outputs.get(str(source))
+        return output if key is None else self.root / key
+
+    def _append(self, record: dict) -> None:
+        with self._lock:
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+            if self.fsync == FSYNC_FILE:
+                os.fsync(self._file.fileno())
+
+    def start(self, source: Path, output: Path) -> None:
+        self._append(self._record("start", self.key(output), str(source)))
+
+    def finish(self, source: Path, output: Path) -> None:
+        self._append(self._record("done", self.key(output), str(source)))
+
+    def close(self, completed: bool) -> None:
+        """
+        Args:
+            completed: 任务是否已完整结束，是则删除日志，否则保留以便继续
+        """
+        if not completed and self.fsync == FSYNC_BATCH:
+            os.fsync(self._file.fileno())
+        self._file.close()
+        if completed:
+            self.path.unlink(missing_ok=True)
+
+
+def has_journal(target: str | Path) -> bool:
+    """
+    输出文件夹中是否有未完成的批量加密
+    """
+    return (Path(target) / JOURNAL_FILE).is_file()
+
+
+def fast_hash(stream) -> str:
+    """
+    源文件内容的快速哈希，用于判断只有修改时间变化的文件内容是否也变化了
+
+    Args:
+        stream: 以二进制模式打开的可读对象，或 bytes
+    """
+    if isinstance(stream, (bytes, bytearray)):
+        return hashlib.blake2b(stream, digest_size=16).hexdigest()
+    digest = hashlib.blake2b(digest_size=16)
+    while data := stream.read(1024 * 1024):
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """
+    增量加密的清单，记录每个输出对应的源文件的大小、修改时间与内容哈希
+
+    再次加密到同一文件夹时，大小与修改时间都未变的源文件直接跳过；
+    只有修改时间变了的文件再比较内容哈希，内容相同时只更新记录。
+    """
+
+    def __init__(self, root: Path):
+        """
+        Args:
+            root: 输出文件夹，清单保存在其中
+        """
+        self.root: Path = root
+        self.path: Path = root / MANIFEST_FILE
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries: dict[str, dict] = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.entries = {}
+        self._lock: threading.Lock = threading.Lock()
+        self._changes: int = 0
+
+    def unchanged(self, key: str, source: Path, stat: os.stat_result) -> bool:
+        """
+        源文件自记录以来是否未变化
+
+        Args:
+            key: 输出路径，相对于输出文件夹
+            source: 源文件
+            stat: 源文件的状态
+        """
+        with self._lock:
+            entry = self.entries.get(key)
+        if entry is None or entry["size"] != stat.st_size:
+            return False
+        if entry["mtime_ns"] == stat.st_mtime_ns:
+            return True
+        with open(source, "rb") as f:
+            if fast_hash(f) != entry["hash"]:
+                return False
+        self.record(key, stat, entry["hash"])
+        return True
+
+    def record(self, key: str, stat: os.stat_result, digest: str) -> None:
+        with self._lock:
+            self.entries[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hash": digest}
+            self._changes += 1
+            need_save = self._changes % MANIFEST_SAVE_EVERY == 0
+        if need_save:
+            self.save()
+
+    def save(self) -> None:
+        with self._lock:
+            data = json.dumps(self.entries, ensure_ascii=False).encode()
+        with AtomicWriter(self.path) as f:
+            f.write(data)
+
+
+def has_manifest(target: str | Path) -> bool:
+    """
+    输出文件夹中是否有增量加密的清单
+    """
+    return (Path(target) / MANIFEST_FILE).is_file()
+
+
+class _HashingReader:
+    """
+    读取时顺便计算 fast_hash，加密时不必为了哈希再读一遍源文件
+    """
+
+    def __init__(self, f):
+        self._file = f
+        self.digest = hashlib.blake2b(digest_size=16)
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._file.read(size)
+        self.digest.update(data)
+        return data
+
+
+def encrypt_file(source: Path,
+                 output: Path,
+                 password: str,
+                 cache: KeyCache | None = None,
+                 fsync: str = FSYNC_FILE,
+                 batch: SyncBatch | None = None) -> str:
+    """
+    将一个文件流式加密到输出路径，文件头记录原始文件名与类型
+
+    密文逐块写入同目录下预先分配好空间的临时文件，写完后替换输出路径（见 AtomicWriter），
+    中途崩溃、停止或出错都不会留下写了一半的输出。
+
+    Args:
+        source: 源文件
+        output: 输出路径
+        password: 密码
+        cache: 批量处理时共用的派生缓存
+        fsync: 落盘策略，见 atomic_file
+        batch: FSYNC_BATCH 策略下登记写出的文件
+
+    Returns:
+        源文件内容的快速哈希，见 fast_hash
+    """
+    if not source.is_file():
+        raise ValueError(f'不存在源文件路径："{source}"')
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(source, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        head = f.read(SNIFF_SIZE)
+        f.seek(0)
+        reader = _HashingReader(f)
+        length, chunks = iter_encrypt(reader, size, password, make_header(guess_mime(source, head), source.name), cache)
+        with AtomicWriter(output, length, fsync, batch) as writer:
+            for data in chunks:
+                writer.write(data)
+    return reader.digest.hexdigest()
+
+
+def find_conflicts(items: list[tuple[str | Path, str]],
+                   target: str | Path,
+                   resume: bool = False,
+                   incremental: bool = False,
+                   should_stop: Callable[[], bool] | None = None) -> list[tuple[Path, Path]]:
+    """
+    加密前预先找出所有冲突的输出路径，以便一次性决定如何处理，加密时不必中途等待
+
+    冲突包括已存在的输出路径，以及本次任务中多个源文件对应同一输出路径（如"x/a.txt"与"y/a.txt"）时
+    除第一个以外的源文件；"第一个"按遍历顺序，即 items 中靠前的源路径，与 encrypt_files 一致。日志中记录过的输出（resume 时）与清单中记录过的输出（incremental 时）
+    由 encrypt_files 自行处理，不算已存在。
+
+    Args:
+        参数与 encrypt_files 相同
+        should_stop: 返回 True 时停止扫描
+
+    Returns:
+        (源文件, 冲突的输出路径) 的列表，按输出路径与源文件排序
+    """
+    target = Path(target)
+    done, partial, outputs = read_journal(target) if resume else (set(), set(), {})
+    known = set(Manifest(target).entries) if incremental else set()
+    seen: set[Path] = set()
+    conflicts = []
+    # 无法读取的目录由 encrypt_files 计入错误
+    for source, output in walk_sources(items, target, on_error=lambda _directory, _error: None):
+        if should_stop and should_stop():
+            break
+        # 继续时沿用日志中记录的输出路径，与 encrypt_files 相同
+        if str(source) in outputs:
+            output = target / outputs[str(source)]
+        if output in seen:
+            conflicts.append((source, output))
+            continue
+        seen.add(output)
+        if not output.exists():
+            continue
+        key = output.relative_to(target).as_posix()
+        if key not in done and key not in partial and key not in known:
+            conflicts.append((source, output))
+    return sorted(conflicts, key=lambda item: (item[1], item[0]))
+
+
+def renamed_path(output: Path, reserved: set[Path]) -> Path:
+    """
+    为已存在的输出路径选一个不冲突的新名称，如"a (1).encmp3"
+
+    Args:
+        output: 已存在的输出路径
+        reserved: 本次任务已选用的新名称，选出的名称会被加入其中
+    """
+    number = 1
+    while True:
+        candidate = output.with_name(f"{output.stem} ({number}){output.suffix}")
+        if candidate not in reserved and not candidate.exists():
+            reserved.add(candidate)
+            return candidate
+        number += 1
+
+
+def encrypt_files(items: list[tuple[str | Path, str]],
+                  target: str | Path,
+                  password: str,
+                  cache: KeyCache | None = None,
+                  on_conflict: Callable[[Path, Path], str] | None = None,
+                  progress: Callable[[int, int, bool], None] | None = None,
+                  should_stop: Callable[[], bool] | None = None,
+                  resume: bool = False,
+                  incremental: bool = False,
+                  fsync: str = FSYNC_FILE) -> tuple[int, int, list[str], dict[str, str]]:
+    """
+    流式并行地加密文件与文件夹
+
+    遍历线程（文件夹由多个线程并行遍历） -> 有界队列 -> 加密线程，文件一经发现就开始加密，
+    大文件夹不必等遍历结束。所有文件共用一次密钥派生。
+    进度记录在输出文件夹的日志中（见 Journal），中断后以 resume=True 重新运行即可继续：
+    已完成的输出直接跳过，未写完的输出重新加密，两者都不会被当作已存在的路径询问。
+    增量加密时按输出文件夹中的清单（见 Manifest）只加密新增或变化了的源文件，
+    清单中记录过的输出被视为上次生成的结果，源文件变化时直接覆盖而不询问。
+
+    Args:
+        items: (源路径, 命名) 的列表，见 walk_sources
+        target: 输出文件夹
+        password: 密码
+        cache: 派生缓存，为 None 时新建
+        on_conflict: 以 (源文件, 输出路径) 调用，返回 SKIP、OVERWRITE 或 RENAME，为 None 时跳过；
+            输出路径已存在，或已被本次任务中先遍历到的源文件使用时调用，后者不会相互覆盖，返回 OVERWRITE 时按 RENAME 处理；
+            应立即返回（如查询 find_conflicts 之后预先决定的结果），不要在其中等待用户
+        progress: 进度回调 (已处理数, 已发现数, 是否遍历完毕)
+        should_stop: 返回 True 时停止，已加密的文件会被保留
+        resume: 是否按输出文件夹中的日志继续上次中断的任务
+        incremental: 是否按输出文件夹中的清单增量加密，清单不存在时新建
+        fsync: 落盘策略，见 atomic_file；FSYNC_BATCH 在任务结束（包括被停止）时统一落盘，
+            日志同样按该策略落盘（见 Journal），FSYNC_FILE 之外的策略下断电时日志中已完成的文件可能并未落盘
+
+    Returns:
+        (加密的文件数, 未变化而跳过的文件数, 因输出已存在而跳过的源文件, {源路径或无法读取的文件夹: 错误信息})，
+        上次已完成的文件也计入加密数
+    """
+    target = Path(target)
+    cache = cache if cache is not None else KeyCache()
+    journal = Journal(target, resume, fsync)
+    manifest = Manifest(target) if incremental else None
+    batch = SyncBatch() if fsync == FSYNC_BATCH else None
+    queue: Queue = Queue(maxsize=QUEUE_SIZE)
+    lock = threading.Lock()
+    stopped = threading.Event()
+    skipped: list[str] = []
+    errors: dict[str, str] = {}
+    reserved: set[Path] = set()
+    counts = {"found": 0, "done": 0, "written": 0, "unchanged": 0, "walked": False}
+
+    def report():
+        if progress: progress(counts["done"], counts["found"], counts["walked"])
+
+    def unreadable(directory, error):
+        with lock:
+            errors[str(directory)] = f"无法读取文件夹：{error}"
+
+    def walker():
+        try:
+            for source, output in walk_sources(items, target, unreadable):
+                if stopped.is_set():
+                    break
+                with lock:
+                    counts["found"] += 1
+                # 在遍历线程中按遍历顺序登记输出路径，重名时归属与 find_conflicts 相同，不取决于加密线程的先后
+                queue.put((source, claim(source, journal.output_of(source, output))))
+        except Exception as e:
+            with lock:
+                errors[str(target)] = str(e)
+        finally:
+            with lock:
+                counts["walked"] = True
+            for _ in range(WORKERS):
+                queue.put(_DONE)
+
+    def claim(source, output):
+        """
+        登记输出路径；本次任务中先遍历到的源文件已使用该路径时不会相互覆盖，只能跳过（返回 None）或另取名称
+        """
+        with lock:
+            if output not in reserved:
+                reserved.add(output)
+                return output
+        if (on_conflict(source, output) if on_conflict else SKIP) == SKIP:
+            return None
+        with lock:
+            return renamed_path(output, reserved)
+
+    def worker():
+        while True:
+            item = queue.get()
+            if item is _DONE:
+                return
+            if stopped.is_set():
+                continue
+            source, output = item
+            try:
+                if output is None:
+                    with lock:
+                        skipped.append(str(source))
+                else:
+                    encrypt(source, output)
+            except Exception as e:
+                with lock:
+                    errors[str(source)] = str(e)
+            with lock:
+                counts["done"] += 1
+            report()
+            if should_stop and should_stop():
+                stopped.set()
+
+    def encrypt(source, output):
+        key = journal.key(output)
+        stat = source.stat() if manifest is not None and source.is_file() else None
+        if key in journal.done and output.exists():
+            with lock:
+                counts["written"] += 1
+        elif stat is not None and output.exists() and manifest.unchanged(key, source, stat):
+            with lock:
+                counts["unchanged"] += 1
+        else:
+            action = OVERWRITE
+            if key not in journal.partial and output.exists() and \
+                    not (manifest is not None and key in manifest.entries):
+                action = on_conflict(source, output) if on_conflict else SKIP
+            if action == RENAME:
+                with lock:
+                    output = renamed_path(output, reserved)
+                key = journal.key(output)
+            if action == SKIP:
+                with lock:
+                    skipped.append(str(source))
+            elif not stopped.is_set():
+                if key in journal.partial:
+                    remove_stale(output)
+                journal.start(source, output)
+                digest = encrypt_file(source, output, password, cache, fsync, batch)
+                journal.finish(source, output)
+                if stat is not None:
+                    manifest.record(key, stat, digest)
+                with lock:
+                    counts["written"] += 1
+
+    threads = [threading.Thread(target=walker, daemon=True)]
+    threads += [threading.Thread(target=worker, daemon=True) for _ in range(WORKERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if batch is not None:
+        batch.sync()
+    if manifest is not None:
+        manifest.save()
+    journal.close(completed=not stopped.is_set())
+    report()
+    return counts["written"], counts["unchanged"], skipped, errors
+
+
+def walk_encrypted(paths: list[str | Path]) -> Iterator[tuple[Path, Path]]:
+    """
+    遍历加密文件
+
+    Args:
+        paths: 加密文件或文件夹路径，文件夹包括子文件夹
+
+    Returns:
+        (加密文件路径, 输出时的相对目录) 的迭代器，文件夹中的文件保留其在文件夹内的目录结构
+    """
+    for path in map(Path, paths):
+        if path.is_file():
+            yield path, Path()
+        elif path.is_dir():
+            for item in path.rglob("*"):
+                if item.is_file() and item.suffix.lower().startswith(".enc"):
+                    yield item, item.parent.relative_to(path)
+
+
+def decrypted_name(path: Path, meta: dict) -> str:
+    """
+    解密后的文件名：优先使用元数据中的原始文件名，否则由扩展名还原（"a.encmp3" -> "a.mp3"）
+    """
+    name = Path(str(meta.get("name") or "").replace("\\", "/")).name
+    if name not in ("", ".", ".."):
+        return name
+    ext = path.suffix[len(".enc"):]
+    return f"{path.stem}.{ext}" if ext else path.stem
+
+
+def member_path(target: Path, name: str) -> Path | None:
+    """
+    加密包成员解包后的路径，保留成员名中的目录结构，成员名会跳出 target 时返回 None
+    """
+    parts = [part for part in name.replace("\\", "/").split("/") if part not in ("", ".")]
+    if not parts or any(part == ".." or ":" in part for part in parts):
+        return None
+    return target.joinpath(*parts)
+
+
+def _write_stream(output: Path,
+                  chunks: Iterator[bytes],
+                  should_stop: Callable[[], bool],
+                  size: int | None = None,
+                  fsync: str = FSYNC_NONE,
+                  batch: SyncBatch | None = None) -> bool:
+    """
+    先写入临时文件，完整写完且通过认证后才替换为输出文件，见 AtomicWriter
+
+    Returns:
+        是否写完，中途停止时删除临时文件并返回 False
+    """
+    with AtomicWriter(output, size, fsync, batch) as writer:
+        for data in chunks:
+            if should_stop():
+                writer.abort()
+                return False
+            writer.write(data)
+    return True
+
+
+def _claim_output(output: Path, overwrite: bool, claim: Callable[[Path], Path | None] | None) -> Path | None:
+    if claim is not None:
+        return claim(output)
+    return None if output.exists() and not overwrite else output
+
+
+def decrypt_file(path: Path,
+                 target: Path,
+                 password: str,
+                 cache: KeyCache | None = None,
+                 overwrite: bool = False,
+                 should_stop: Callable[[], bool] = lambda: False,
+                 fsync: str = FSYNC_NONE,
+                 batch: SyncBatch | None = None,
+                 claim: Callable[[Path], Path | None] | None = None) -> bool:
+    """
+    将一个加密文件流式解密到文件夹中，加密包的成员解密到以包名命名的子文件夹
+
+    Args:
+        path: 加密文件路径
+        target: 输出文件夹
+        password: 密码
+        cache: 批量处理时共用的派生缓存
+        overwrite: 输出路径已存在时是否覆盖
+        should_stop: 返回 True 时停止
+        fsync: 落盘策略，见 atomic_file
+        batch: FSYNC_BATCH 策略下登记写出的文件
+        claim: 代替"输出已存在时跳过"的判断，登记输出路径并返回实际使用的路径，返回 None 时跳过；
+            批量解密时用于避免多个输入写到同一路径
+
+    Returns:
+        是否写出了文件，输出已存在而跳过或中途停止时为 False；密码错误或文件损坏时抛出异常
+    """
+    target.mkdir(parents=True, exist_ok=True)
+    if path.suffix.lower() == PACK_EXTENSION:
+        reader = PackReader(path, password, cache)
+        written = False
+        for name in reader.names():
+            if should_stop():
+                return written
+            output = member_path(target / path.stem, name)
+            if output is None:
+                raise ValueError(f'成员名"{name}"不能作为文件名')
+            output = _claim_output(output, overwrite, claim)
+            if output is None:
+                continue
+            output.parent.mkdir(parents=True, exist_ok=True)
+            reader.extract(name, output)
+            written = True
+        return written
+    recover_header(path)
+    with open(path, "rb") as f:
+        meta, chunks = iter_decrypt(f, password, cache)
+        output = target / decrypted_name(path, meta)
+        output = _claim_output(output, overwrite, claim)
+        if output is None:
+            return False
+        return _write_stream(output, chunks, should_stop, meta.get("size"), fsync, batch)
+
+
+def decrypt_files(paths: list[str | Path],
+                  target: str | Path,
+                  password: str,
+                  overwrite: bool = False,
+                  progress: Callable[[int, int], None] | None = None,
+                  should_stop: Callable[[], bool] | None = None,
+                  fsync: str = FSYNC_NONE) -> tuple[int, list[str], dict[str, str]]:
+    """
+    并行地将加密文件解密到文件夹
+
+    每个文件以流的方式解密，内存占用只与同时处理的文件数有关；所有文件共用一个派生缓存，
+    盐值相同（如一起保存或一起更改过密码）的文件只派生一次密钥。
+    多个输入解密到同一路径时（如原始文件名相同，或两个文件夹中有相同的相对路径），
+    先写出的使用原名称，其余以"a (1).txt"的形式另取名称，不会互相覆盖。
+
+    Args:
+        paths: 加密文件或文件夹路径，文件夹中的文件保留目录结构
+        target: 输出文件夹
+        password: 这些文件共用的密码
+        overwrite: 输出路径已存在时是否覆盖，否则跳过
+        progress: 进度回调 (已处理数, 总数)
+        should_stop: 返回 True 时停止，已解密的文件会被保留
+        fsync: 落盘策略，见 atomic_file
+
+    Returns:
+        (解密的文件数, 被跳过的文件, {源路径: 错误信息})
+    """
+    target = Path(target)
+    items = list(walk_encrypted(paths))
+    cache = KeyCache()
+    batch = SyncBatch() if fsync == FSYNC_BATCH else None
+    lock = threading.Lock()
+    stopped = threading.Event()
+    skipped: list[str] = []
+    errors: dict[str, str] = {}
+    claimed: set[Path] = set()
+    existing: set[Path] = set()
+    counts = {"done": 0, "written": 0}
+
+    def claim(output):
+        with lock:
+            if output in claimed:
+                # 本次已跳过的已存在路径继续跳过，本次写出的路径另取名称
+                return None if output in existing else renamed_path(output, claimed)
+            claimed.add(output)
+            if output.exists() and not overwrite:
+                existing.add(output)
+                return None
+            return output
+
+    def decrypt(path, relative):
+        if stopped.is_set():
+            return
+        try:
+            written = decrypt_file(path, target / relative, password, cache, overwrite, stopped.is_set, fsync, batch, claim)
+        except Exception as e:
+            with lock:
+                errors[str(path)] = str(e) or "密码错误或文件已损坏"
+        else:
+            with lock:
+                if written:
+                    counts["written"] += 1
+                elif not stopped.is_set():
+                    skipped.append(str(path))
+        with lock:
+            counts["done"] += 1
+        if progress: progress(counts["done"], len(items))
+        if should_stop and should_stop():
+            stopped.set()
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        for path, relative in items:
+            pool.submit(decrypt, path, relative)
+    if batch is not None:
+        batch.sync()
+    return counts["written"], skipped, errors
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    无界面的批处理入口，如：
+        python batch.py encrypt 文件夹 -o 输出文件夹
+        python batch.py decrypt 加密文件夹 -o 输出文件夹
+    """
+    parser = argparse.ArgumentParser(description="无界面批量处理加密文件")
+    commands = parser.add_subparsers(dest="command", required=True)
+    decrypt = commands.add_parser("decrypt", help="将加密文件解密到文件夹")
+    decrypt.add_argument("paths", nargs="+", help="加密文件或文件夹")
+    decrypt.add_argument("-o", "--output", required=True, help="输出文件夹")
+    decrypt.add_argument("--overwrite", action="store_true", help="覆盖已存在的文件")
+    decrypt.add_argument("--fsync", choices=FSYNC_POLICIES, default=FSYNC_NONE,
+                         help="落盘策略：不主动落盘、全部写完后统一落盘或每个文件写完即落盘，默认不主动落盘")
+    encrypt = commands.add_parser("encrypt", help="加密文件与文件夹，文件夹保留目录结构")
+    encrypt.add_argument("paths", nargs="+", help="文件或文件夹")
+    encrypt.add_argument("-o", "--output", required=True, help="输出文件夹")
+    encrypt.add_argument("--on-conflict", choices=[SKIP, OVERWRITE, RENAME], default=SKIP,
+                         help="输出路径已存在时跳过、覆盖或以新名称保存，默认跳过")
+    encrypt.add_argument("--resume", action="store_true", help="继续输出文件夹中上次中断的任务")
+    encrypt.add_argument("--incremental", action="store_true", help="按输出文件夹中的清单只加密新增或变化了的文件")
+    encrypt.add_argument("--fsync", choices=FSYNC_POLICIES, default=FSYNC_FILE,
+                         help="落盘策略：不主动落盘、全部写完后统一落盘或每个文件写完即落盘，默认每个文件落盘")
+    args = parser.parse_args(argv)
+    password = os.environ.get(PASSWORD_ENV)
+    if not password:
+        password = getpass.getpass("密码：")
+        if args.command == "encrypt" and getpass.getpass("确认密码：") != password:
+            print("密钥输入不一致！", file=sys.stderr)
+            return 2
+    unchanged = 0
+    if args.command == "encrypt":
+        count, unchanged, skipped, errors = encrypt_files(
+            [(path, "") for path in args.paths], args.output, password,
+            on_conflict=lambda _source, _output: args.on_conflict,
+            progress=lambda done, found, walked: print(f"\r{done}/{found}", end="", file=sys.stderr),
+            resume=args.resume, incremental=args.incremental, fsync=args.fsync)
+        verb = "加密"
+    else:
+        count, skipped, errors = decrypt_files(
+            args.paths, args.output, password, args.overwrite,
+            progress=lambda done, total: print(f"\r{done}/{total}", end="", file=sys.stderr), fsync=args.fsync)
+        verb = "解密"
+    print(file=sys.stderr)
+    for path, error in errors.items():
+        print(f"{path}：{error}", file=sys.stderr)
+    note = f"，{unchanged}个文件未变化" if unchanged else ""
+    print(f"已{verb}{count}个文件{note}，跳过{len(skipped)}个已存在的文件，{len(errors)}个文件失败")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import BinaryIO, Iterator
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from encrip import derive_key, wrap_key, unwrap_key, rewrite_header, recover_header, KeyCache, \
+    ENVELOPE_HEADER_SIZE
+
+
+# 第二版起内容由随机数据密钥加密，文件头中保存被密码密钥包裹的数据密钥，更改密码只需重写文件头
+MAGIC: bytes = b"FLPACK02"
+LEGACY_MAGIC: bytes = b"FLPACK01"
+SALT_SIZE: int = 96
+NONCE_SIZE: int = 12
+TAG_SIZE: int = 16
+# 成员按段加密，读取成员时只需解密它自己的段，大成员也不必整体载入内存
+SEGMENT_SIZE: int = 1024 * 1024
+TRAILER_SIZE: int = 8
+EXTENSION: str = ".encpack"
+
+
+def _segment_aad(magic: bytes, number: int, segment: int, last: bool) -> bytes:
+    """
+    段的附加认证数据：成员序号、段序号与是否为最后一段，防止段被调换或截断
+    """
+    return magic + number.to_bytes(4, "big") + segment.to_bytes(4, "big") + (b"\1" if last else b"\0")
+
+
+def _segment_count(size: int) -> int:
+    return max(1, -(-size // SEGMENT_SIZE))
+
+
+class PackWriter:
+    """
+    将许多小文件打包为一个加密包
+
+    文件格式：
+        文件头（魔数 | 三层 KDF 的盐值 | 被包裹的数据密钥） | 成员段…… | 加密的索引 | 索引偏移（8 字节）
+    整个包只派生一次密钥；每个成员的每一段以数据密钥单独加密，
+    索引记录成员名、大小、修改时间与偏移，所以可以只解密需要的成员。
+    先写入临时文件，close 时才替换为目标文件。
+    """
+
+    def __init__(self, path: str | Path, password: str, cache: KeyCache | None = None):
+        """
+        Args:
+            path: 输出路径
+            password: 密码
+            cache: 派生缓存，已预先派生时不再派生
+        """
+        self.path: Path = Path(path)
+        data_key = os.urandom(32)
+        header = wrap_key(MAGIC, data_key, password, cache)
+        self._aead: AESGCM = AESGCM(data_key)
+        self._temp: Path = self.path.with_name(f".{self.path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        self._file: BinaryIO = open(self._temp, "wb")
+        self._file.write(header)
+        self._members: list[dict] = []
+        self._names: set[str] = set()
+
+    def add(self, name: str, stream: BinaryIO, mtime: float | None = None) -> None:
+        """
+        以流的方式加入成员
+
+        Args:
+            name: 成员名，包内唯一
+            stream: 以二进制模式打开的可读对象
+            mtime: 修改时间，默认为当前时间
+        """
+        if name in self._names:
+            raise ValueError(f'成员"{name}"重复')
+        number = len(self._members)
+        offset = self._file.tell()
+        size = 0
+        segment = 0
+        data = stream.read(SEGMENT_SIZE)
+        while True:
+            following = stream.read(SEGMENT_SIZE) if len(data) == SEGMENT_SIZE else b""
+            nonce = os.urandom(NONCE_SIZE)
+            self._file.write(nonce + self._aead.encrypt(nonce, data, _segment_aad(MAGIC, number, segment, not following)))
+            size += len(data)
+            segment += 1
+            if not following:
+                break
+            data = following
+        self._names.add(name)
+        self._members.append({"name": name,
+                              "size": size,
+                              "mtime": time.time() if mtime is None else mtime,
+                              "offset": offset})
+
+    def add_file(self, path: str | Path, name: str | None = None) -> None:
+        """
+        加入磁盘上的文件，参见 add
+        """
+        path = Path(path)
+        with open(path, "rb") as f:
+            self.add(name or path.name, f, path.stat().st_mtime)
+
+    def close(self) -> None:
+        """
+        写入索引并替换为目标文件
+        """
+        index_offset = self._file.tell()
+        nonce = os.urandom(NONCE_SIZE)
+        raw = json.dumps({"members": self._members}).encode()
+        self._file.write(nonce + self._aead.encrypt(nonce, raw, MAGIC + b"index"))
+        self._file.write(index_offset.to_bytes(TRAILER_SIZE, "big"))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._temp, self.path)
+
+    def abort(self) -> None:
+        """
+        放弃打包并删除临时文件
+        """
+        self._file.close()
+        self._temp.unlink(missing_ok=True)
+
+    def __enter__(self) -> "PackWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class PackReader:
+    """
+    读取加密包，只解密索引与被读取的成员
+    """
+
+    def __init__(self, path: str | Path, password: str, cache: KeyCache | None = None):
+        """
+        Args:
+            path: 加密包路径
+            password: 密码，错误或包已损坏时抛出 ValueError
+            cache: 批量处理时共用的派生缓存
+        """
+        self.path: Path = Path(path)
+        recover_header(self.path)
+        with open(self.path, "rb") as f:
+            header = f.read(ENVELOPE_HEADER_SIZE)
+            if header[:len(MAGIC)] == LEGACY_MAGIC:
+                header = header[:len(MAGIC) + SALT_SIZE]
+            elif header[:len(MAGIC)] != MAGIC:
+                raise ValueError(f'"{self.path}"不是加密包')
+            f.seek(-TRAILER_SIZE, os.SEEK_END)
+            end = f.tell()
+            index_offset = int.from_bytes(f.read(TRAILER_SIZE), "big")
+            if not len(header) <= index_offset < end:
+                raise ValueError("加密包已损坏")
+            f.seek(index_offset)
+            sealed = f.read(end - index_offset)
+        self._magic: bytes = header[:len(MAGIC)]
+        if self._magic == LEGACY_MAGIC:
+            salts = header[len(MAGIC):]
+            self._aead: AESGCM = AESGCM(derive_key(password, salts[:32], salts[32:64], salts[64:]))
+        else:
+            self._aead: AESGCM = AESGCM(unwrap_key(header, password, cache))
+        try:
+            raw = self._aead.decrypt(sealed[:NONCE_SIZE], sealed[NONCE_SIZE:], self._magic + b"index")
+        except InvalidTag:
+            raise ValueError("密码错误或文件已损坏")
+        members = json.loads(raw)["members"]
+        # {成员名: (序号, 成员记录)}
+        self.members: dict[str, tuple[int, dict]] = {m["name"]: (i, m) for i, m in enumerate(members)}
+
+    def names(self) -> list[str]:
+        return list(self.members)
+
+    def iter_read(self, name: str) -> Iterator[bytes]:
+        """
+        逐段读取并解密成员
+
+        Args:
+            name: 成员名
+
+        Returns:
+            明文数据段的迭代器
+        """
+        number, member = self.members[name]
+        count = _segment_count(member["size"])
+        remaining = member["size"]
+        with open(self.path, "rb") as f:
+            f.seek(member["offset"])
+            for segment in range(count):
+                length = min(remaining, SEGMENT_SIZE)
+                sealed = f.read(NONCE_SIZE + length + TAG_SIZE)
+                try:
+                    data = self._aead.decrypt(sealed[:NONCE_SIZE], sealed[NONCE_SIZE:],
+                                              _segment_aad(self._magic, number, segment, segment == count - 1))
+                except InvalidTag:
+                    raise ValueError(f'成员"{name}"已损坏')
+                remaining -= length
+                yield data
+
+    def read(self, name: str) -> bytes:
+        return b"".join(self.iter_read(name))
+
+    def extract(self, name: str, path: str | Path) -> None:
+        """
+        将成员解密写入磁盘，先写入临时文件，完成后替换并设置修改时间
+        """
+        path = Path(path)
+        temp = path.with_name(f".{path.name}.{threading.get_ident()}.part")
+        try:
+            with open(temp, "wb") as f:
+                for data in self.iter_read(name):
+                    f.write(data)
+            os.replace(temp, path)
+        except BaseException:
+            temp.unlink(missing_ok=True)
+            raise
+        mtime = self.members[name][1]["mtime"]
+        os.utime(path, (mtime, mtime))
+
+
+def rekey_pack(path: str | Path, old_password: str, new_password: str, cache: KeyCache | None = None) -> bool:
+    """
+    更改加密包的密码
+
+    第二版加密包只重写文件头；第一版加密包没有数据密钥，需逐个成员重新打包。
+
+    Returns:
+        是否只重写了文件头，原密码错误时抛出 ValueError
+    """
+    path = Path(path)
+    recover_header(path)
+    with open(path, "rb") as f:
+        header = f.read(ENVELOPE_HEADER_SIZE)
+    if header[:len(MAGIC)] == MAGIC:
+        data_key = unwrap_key(header, old_password, cache)
+        rewrite_header(path, wrap_key(MAGIC, data_key, new_password, cache))
+        return True
+    reader = PackReader(path, old_password, cache)
+    with PackWriter(path, new_password) as writer:
+        for name in reader.names():
+            writer.add(name, _SegmentStream(reader.iter_read(name)), reader.members[name][1]["mtime"])
+    return False
+
+
+class _SegmentStream:
+    """
+    将逐段产出的数据包装为可读对象，重新打包时不必将成员整体载入内存
+    """
+
+    def __init__(self, segments: Iterator[bytes]):
+        self._segments: Iterator[bytes] = segments
+        self._buffer: bytes = b""
+
+    def read(self, size: int) -> bytes:
+        while len(self._buffer) < size:
+            data = next(self._segments, None)
+            if data is None:
+                break
+            self._buffer += data
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
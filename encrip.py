@@ -2,26 +2,49 @@ from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.exceptions import InvalidTag
+from pathlib import Path
+import json
 import os
 import time
 import hmac
-from typing import Tuple
+import threading
+from typing import BinaryIO, Generator, Iterator, Tuple
 
 
-def encrip(data: bytes, password: str, header: str) -> bytes:
+# 第二版文件格式：魔数 | 三层 KDF 的盐值 | 包裹随机数 | 被密码密钥包裹的数据密钥 | IV | 标签 | 密文
+# 内容由随机数据密钥加密，更改密码时只需重写文件头；没有魔数的是第一版文件，内容直接由密码密钥加密
+ENVELOPE_MAGIC: bytes = b"FLENC002"
+SALTS_SIZE: int = 96
+WRAP_NONCE_SIZE: int = 12
+WRAPPED_KEY_SIZE: int = 32 + 16
+ENVELOPE_HEADER_SIZE: int = len(ENVELOPE_MAGIC) + SALTS_SIZE + WRAP_NONCE_SIZE + WRAPPED_KEY_SIZE
+# 第三版文件格式：第二版的文件头（魔数不同） | 元数据长度（4 字节） | 加密的元数据 | 分块密文……
+# 元数据与内容分别加密，派生密钥后只需解密元数据就能得知原始文件名、大小、类型与分块大小
+FILE_MAGIC: bytes = b"FLENC003"
+META_LENGTH_SIZE: int = 4
+NONCE_SIZE: int = 12
+TAG_SIZE: int = 16
+# 内容按块加密，每块以随机数单独加密，附加认证数据中包含块序号与是否为最后一块
+CHUNK_SIZE: int = 1024 * 1024
+# 更改密码时旧文件头的备份，写入新文件头中途崩溃时据此恢复
+REKEY_BACKUP_SUFFIX: str = ".rekey"
+
+
+def derive_key(password: str, salt1: bytes, salt2: bytes, salt3: bytes) -> bytes:
     """
-    加密数据
+    按与 encrip/decrip 相同的三层参数从密码派生 32 字节密钥
     
     Args:
-        data: 要加密的原始数据
-        password: 加密密码
-        header: 文件头信息
+        password: 密码
+        salt1: 第一层 PBKDF2 盐值
+        salt2: 第二层 PBKDF2 盐值
+        salt3: HMAC 盐值
         
     Returns:
-        加密后的数据，包含盐值、IV、标签和加密内容
+        派生出的 32 字节密钥
     """
-    # 第一层：PBKDF2HMAC派生主密钥
-    salt1: bytes = os.urandom(32)
     kdf1: PBKDF2HMAC = PBKDF2HMAC(
         algorithm=hashes.SHA512(),
         length=32,
@@ -30,110 +53,610 @@ def encrip(data: bytes, password: str, header: str) -> bytes:
         backend=default_backend()
     )
     key1: bytes = kdf1.derive(password.encode())
+    kdf2: PBKDF2HMAC = PBKDF2HMAC(
+        algorithm=hashes.SHA3_512(),
+        length=32,
+        salt=salt2,
+        iterations=300000,
+        backend=default_backend()
+    )
+    key2: bytes = kdf2.derive(key1)
+    return hmac.new(key2, salt3, hashes.SHA512().name).digest()[:32]
+
+
+class KeyCache:
+    """
+    批量处理时复用密钥派生的结果
+
+    盐值相同的文件头只派生一次；通过同一个缓存重新包裹的文件共用一组新盐值，
+    所以批量更改密码时新密码也只派生一次，再次批量更改时旧密码同样只需派生一次。
+    标签页保存一个缓存时，重复保存同一文件同样不必再派生，见 encrip。
+    """
+
+    def __init__(self):
+        self._keys: dict[tuple[str, bytes], bytes] = {}
+        self._fresh: dict[str, bytes] = {}
+        self._locks: dict[tuple[str, bytes], threading.Lock] = {}
+        self._lock: threading.Lock = threading.Lock()
+        # 最近一次预先派生的密码，以及被加密、解密真正使用过的密码
+        self._speculative: str | None = None
+        self._used: set[str] = set()
+
+    def key(self, password: str, salts: bytes, speculative: bool = False) -> bytes:
+        """
+        由密码与盐值派生的密钥，多个线程同时请求同一密钥时只派生一次
+
+        Args:
+            password: 密码
+            salts: 文件头中的盐值
+            speculative: 为 True 时是预先派生，不把该密码记为真正使用过
+        """
+        cache_key = (password, salts)
+        with self._lock:
+            lock = self._locks.setdefault(cache_key, threading.Lock())
+            # 已有派生结果的盐值优先作为该密码之后新加密时的盐值
+            self._fresh.setdefault(password, salts)
+            if not speculative:
+                self._used.add(password)
+        with lock:
+            if cache_key not in self._keys:
+                self._keys[cache_key] = derive_key(password, salts[:32], salts[32:64], salts[64:])
+            return self._keys[cache_key]
+
+    def derive_steps(self, password: str, salts: bytes) -> Generator[int, None, bytes]:
+        """
+        分步派生密钥，第一层完成后产出一次进度，结果存入缓存；用于派生期间显示进度、响应停止
+
+        已有结果或其他线程正在派生同一密钥时等待其结果，不重复派生；
+        派生期间持有该密钥的锁，提前结束迭代时随生成器关闭释放。
+
+        Returns:
+            与 key 相同的密钥
+        """
+        cache_key = (password, salts)
+        with self._lock:
+            lock = self._locks.setdefault(cache_key, threading.Lock())
+            self._fresh.setdefault(password, salts)
+            self._used.add(password)
+        if cache_key in self._keys or not lock.acquire(blocking=False):
+            key = self.key(password, salts)
+            yield 1
+            return key
+        try:
+            if cache_key not in self._keys:
+                self._keys[cache_key] = yield from _derive_steps(password, salts, None)
+            return self._keys[cache_key]
+        finally:
+            lock.release()
+
+    def fresh_salts(self, password: str) -> bytes:
+        """
+        为新密码生成的盐值，同一缓存中同一密码总是得到同一组盐值
+        """
+        with self._lock:
+            return self._fresh.setdefault(password, os.urandom(SALTS_SIZE))
+
+    def forget(self, password: str) -> None:
+        """
+        丢弃该密码的所有派生结果
+        """
+        with self._lock:
+            for cache_key in [k for k in self._keys if k[0] == password]:
+                del self._keys[cache_key]
+            self._fresh.pop(password, None)
+            self._used.discard(password)
+
+    def prepare(self, password: str) -> None:
+        """
+        在后台以该密码之后加密时使用的盐值预先派生密钥，保存时直接取用
+        之前预先派生但未被使用的密码会被丢弃；正在派生时保存会等待派生完成而不会重复派生
+        """
+        salts = self.fresh_salts(password)
+        with self._lock:
+            cached = (password, salts) in self._keys
+            previous, self._speculative = self._speculative, None if cached else password
+        if previous is not None and previous != password and previous not in self._used:
+            self.forget(previous)
+        if cached:
+            return
+        def derive():
+            self.key(password, salts, speculative=True)
+            # 派生期间密码已被改掉且未被使用时丢弃结果
+            with self._lock:
+                stale = self._speculative != password and password not in self._used
+            if stale:
+                self.forget(password)
+        threading.Thread(target=derive, daemon=True).start()
+
+
+def wrap_key(magic: bytes, data_key: bytes, password: str, cache: KeyCache | None = None) -> bytes:
+    """
+    用密码派生的密钥包裹数据密钥，生成文件头
+
+    Args:
+        magic: 文件格式的魔数，8 字节，与盐值一起作为附加认证数据
+        data_key: 数据密钥
+        password: 密码
+        cache: 批量处理时共用的派生缓存，为 None 时使用新盐值单独派生
+
+    Returns:
+        文件头：魔数 | 盐值 | 包裹随机数 | 被包裹的数据密钥
+    """
+    salts = cache.fresh_salts(password) if cache else os.urandom(SALTS_SIZE)
+    kek = cache.key(password, salts) if cache else derive_key(password, salts[:32], salts[32:64], salts[64:])
+    nonce = os.urandom(WRAP_NONCE_SIZE)
+    return magic + salts + nonce + AESGCM(kek).encrypt(nonce, data_key, magic + salts)
+
+
+def unwrap_key(header: bytes, password: str, cache: KeyCache | None = None) -> bytes:
+    """
+    从文件头中解开数据密钥，参见 wrap_key
+
+    Returns:
+        数据密钥，密码错误或文件头损坏时抛出 ValueError
+    """
+    magic = header[:len(ENVELOPE_MAGIC)]
+    salts = header[len(magic):len(magic) + SALTS_SIZE]
+    nonce = header[len(magic) + SALTS_SIZE:len(magic) + SALTS_SIZE + WRAP_NONCE_SIZE]
+    wrapped = header[len(magic) + SALTS_SIZE + WRAP_NONCE_SIZE:ENVELOPE_HEADER_SIZE]
+    kek = cache.key(password, salts) if cache else derive_key(password, salts[:32], salts[32:64], salts[64:])
+    try:
+        return AESGCM(kek).decrypt(nonce, wrapped, magic + salts)
+    except InvalidTag:
+        raise ValueError("密码错误或文件已损坏")
+
+
+def rewrite_header(path: str | Path, header: bytes) -> None:
+    """
+    原地改写文件开头的文件头，先备份旧文件头
+
+    新旧文件头包裹的是同一个数据密钥，都能解开内容，
+    所以中途崩溃后用备份恢复即可，见 recover_header。
+    """
+    path = Path(path)
+    backup = path.with_name(path.name + REKEY_BACKUP_SUFFIX)
+    with open(path, "r+b") as f:
+        old = f.read(len(header))
+        with open(backup, "wb") as b:
+            b.write(old)
+            b.flush()
+            os.fsync(b.fileno())
+        f.seek(0)
+        f.write(header)
+        f.flush()
+        os.fsync(f.fileno())
+    backup.unlink()
+
+
+def recover_header(path: str | Path) -> None:
+    """
+    存在更改密码中途留下的备份时，用其恢复文件头
+    按路径读取加密文件前都应先调用，否则中途崩溃后的文件会被当作密码错误
+    """
+    path = Path(path)
+    backup = path.with_name(path.name + REKEY_BACKUP_SUFFIX)
+    if not backup.is_file():
+        return
+    old = backup.read_bytes()
+    # 备份本身没写完时文件头尚未被改写
+    if len(old) == ENVELOPE_HEADER_SIZE:
+        with open(path, "r+b") as f:
+            f.write(old)
+            f.flush()
+            os.fsync(f.fileno())
+    backup.unlink()
+
+
+def rekey_file(path: str | Path, old_password: str, new_password: str, cache: KeyCache | None = None) -> bool:
+    """
+    更改加密文件的密码
+
+    第二、三版文件只重写文件头；第一版文件没有数据密钥，需整体解密后以第三版格式重新加密。
+
+    Args:
+        path: 加密文件路径
+        old_password: 原密码
+        new_password: 新密码
+        cache: 批量处理时共用的派生缓存
+
+    Returns:
+        是否只重写了文件头，原密码错误时抛出 ValueError
+    """
+    path = Path(path)
+    recover_header(path)
+    with open(path, "rb") as f:
+        header = f.read(ENVELOPE_HEADER_SIZE)
+    magic = header[:len(ENVELOPE_MAGIC)]
+    if magic in (ENVELOPE_MAGIC, FILE_MAGIC):
+        data_key = unwrap_key(header, old_password, cache)
+        rewrite_header(path, wrap_key(magic, data_key, new_password, cache))
+        return True
+    try:
+        *_, (data, file_header) = decrip(path.read_bytes(), old_password)
+    except InvalidTag:
+        raise ValueError("密码错误或文件已损坏")
+    *_, encrypted = encrip(data, new_password, file_header)
+    temp = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+    with open(temp, "wb") as f:
+        f.write(encrypted)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+    return False
+
+
+def _derive_steps(password: str, salts: bytes, cache: KeyCache | None) -> Generator[int, None, bytes]:
+    """
+    分步派生密码密钥，第一层完成后产出一次进度；提供缓存时取用或存入缓存，见 KeyCache.derive_steps
+
+    Returns:
+        32 字节密码密钥，与 derive_key 相同
+    """
+    if cache is not None:
+        return (yield from cache.derive_steps(password, salts))
+
+    # 第一层：PBKDF2HMAC派生主密钥
+    kdf1: PBKDF2HMAC = PBKDF2HMAC(
+        algorithm=hashes.SHA512(),
+        length=32,
+        salt=salts[:32],
+        iterations=500000,
+        backend=default_backend()
+    )
+    key1: bytes = kdf1.derive(password.encode())
 
     yield 1
     
     # 第二层：使用不同参数再次派生
-    salt2: bytes = os.urandom(32)
     kdf2: PBKDF2HMAC = PBKDF2HMAC(
         algorithm=hashes.SHA3_512(),
         length=32,
-        salt=salt2,
+        salt=salts[32:64],
         iterations=300000,
         backend=default_backend()
     )
     key2: bytes = kdf2.derive(key1)
+    
+    # 第三层：HMAC-SHA512处理
+    return hmac.new(key2, salts[64:], hashes.SHA512().name).digest()[:32]
+
+
+def _chunk_aad(index: int, last: bool) -> bytes:
+    """
+    块的附加认证数据，防止块被调换或截断
+    """
+    return FILE_MAGIC + index.to_bytes(8, "big") + (b"\1" if last else b"\0")
+
+
+def _file_meta(header: str, size: int) -> dict:
+    """
+    由调用方的文件头生成第三版文件的元数据
+
+    文件头是 JSON 对象时（如 {"mime": ..., "name": ...}）直接作为元数据，否则原样保存在"header"中；
+    另外记录原始大小与分块大小，读取时可以预先分配缓冲区
+    """
+    try:
+        meta = json.loads(header) if header else {}
+    except ValueError:
+        meta = None
+    if not isinstance(meta, dict):
+        meta = {"header": header}
+    meta.update(size=size, chunk_size=CHUNK_SIZE)
+    return meta
+
+
+def _open_meta(data_key: bytes, encrypted_data: bytes) -> tuple[dict, int]:
+    """
+    解密第三版文件的元数据
+
+    Returns:
+        元数据与第一块密文的偏移
+    """
+    start = ENVELOPE_HEADER_SIZE + META_LENGTH_SIZE
+    length = int.from_bytes(encrypted_data[ENVELOPE_HEADER_SIZE:start], "big")
+    return _unseal_meta(data_key, encrypted_data[start:start + length]), start + length
+
+
+def _unseal_meta(data_key: bytes, sealed: bytes) -> dict:
+    raw = AESGCM(data_key).decrypt(sealed[:NONCE_SIZE], sealed[NONCE_SIZE:], FILE_MAGIC + b"meta")
+    return json.loads(raw)
+
+
+def read_header(source: bytes | str | Path, password: str, cache: KeyCache | None = None) -> dict | None:
+    """
+    只解密第三版文件的元数据，不读取内容
+
+    Args:
+        source: 加密文件路径，或加密数据（只用到开头部分）
+        password: 密码
+        cache: 派生缓存，之后解密内容时传入同一个缓存不会再次派生
+
+    Returns:
+        元数据，包含 size、chunk_size 以及保存时记录的 mime、name 等；
+        第一、二版文件没有独立的元数据，返回 None。密码错误时抛出 ValueError
+    """
+    if not isinstance(source, (bytes, bytearray)):
+        recover_header(source)
+        with open(source, "rb") as f:
+            source = f.read(ENVELOPE_HEADER_SIZE + META_LENGTH_SIZE)
+            length = int.from_bytes(source[ENVELOPE_HEADER_SIZE:], "big")
+            source += f.read(length)
+    if source[:len(FILE_MAGIC)] != FILE_MAGIC:
+        return None
+    data_key = unwrap_key(source[:ENVELOPE_HEADER_SIZE], password, cache)
+    try:
+        return _open_meta(data_key, source)[0]
+    except InvalidTag:
+        raise ValueError("文件已损坏")
+
+
+def iter_decrypt(f: BinaryIO, password: str, cache: KeyCache | None = None) -> tuple[dict, Iterator[bytes]]:
+    """
+    以流的方式解密已打开的加密文件，内存占用只有一块，适合解密到磁盘
+
+    第三版文件逐块认证后产出；第一、二版文件整体只有一个认证标签，
+    解密出的数据在迭代结束时才通过认证，认证失败时迭代抛出异常，调用方应丢弃已写出的内容。
+
+    Args:
+        f: 以二进制模式打开、位于开头的加密文件
+        password: 密码
+        cache: 批量处理时共用的派生缓存
+
+    Returns:
+        (元数据, 明文块的迭代器)，第一、二版文件的元数据为空字典；
+        第二、三版文件密码错误时直接抛出 ValueError
+    """
+    head = f.read(ENVELOPE_HEADER_SIZE)
+    magic = head[:len(FILE_MAGIC)]
+    if magic == FILE_MAGIC:
+        data_key = unwrap_key(head, password, cache)
+        length = int.from_bytes(f.read(META_LENGTH_SIZE), "big")
+        try:
+            meta = _unseal_meta(data_key, f.read(length))
+        except InvalidTag:
+            raise ValueError("文件已损坏")
+        return meta, _iter_chunks(f, AESGCM(data_key), meta)
+    if magic == ENVELOPE_MAGIC:
+        data_key = unwrap_key(head, password, cache)
+        iv_tag = f.read(32)
+        rest = b""
+    else:
+        salts = head[:SALTS_SIZE]
+        data_key = cache.key(password, salts) if cache else derive_key(password, salts[:32], salts[32:64], salts[64:])
+        iv_tag = head[SALTS_SIZE:SALTS_SIZE+32]
+        rest = head[SALTS_SIZE+32:]
+    return {}, _iter_legacy(f, data_key, iv_tag[:16], iv_tag[16:], rest)
+
+
+def _iter_chunks(f: BinaryIO, aead: AESGCM, meta: dict) -> Iterator[bytes]:
+    remaining: int = meta["size"]
+    count: int = max(1, -(-remaining // meta["chunk_size"]))
+    for index in range(count):
+        length = min(remaining, meta["chunk_size"])
+        sealed = f.read(NONCE_SIZE + length + TAG_SIZE)
+        if len(sealed) != NONCE_SIZE + length + TAG_SIZE:
+            raise ValueError("文件已损坏")
+        yield aead.decrypt(sealed[:NONCE_SIZE], sealed[NONCE_SIZE:], _chunk_aad(index, index == count - 1))
+        remaining -= length
+    if f.read(1):
+        raise ValueError("文件已损坏")
+
+
+def _iter_legacy(f: BinaryIO, data_key: bytes, iv: bytes, tag: bytes, rest: bytes) -> Iterator[bytes]:
+    """
+    流式解密第一、二版文件，去掉前后的混淆数据与内部文件头，参见 decrip
+    """
+    decryptor = Cipher(algorithms.AES(data_key), modes.GCM(iv, tag), backend=default_backend()).decryptor()
+    # 开头需跳过的字节数（混淆数据、文件头长度与文件头），读到文件头长度前未知
+    skip: int | None = None
+    pending: bytes = b""
+    data: bytes = rest or f.read(CHUNK_SIZE)
+    while True:
+        pending += decryptor.update(data) if data else decryptor.finalize()
+        if skip is None and len(pending) >= 68:
+            skip = 68 + int.from_bytes(pending[64:68], "big")
+        # 末尾 64 字节可能是混淆数据，读完前始终保留
+        if skip is not None and len(pending) > skip + 64:
+            yield pending[skip:-64]
+            pending, skip = pending[-64:], 0
+        if not data:
+            break
+        data = f.read(CHUNK_SIZE)
+    if skip is None:
+        raise ValueError("文件已损坏")
+
+
+def encrip(data: bytes, password: str, header: str, cache: KeyCache | None = None) -> bytes:
+    """
+    加密数据
+    
+    Args:
+        data: 要加密的原始数据
+        password: 加密密码
+        header: 文件头信息，JSON 对象（见 filetype.make_header）会成为元数据的一部分
+        cache: 派生缓存，标签页重复保存同一文件时传入同一个缓存，密码未变时不再派生密钥
+        
+    Returns:
+        第三版格式的加密数据，包含文件头、加密的元数据与分块密文
+    """
+    # 第一、二层：PBKDF2HMAC派生，第三层：HMAC-SHA512处理
+    salts: bytes = cache.fresh_salts(password) if cache is not None else os.urandom(SALTS_SIZE)
+    password_key: bytes = yield from _derive_steps(password, salts, cache)
 
     yield 2
     
-    # 第三层：HMAC-SHA512处理
-    salt3: bytes = os.urandom(32)
-    hmac_key: bytes = hmac.new(key2, salt3, hashes.SHA512().name).digest()
+    # 内容使用随机数据密钥加密，数据密钥由密码密钥包裹后放在文件头中
+    data_key: bytes = os.urandom(32)
+    wrap_nonce: bytes = os.urandom(WRAP_NONCE_SIZE)
+    wrapped_key: bytes = AESGCM(password_key).encrypt(wrap_nonce, data_key, FILE_MAGIC + salts)
 
     yield 3
     
-    # 第四层：使用AES-256-GCM加密
-    iv: bytes = os.urandom(16)
-    cipher: Cipher = Cipher(algorithms.AES(hmac_key[:32]), modes.GCM(iv), backend=default_backend())
-    encryptor = cipher.encryptor()
+    # 第四层：使用AES-256-GCM分别加密元数据与每一块内容
+    aead: AESGCM = AESGCM(data_key)
 
     yield 4
     
-    # 准备数据
-    header_bytes: bytes = header.encode()
-    header_length: bytes = len(header_bytes).to_bytes(4, byteorder='big')
-    combined_data: bytes = header_length + header_bytes + data
+    # 元数据单独加密，读取时不必解密内容
+    meta_nonce: bytes = os.urandom(NONCE_SIZE)
+    sealed_meta: bytes = meta_nonce + aead.encrypt(
+        meta_nonce, json.dumps(_file_meta(header, len(data)), ensure_ascii=False).encode(), FILE_MAGIC + b"meta")
 
     yield 5
     
-    # 添加额外的混淆数据
-    obfuscation_data: bytes = os.urandom(64)  # 64字节随机数据
-    final_data: bytes = obfuscation_data + combined_data + obfuscation_data[::-1]  # 前后添加混淆数据
+    # 分块加密内容
+    view: memoryview = memoryview(data)
+    count: int = max(1, -(-len(data) // CHUNK_SIZE))
+    chunks: list[bytes] = []
+    for index in range(count):
+        nonce = os.urandom(NONCE_SIZE)
+        chunk = view[index * CHUNK_SIZE:(index + 1) * CHUNK_SIZE]
+        chunks.append(nonce + aead.encrypt(nonce, chunk, _chunk_aad(index, index == count - 1)))
 
     yield 6
     
-    # 加密数据
-    encrypted_data: bytes = encryptor.update(final_data) + encryptor.finalize()
-    tag: bytes = encryptor.tag
+    # 拼接文件头、元数据与密文
+    encrypted_data: bytes = b"".join([FILE_MAGIC, salts, wrap_nonce, wrapped_key,
+                                      len(sealed_meta).to_bytes(META_LENGTH_SIZE, "big"), sealed_meta, *chunks])
 
     yield 7
     
+    # 添加随机延迟，复用缓存的密钥重复保存时不需要
+    if cache is None:
+        time.sleep(0.1)
+    
+    # 返回所有必要的数据
+    yield encrypted_data
+
+
+def iter_encrypt(f: BinaryIO, size: int, password: str, header: str,
+                 cache: KeyCache | None = None) -> tuple[int, Iterator[bytes]]:
+    """
+    以流的方式加密已打开的文件，生成与 encrip 相同的第三版格式，内存占用只有一块，适合加密到磁盘
+
+    Args:
+        f: 以二进制模式打开、位于开头的源文件
+        size: 源文件大小，记录在元数据中
+        password: 加密密码
+        header: 文件头信息，见 encrip
+        cache: 批量处理时共用的派生缓存
+
+    Returns:
+        (加密数据的总长度, 加密数据块的迭代器)；读取到的内容与 size 不符时迭代抛出 ValueError
+    """
+    data_key: bytes = os.urandom(32)
+    head: bytes = wrap_key(FILE_MAGIC, data_key, password, cache)
+    aead: AESGCM = AESGCM(data_key)
+    meta_nonce: bytes = os.urandom(NONCE_SIZE)
+    sealed_meta: bytes = meta_nonce + aead.encrypt(
+        meta_nonce, json.dumps(_file_meta(header, size), ensure_ascii=False).encode(), FILE_MAGIC + b"meta")
+    count: int = max(1, -(-size // CHUNK_SIZE))
+    length: int = len(head) + META_LENGTH_SIZE + len(sealed_meta) + count * (NONCE_SIZE + TAG_SIZE) + size
+
+    def chunks() -> Iterator[bytes]:
+        yield head + len(sealed_meta).to_bytes(META_LENGTH_SIZE, "big") + sealed_meta
+        remaining = size
+        for index in range(count):
+            length = min(remaining, CHUNK_SIZE)
+            chunk = f.read(length)
+            if len(chunk) != length or index == count - 1 and f.read(1):
+                raise ValueError("源文件在加密过程中被修改")
+            remaining -= length
+            nonce = os.urandom(NONCE_SIZE)
+            yield nonce + aead.encrypt(nonce, chunk, _chunk_aad(index, index == count - 1))
+
+    return length, chunks()
+
+
+def _decrip_chunked(encrypted_data: bytes, password: str, cache: KeyCache | None) -> Tuple[bytearray, str]:
+    """
+    解密第三版文件，按元数据中的大小预先分配缓冲区，逐块解密到其中，参见 decrip
+    """
+    salts: bytes = encrypted_data[len(FILE_MAGIC):len(FILE_MAGIC)+SALTS_SIZE]
+    password_key: bytes = yield from _derive_steps(password, salts, cache)
+
+    yield 2
+    
+    data_key: bytes = AESGCM(password_key).decrypt(
+        encrypted_data[len(FILE_MAGIC)+SALTS_SIZE:len(FILE_MAGIC)+SALTS_SIZE+WRAP_NONCE_SIZE],
+        encrypted_data[len(FILE_MAGIC)+SALTS_SIZE+WRAP_NONCE_SIZE:ENVELOPE_HEADER_SIZE],
+        FILE_MAGIC + salts)
+
+    yield 3
+    
+    meta, offset = _open_meta(data_key, encrypted_data)
+    aead: AESGCM = AESGCM(data_key)
+
+    yield 4
+    
+    # 按原始大小一次分配，避免拼接各块时的多次复制
+    size: int = meta["size"]
+    chunk_size: int = meta["chunk_size"]
+    count: int = max(1, -(-size // chunk_size))
+    if len(encrypted_data) - offset != count * (NONCE_SIZE + TAG_SIZE) + size:
+        raise ValueError("文件已损坏")
+    data: bytearray = bytearray(size)
+
+    yield 5
+    
+    step: int = NONCE_SIZE + chunk_size + TAG_SIZE
+    for index in range(count):
+        sealed = encrypted_data[offset + index * step:offset + (index + 1) * step]
+        data[index * chunk_size:(index + 1) * chunk_size] = aead.decrypt(
+            sealed[:NONCE_SIZE], sealed[NONCE_SIZE:], _chunk_aad(index, index == count - 1))
+
+    yield 6
+    
     # 添加随机延迟
     time.sleep(0.1)
+
+    yield 7
     
-    # 返回所有必要的数据
-    yield salt1 + salt2 + salt3 + iv + tag + encrypted_data
+    yield data, json.dumps(meta, ensure_ascii=False)
 
 
-def decrip(encrypted_data: bytes, password: str) -> Tuple[bytes, str]:
+def decrip(encrypted_data: bytes, password: str, cache: KeyCache | None = None) -> Tuple[bytes, str]:
     """
     解密数据
     
     Args:
         encrypted_data: 加密后的数据
         password: 解密密码
+        cache: 派生缓存，打开文件后将同一个缓存用于保存，密码未变时保存不再派生密钥
         
     Returns:
-        原始数据和文件头的元组
+        原始数据和文件头的元组；第三版文件的文件头为元数据的 JSON，原始数据为预先分配的 bytearray
     """
-    # 提取参数
-    salt1: bytes = encrypted_data[:32]
-    salt2: bytes = encrypted_data[32:64]
-    salt3: bytes = encrypted_data[64:96]
-    iv: bytes = encrypted_data[96:112]
-    tag: bytes = encrypted_data[112:128]
-    ciphertext: bytes = encrypted_data[128:]
+    if encrypted_data[:len(FILE_MAGIC)] == FILE_MAGIC:
+        yield from _decrip_chunked(encrypted_data, password, cache)
+        return
 
-    yield 1
+    # 提取参数，第二版文件在盐值前有魔数，盐值后有被包裹的数据密钥
+    envelope: bool = encrypted_data[:len(ENVELOPE_MAGIC)] == ENVELOPE_MAGIC
+    start: int = len(ENVELOPE_MAGIC) if envelope else 0
+    salts: bytes = encrypted_data[start:start+96]
+    body: bytes = encrypted_data[ENVELOPE_HEADER_SIZE:] if envelope else encrypted_data[96:]
+    iv: bytes = body[:16]
+    tag: bytes = body[16:32]
+    ciphertext: bytes = body[32:]
     
     # 派生密钥
-    kdf1: PBKDF2HMAC = PBKDF2HMAC(
-        algorithm=hashes.SHA512(),
-        length=32,
-        salt=salt1,
-        iterations=500000,
-        backend=default_backend()
-    )
-    key1: bytes = kdf1.derive(password.encode())
-    
-    kdf2: PBKDF2HMAC = PBKDF2HMAC(
-        algorithm=hashes.SHA3_512(),
-        length=32,
-        salt=salt2,
-        iterations=300000,
-        backend=default_backend()
-    )
-    key2: bytes = kdf2.derive(key1)
+    password_key: bytes = yield from _derive_steps(password, salts, cache)
 
     yield 2
     
-    # HMAC处理
-    hmac_key: bytes = hmac.new(key2, salt3, hashes.SHA512().name).digest()
+    # 第二版文件解开数据密钥，第一版文件直接使用密码密钥
+    if envelope:
+        wrap_nonce: bytes = encrypted_data[start+96:start+96+WRAP_NONCE_SIZE]
+        wrapped_key: bytes = encrypted_data[start+96+WRAP_NONCE_SIZE:ENVELOPE_HEADER_SIZE]
+        data_key: bytes = AESGCM(password_key).decrypt(wrap_nonce, wrapped_key, ENVELOPE_MAGIC + salts)
+    else:
+        data_key: bytes = password_key
 
     yield 3
     
     # 解密
-    cipher: Cipher = Cipher(algorithms.AES(hmac_key[:32]), modes.GCM(iv, tag), backend=default_backend())
+    cipher: Cipher = Cipher(algorithms.AES(data_key), modes.GCM(iv, tag), backend=default_backend())
     decryptor = cipher.decryptor()
 
     yield 4
@@ -0,0 +1,38 @@
+from secret_space import SecretSpace
+from secret_space.cache import EntryCache
+from ui.notebook import tabs_dict, remove_tab
+from ui.space_list import show_space, refresh_space_list
+from ui.frames.frame_type import FrameType
+
+
+# 当前打开的秘密空间，同一时间只打开一个
+_current_space: SecretSpace | None = None
+
+# 当前空间已解密条目的缓存，预算与清零策略由设置决定
+entry_cache = EntryCache()
+
+
+def get_current_space() -> SecretSpace | None:
+    """
+    获取当前打开的秘密空间，若未打开返回 None。
+    """
+    return _current_space
+
+
+def set_current_space(space: SecretSpace | None) -> None:
+    """
+    设置当前打开的秘密空间，并关闭“未打开秘密空间”提示页。
+    关闭之前打开的空间；其他程序修改新空间后自动刷新侧栏。
+    """
+    global _current_space
+    if _current_space is not None and _current_space is not space:
+        _current_space.close()
+    _current_space = space
+    entry_cache.clear()
+    show_space(space)
+    if space is not None:
+        space.watch(refresh_space_list)
+    if space is not None:
+        for frame in list(tabs_dict):
+            if frame.notebook.type == FrameType.NO_SPACE:
+                remove_tab(frame)
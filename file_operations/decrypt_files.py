@@ -0,0 +1,49 @@
+from tkinter import messagebox, filedialog, BooleanVar
+from multithread import threadfunc
+from batch import decrypt_files, walk_encrypted
+from ui.ask import ask_choice, ask_password
+from ui.waiting import WaitWindow
+
+
+@threadfunc(daemon=True)
+def decrypt_to_folder():
+    mode = ask_choice("解密到文件夹", "选择要解密的文件：", ["选择文件", "选择文件夹（包括子文件夹中的加密文件）"])
+    if not mode: return
+    if mode == "选择文件":
+        paths = list(filedialog.askopenfilenames(title="选择加密文件", filetypes=[("加密文件", "*.enc*")]))
+    else:
+        dir_path = filedialog.askdirectory(title="选择加密文件所在文件夹")
+        paths = [dir_path] if dir_path else []
+    if not paths: return
+    total = sum(1 for _ in walk_encrypted(paths))
+    if not total:
+        messagebox.showinfo("解密到文件夹", "没有找到加密文件")
+        return
+    target = filedialog.askdirectory(title="选择解密到的文件夹")
+    if not target: return
+    key = ask_password("解密到文件夹", f"请输入这{total}个文件的密码：")
+    if not key: return
+    exists = ask_choice("解密到文件夹", "输出路径已存在时：", ["跳过", "覆盖"])
+    if not exists: return
+    remain = BooleanVar(value=True)
+    ww = WaitWindow("解密中", f'正在解密{total}个文件，\n输出路径："{target}"', total)
+    def on_close():
+        if messagebox.askyesno("停止解密", "确定停止解密吗？\n已解密的文件会被保留。"):
+            remain.set(False)
+    ww.set_on_close(on_close)
+    try:
+        count, skipped, errors = decrypt_files(paths, target, key, exists == "覆盖",
+                                               progress=lambda done, total: ww.config(current_count=done),
+                                               should_stop=lambda: not remain.get())
+    except Exception as e:
+        ww.showerror("错误", f"解密失败，错误信息：{e}")
+        ww.destroy()
+        return
+    ww.destroy()
+    note = f"\n{len(skipped)}个文件的输出路径已存在，已跳过。" if skipped else ""
+    if errors:
+        lines = "\n".join(f"{path}：{error}" for path, error in list(errors.items())[:30])
+        more = f"\n……共{len(errors)}项" if len(errors) > 30 else ""
+        messagebox.showerror("解密完成", f"已解密{count}个文件，{len(errors)}个文件解密失败：\n{lines}{more}{note}")
+    elif remain.get():
+        messagebox.showinfo("解密完成", f'已解密{count}个文件到"{target}"{note}')
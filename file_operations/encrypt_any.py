@@ -0,0 +1,86 @@
+from tkinter import messagebox, filedialog, BooleanVar
+from pathlib import Path
+from batch import encrypt_files, find_conflicts, has_journal, has_manifest, SKIP, OVERWRITE, RENAME
+from ui.ask import ask_conflicts
+from ui.waiting import WaitWindow
+from file_operations.pack import ask_save_mode, save_pack, PACK_CHOICE
+
+
+def save_any_files(tab, key: str, title: str) -> None:
+    """
+    保存加密任意文件页面：打包，或将每个文件单独加密到所选文件夹，文件夹保留其目录结构
+    需在子线程中调用
+
+    Args:
+        tab: 加密任意文件页面
+        key: 密码
+        title: 选择输出文件夹时的标题
+    """
+    items = [(path_var.get(), name_var.get()) for path_var, name_var in zip(tab.notebook.entry_vars, tab.notebook.name_vars)
+             if path_var.get()]
+    if not items: return
+    mode = ask_save_mode(len(items) + sum(Path(path).is_dir() for path, _name in items))
+    if not mode: return
+    if mode == PACK_CHOICE:
+        save_pack(tab, key)
+        return
+    dir_path = filedialog.askdirectory(title=title)
+    if not dir_path: return
+    resume = has_journal(dir_path) and messagebox.askyesno(
+        "继续加密", "该文件夹中有上次未完成的加密，是否从中断处继续？\n已完成的文件会被跳过，未写完的文件会重新加密。")
+    # 文件夹中已有清单时（如由 python batch.py encrypt --incremental 生成）只加密新增或变化了的文件
+    incremental = has_manifest(dir_path)
+    remain = BooleanVar(value=True)
+    ww = WaitWindow("检查中", f'正在检查输出路径是否已存在，\n输出路径："{dir_path}"', 1)
+    def on_close():
+        if messagebox.askyesno("停止加密", "确定停止加密吗？\n已加密的文件会被保留，再次保存到同一文件夹时可以从中断处继续。"):
+            remain.set(False)
+    ww.set_on_close(on_close)
+    # 开始加密前一次性处理所有已存在的输出路径，加密过程中不再中途等待
+    try:
+        conflicts = find_conflicts(items, dir_path, resume, incremental, should_stop=lambda: not remain.get())
+    except Exception as e:
+        ww.showerror("错误", f"检查输出路径失败，错误信息：{e}")
+        ww.destroy()
+        return
+    ww.destroy()
+    if not remain.get(): return
+    resolutions = {}
+    if conflicts:
+        choices = {"跳过": SKIP, "覆盖": OVERWRITE, "重命名": RENAME}
+        labels = {f"{output}（源文件：{source}）": source for source, output in conflicts}
+        answer = ask_conflicts("路径冲突",
+                               f"以下{len(conflicts)}个输出路径已存在或与本次的其他文件重名，请选择处理方式：\n"
+                               "（本次的文件之间不会相互覆盖，重名时选择覆盖按重命名处理）",
+                               list(labels), list(choices))
+        if answer is None: return
+        resolutions = {labels[label]: choices[choice] for label, choice in answer.items()}
+    ww = WaitWindow("加密中", f'正在加密，\n输出路径："{dir_path}"', 1)
+    ww.set_on_close(on_close)
+    def progress(done, found, walked):
+        ww.config(total_count=max(found, 1), current_count=done,
+                  description=f"已加密{done}/{found}个文件" + ("" if walked else "，仍在扫描文件夹……"))
+    try:
+        # 检查之后才出现的冲突另取名称，不会丢下文件不加密
+        count, unchanged, skipped, errors = encrypt_files(items, dir_path, key, tab.notebook.key_cache,
+                                                          lambda source, _output: resolutions.get(source, RENAME),
+                                                          progress=progress, should_stop=lambda: not remain.get(),
+                                                          resume=resume, incremental=incremental)
+    except Exception as e:
+        ww.showerror("错误", f"加密失败，错误信息：{e}")
+        ww.destroy()
+        return
+    ww.destroy()
+    note = ""
+    if skipped:
+        lines = "\n".join(skipped[:30])
+        more = f"\n……共{len(skipped)}项" if len(skipped) > 30 else ""
+        note = f"\n以下{len(skipped)}个文件因输出路径冲突被跳过，未加密：\n{lines}{more}"
+    if errors:
+        lines = "\n".join(f"{path}：{error}" for path, error in list(errors.items())[:30])
+        more = f"\n……共{len(errors)}项" if len(errors) > 30 else ""
+        messagebox.showerror("加密完成", f"已加密{count}个文件，{len(errors)}个文件加密失败：\n{lines}{more}{note}")
+    elif incremental and remain.get():
+        messagebox.showinfo("加密完成", f"已加密{count}个新增或变化了的文件，{unchanged}个文件未变化{note}")
+    elif skipped:
+        messagebox.showwarning("加密完成", f"已加密{count}个文件{note}")
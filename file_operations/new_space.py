@@ -1,2 +1,30 @@
+from tkinter import messagebox, filedialog
+from multithread import threadfunc
+from secret_space import SecretSpace
+from ui.ask import ask_password
+from ui.waiting import WaitWindow
+from file_operations.current_space import set_current_space
+
+
+@threadfunc(daemon=True)
 def new_space():
-    print("2")
+    dir_path = filedialog.askdirectory(title="选择秘密空间的存放目录（需为空目录）")
+    if not dir_path: return
+    key = ask_password("新建秘密空间", "请输入空间密码：")
+    if not key: return
+    if ask_password("新建秘密空间", "请再次输入空间密码：") != key:
+        messagebox.showwarning("警告", "密钥输入不一致！")
+        return
+    fulltext = messagebox.askyesno("全文索引", "是否为文本条目启用全文索引？\n启用后可搜索文本内容，索引同样加密存储在空间中。")
+    ww = WaitWindow("创建中", f'正在创建秘密空间"{dir_path}"', 1)
+    try:
+        space = SecretSpace.create(dir_path, key)
+        if fulltext:
+            space.enable_fulltext()
+            space.commit()
+    except Exception as e:
+        ww.destroy()
+        messagebox.showerror("错误", f"创建失败，错误信息：{e}")
+        return
+    ww.destroy()
+    set_current_space(space)
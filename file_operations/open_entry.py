@@ -0,0 +1,78 @@
+from tkinter import messagebox, BooleanVar
+from pathlib import Path
+from typing import Iterator
+from multithread import threadfunc
+from ui.waiting import WaitWindow
+from file_operations.viewers import VIDEO_EXTENSIONS, SNIFF_SIZE, StreamAborted, choose_viewer
+from file_operations.current_space import get_current_space, entry_cache
+
+
+def _decrypt_entry(space, name: str, remain: BooleanVar) -> Iterator[bytes]:
+    """
+    在等待窗口中逐块解密条目并产出每一块，取消或出错时将 remain 置为 False 并抛出 StreamAborted
+    完整读完后结果会放入条目缓存
+    """
+    total = max(len(space.entries[name]["chunks"]), 1)
+    ww = WaitWindow("解密中", f'正在解密条目"{name}"', total)
+    def on_close():
+        if messagebox.askyesno("停止解密", "确定停止解密吗？"):
+            remain.set(False)
+    ww.set_on_close(on_close)
+    parts = []
+    try:
+        for data in space.iter_read(name):
+            if not remain.get(): break
+            parts.append(data)
+            ww.config(current_count=ww.current_count+1)
+            yield data
+    except Exception as e:
+        remain.set(False)
+        messagebox.showerror("错误", "条目已损坏")
+        print(e)
+    finally:
+        ww.destroy()
+    if not remain.get():
+        raise StreamAborted(name)
+    entry_cache.put(name, space.entries[name]["digest"], b"".join(parts))
+
+
+@threadfunc(daemon=True)
+def open_entry(name: str):
+    space = get_current_space()
+    if space is None or name not in space.entries:
+        return
+    ext = Path(name).suffix.lower()
+    data = entry_cache.get(name, space.entries[name]["digest"])
+    stream = None
+    remain = BooleanVar(value=True)
+    if data is None:
+        stream = _decrypt_entry(space, name, remain)
+        try:
+            # 空条目没有块，数据流正常结束时即为空内容
+            head = next(stream, b"")
+        except StreamAborted:
+            return
+    else:
+        head = data
+    viewer, mime = choose_viewer({}, head[:SNIFF_SIZE], ext)
+    if viewer is None:
+        if stream is not None: stream.close()
+        messagebox.showinfo("无法预览", "不支持预览此类型的条目")
+        return
+    if data is None:
+        # 支持数据流的页面边解密边展示，其余页面等待全部块解密完成
+        source = _chain(head, stream)
+        if not viewer.streaming:
+            try:
+                source = b"".join(source)
+            except StreamAborted:
+                return
+    else:
+        source = data
+    viewer.open(Path(name).name, source, space_entry=name, mime=mime,
+                extension=ext if ext in VIDEO_EXTENSIONS else None)
+
+
+def _chain(head: bytes, stream: Iterator[bytes]) -> Iterator[bytes]:
+    yield head
+    yield from stream
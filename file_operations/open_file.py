@@ -1,157 +1,148 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tkinter import messagebox, filedialog, BooleanVar
 from pathlib import Path
 from multithread import threadfunc
-from encrip import decrip
+from encrip import decrip, read_header, KeyCache, FILE_MAGIC, ENVELOPE_MAGIC, SALTS_SIZE
+from encpack import EXTENSION as PACK_EXTENSION
 from ui.ask import ask_password
+from file_operations.read_ahead import read_ahead
 from ui.waiting import WaitWindow
-from ui.notebook import add_tab, switch_to_tab, mark_tab_modified
-from ui.frames.text_frame import build_text_frame
-from ui.frames.audio_frame import audio_frame
-from ui.frames.video_frame import video_frame
-from ui.frames.picture_frame import picture_frame
+from file_operations.pack import open_pack
+from file_operations.viewers import VIDEO_EXTENSIONS, SNIFF_SIZE, choose_viewer, find_viewer, parse_header
 
 
-AUDIO_EXTENSIONS = {
-    ".mp3", ".wav", ".flac", ".aac", ".ogg", ".wma", ".m4a", ".opus", ".aiff", ".au"
-}
-VIDEO_EXTENSIONS = {
-    ".mp4", ".avi", ".mkv", ".mov", ".wmv", ".flv", ".webm", ".m4v", ".mpg", ".mpeg"
-}
-IMAGE_EXTENSIONS = {
-    ".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff", ".tif", ".svg", ".webp", ".ico"
-}
+def _show_decrypted(file_path: str, data: bytes, key: str, cache: KeyCache, header: str = "") -> bool:
+    """
+    在新标签页中展示解密后的文件，按文件头中的原始类型、特征字节、扩展名依次选择页面
 
+    Returns:
+        是否找到了可以展示的页面
+    """
+    original_ext = "." + Path(file_path).suffix.lower()[len(".enc"):]
+    viewer, mime = choose_viewer(parse_header(header), data[:SNIFF_SIZE], original_ext)
+    if viewer is None:
+        return False
+    viewer.open(Path(file_path).name, data, path=file_path, key=key, cache=cache, mime=mime,
+                extension=original_ext if original_ext in VIDEO_EXTENSIONS else None)
+    return True
 
-ENCRYPTED_AUDIO_EXTENSIONS = {".enc" + ext[1:] for ext in AUDIO_EXTENSIONS}
-ENCRYPTED_VIDEO_EXTENSIONS = {".enc" + ext[1:] for ext in VIDEO_EXTENSIONS}
-ENCRYPTED_IMAGE_EXTENSIONS = {".enc" + ext[1:] for ext in IMAGE_EXTENSIONS}
 
-
-def text_frame(name, path=None):
-    frame = add_tab(name)
-    build_text_frame(frame)
-    switch_to_tab(frame)
-    frame.notebook.path = path
-    return frame
+def _open_files(file_paths: list[str]) -> None:
+    """
+    同时打开多个加密文件：只询问一次密码，并行解密，每个文件解密完成后立即打开其标签页
+    """
+    skipped = [path for path in file_paths if Path(path).suffix.lower() == PACK_EXTENSION]
+    file_paths = [path for path in file_paths if Path(path).suffix.lower() != PACK_EXTENSION]
+    if skipped:
+        lines = "\n".join(skipped[:10])
+        more = f"\n……共{len(skipped)}项" if len(skipped) > 10 else ""
+        messagebox.showwarning("警告", f"以下文件无法批量打开，已跳过（加密包请单独打开）：\n{lines}{more}")
+    if not file_paths: return
+    # 输入密码的同时在后台读取文件
+    readings = {path: read_ahead(path) for path in file_paths}
+    key = ask_password("打开加密文件", f"请输入这{len(file_paths)}个文件的密码：")
+    if not key: return
+    remain = BooleanVar(value=True)
+    ww = WaitWindow("解密中", f"正在解密{len(file_paths)}个文件", len(file_paths))
+    def on_close():
+        if messagebox.askyesno("停止解密", "确定停止解密吗？\n已解密的文件会保持打开。"):
+            remain.set(False)
+    ww.set_on_close(on_close)
+    # 盐值相同的文件（如一起更改过密码的文件）只派生一次密钥
+    cache = KeyCache()
+    def decrypt(path: str) -> tuple[bytes, str] | None:
+        if not remain.get():
+            return None
+        *_, result = decrip(readings.pop(path).result(), key, cache)
+        return result
+    failed = []
+    unsupported = []
+    with ThreadPoolExecutor(max_workers=min(len(file_paths), os.cpu_count() or 4)) as pool:
+        futures = {pool.submit(decrypt, path): path for path in file_paths}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failed.append(path)
+                print(e)
+            else:
+                if result is not None:
+                    data, header = result
+                    if not _show_decrypted(path, data, key, cache, header):
+                        unsupported.append(path)
+            ww.config(current_count=ww.current_count+1, description=f'正在解密{len(file_paths)}个文件，\n已完成："{path}"')
+    ww.destroy()
+    if failed:
+        lines = "\n".join(failed[:30])
+        more = f"\n……共{len(failed)}项" if len(failed) > 30 else ""
+        messagebox.showerror("错误", f"以下文件密码错误或已损坏：\n{lines}{more}")
+    if unsupported:
+        lines = "\n".join(unsupported[:30])
+        more = f"\n……共{len(unsupported)}项" if len(unsupported) > 30 else ""
+        messagebox.showwarning("警告", f"以下文件不支持预览：\n{lines}{more}")
 
 
 @threadfunc(daemon=True)
 def open_file():
-    file_path = filedialog.askopenfilename(
-        title="选择要打开的加密文件",
+    file_paths = filedialog.askopenfilenames(
+        title="选择要打开的加密文件（可多选）",
         filetypes=[("加密文件", "*.enc*")]
     )
+    if len(file_paths) > 1:
+        _open_files(list(file_paths))
+        return
+    file_path = file_paths[0] if file_paths else ""
     if file_path:
         ext = Path(file_path).suffix.lower()
         if not ext.startswith(".enc"):
             messagebox.showerror("错误", "文件扩展名无法识别")
             return
-        if ext == ".enctxt":
-            key = ask_password()
-            if not key: return
-            remain = BooleanVar(value=True)
-            ww = WaitWindow("解密中", f'正在解密"{file_path}"', 1)
-            def on_close():
-                if messagebox.askyesno("停止解密", "确定停止解密吗？"):
-                    remain.set(False)
-            ww.set_on_close(on_close)
-            try:
-                with open(file_path, "rb") as f:
-                    encrypted_data = f.read()
-                decription = decrip(encrypted_data, key)
-                for _ in range(7):
-                    ww.config(current_count=ww.current_count+1/7)
-                    if not remain.get(): ww.destroy();return
-                    next(decription)
-                content = next(decription)[0].decode("utf-8")
-            except Exception as e:
-                messagebox.showerror("错误", "密码错误或文件已损坏")
-                print(e)
-                return
-            ww.destroy()
-            tab = text_frame(Path(file_path).name, file_path)
-            tab.notebook.set_values_safely(text_content=content, key=key, confirm_key=key)
-            mark_tab_modified(tab, False)
-
-            
-        elif ext in ENCRYPTED_AUDIO_EXTENSIONS:
-            key = ask_password()
-            if not key: return
-            remain = BooleanVar(value=True)
-            ww = WaitWindow("解密中", f'正在解密音频文件"{file_path}"', 1)
-            def on_close():
-                if messagebox.askyesno("停止解密", "确定停止解密吗？"):
-                    remain.set(False)
-            ww.set_on_close(on_close)
-            try:
-                with open(file_path, "rb") as f:
-                    encrypted_data = f.read()
-                decription = decrip(encrypted_data, key)
-                for _ in range(7):
-                    ww.config(current_count=ww.current_count+1/7)
-                    if not remain.get(): ww.destroy();return
-                    next(decription)
-                audio_data = next(decription)[0]
-            except Exception as e:
-                messagebox.showerror("错误", "密码错误或文件已损坏")
-                print(e)
-                return
-            ww.destroy()
-            tab = add_tab(Path(file_path).name)
-            audio_frame(tab, audio_data)
-            switch_to_tab(tab)
-        elif ext in ENCRYPTED_VIDEO_EXTENSIONS:
-            key = ask_password()
-            if not key: return
-            remain = BooleanVar(value=True)
-            ww = WaitWindow("解密中", f'正在解密视频文件"{file_path}"', 1)
-            def on_close():
-                if messagebox.askyesno("停止解密", "确定停止解密吗？"):
-                    remain.set(False)
-            ww.set_on_close(on_close)
-            try:
-                with open(file_path, "rb") as f:
-                    encrypted_data = f.read()
-                decription = decrip(encrypted_data, key)
-                for _ in range(7):
-                    ww.config(current_count=ww.current_count+1/7)
-                    if not remain.get(): ww.destroy();return
-                    next(decription)
-                video_data = next(decription)[0]
-            except Exception as e:
-                messagebox.showerror("错误", "密码错误或文件已损坏")
-                print(e)
-                return
-            ww.destroy()
-            original_ext = ext.replace(".enc", "")
-            tab = add_tab(Path(file_path).name)
-            video_frame(tab, video_data, extension=original_ext)
-            switch_to_tab(tab)
-        elif ext in ENCRYPTED_IMAGE_EXTENSIONS:
-            key = ask_password()
-            if not key: return
-            remain = BooleanVar(value=True)
-            ww = WaitWindow("解密中", f'正在解密图片文件"{file_path}"', 1)
-            def on_close():
-                if messagebox.askyesno("停止解密", "确定停止解密吗？"):
-                    remain.set(False)
-            ww.set_on_close(on_close)
+        if ext == PACK_EXTENSION:
+            open_pack(file_path)
+            return
+        # 输入密码的同时在后台读取文件
+        reading = read_ahead(file_path)
+        key = ask_password()
+        if not key: return
+        remain = BooleanVar(value=True)
+        ww = WaitWindow("解密中", f'正在解密"{file_path}"', 1)
+        def on_close():
+            if messagebox.askyesno("停止解密", "确定停止解密吗？"):
+                remain.set(False)
+        ww.set_on_close(on_close)
+        try:
+            encrypted_data = reading.result()
+            cache = KeyCache()
+            # 先分步派生密钥并存入缓存，派生最慢，期间同样显示进度、响应停止
+            magic = encrypted_data[:len(FILE_MAGIC)]
+            start = len(magic) if magic in (FILE_MAGIC, ENVELOPE_MAGIC) else 0
+            derivation = cache.derive_steps(key, encrypted_data[start:start + SALTS_SIZE])
             try:
-                with open(file_path, "rb") as f:
-                    encrypted_data = f.read()
-                decription = decrip(encrypted_data, key)
-                for _ in range(7):
-                    ww.config(current_count=ww.current_count+1/7)
+                while True:
+                    ww.config(current_count=ww.current_count+1/9)
                     if not remain.get(): ww.destroy();return
-                    next(decription)
-                image_data = next(decription)[0]
-            except Exception as e:
-                messagebox.showerror("错误", "密码错误或文件已损坏")
-                print(e)
+                    next(derivation)
+            except StopIteration:
+                pass
+            # 新格式文件派生密钥后先只解密元数据，不支持预览的类型无需解密内容
+            meta = read_header(encrypted_data, key, cache)
+            if meta and meta.get("mime") and find_viewer(meta["mime"]) is None:
+                ww.destroy()
+                messagebox.showerror("错误", f'不支持预览此类型的文件（{meta["mime"]}）')
                 return
+            decription = decrip(encrypted_data, key, cache)
+            for _ in range(7):
+                ww.config(current_count=ww.current_count+1/9)
+                if not remain.get(): ww.destroy();return
+                next(decription)
+            data, header = next(decription)
+        except Exception as e:
             ww.destroy()
-            tab = add_tab(Path(file_path).name)
-            picture_frame(tab, image_data)
-            switch_to_tab(tab)
-        else:
-            messagebox.showerror("错误", "不支持的文件类型")
+            messagebox.showerror("错误", "密码错误或文件已损坏")
+            print(e)
+            return
+        ww.destroy()
+        if not _show_decrypted(file_path, data, key, cache, header):
+            messagebox.showerror("错误", "不支持预览此类型的文件")
@@ -1,2 +1,27 @@
+from tkinter import messagebox, filedialog
+from multithread import threadfunc
+from secret_space import SecretSpace, is_space
+from ui.ask import ask_password
+from ui.waiting import WaitWindow
+from file_operations.current_space import set_current_space
+
+
+@threadfunc(daemon=True)
 def open_space():
-    print("4")
+    dir_path = filedialog.askdirectory(title="选择要打开的秘密空间")
+    if not dir_path: return
+    if not is_space(dir_path):
+        messagebox.showerror("错误", "所选目录不是秘密空间")
+        return
+    key = ask_password()
+    if not key: return
+    ww = WaitWindow("打开中", f'正在打开秘密空间"{dir_path}"', 1)
+    try:
+        space = SecretSpace.open(dir_path, key)
+    except Exception as e:
+        ww.destroy()
+        messagebox.showerror("错误", "密码错误或空间已损坏")
+        print(e)
+        return
+    ww.destroy()
+    set_current_space(space)
@@ -0,0 +1,149 @@
+from tkinter import messagebox, filedialog, BooleanVar
+from pathlib import Path
+from encpack import PackWriter, PackReader, EXTENSION
+from batch import parallel_walk, member_path
+from ui.ask import ask_choice, ask_password
+from ui.waiting import WaitWindow
+
+
+# 加密任意文件页面保存时的两种方式
+SEPARATE_CHOICE = "每个文件单独加密"
+PACK_CHOICE = "打包为一个.encpack文件（适合大量小文件）"
+ALL_MEMBERS = "全部成员"
+
+
+def ask_save_mode(count: int) -> str | None:
+    """
+    多个文件时询问保存方式，单个文件直接单独加密，取消时返回 None
+    """
+    if count <= 1:
+        return SEPARATE_CHOICE
+    return ask_choice("保存方式", "选择保存方式：", [SEPARATE_CHOICE, PACK_CHOICE])
+
+
+def confirm_unreadable(unreadable: dict) -> bool:
+    """
+    遍历文件夹时有目录无法读取，询问是否在缺少这些目录的情况下继续
+
+    Args:
+        unreadable: {目录: 错误}
+    """
+    lines = "\n".join(f"{path}：{error}" for path, error in list(unreadable.items())[:30])
+    more = f"\n……共{len(unreadable)}项" if len(unreadable) > 30 else ""
+    return messagebox.askyesno("警告", f"以下文件夹无法读取，其中的文件会被遗漏：\n{lines}{more}\n是否继续？")
+
+
+def save_pack(tab, key: str) -> None:
+    """
+    将加密任意文件页面中的文件打包为一个加密包，整个包只派生一次密钥
+    需在子线程中调用
+    """
+    file_path = filedialog.asksaveasfilename(
+        title="打包为",
+        defaultextension=EXTENSION,
+        filetypes=[("加密包", "*" + EXTENSION)]
+    )
+    if not file_path: return
+    remain = BooleanVar(value=True)
+    items = []
+    unreadable = {}
+    for path_var, name_var in zip(tab.notebook.entry_vars, tab.notebook.name_vars):
+        path, name = path_var.get(), name_var.get()
+        if path and Path(path).is_dir():
+            # 文件夹中的文件以"文件夹名/相对路径"为成员名
+            base = name or Path(path).name
+            items += [(str(Path(path) / relative), f"{base}/{relative.with_suffix('').as_posix()}")
+                      for relative in sorted(parallel_walk(Path(path), on_error=lambda d, e: unreadable.setdefault(str(d), e)))]
+        elif path:
+            items.append((path, name))
+    if unreadable and not confirm_unreadable(unreadable): return
+    ww = WaitWindow("加密中", f'正在生成密钥，\n输出路径："{file_path}"', len(items) + 1)
+    def on_close():
+        if messagebox.askyesno("停止加密", "确定停止加密吗？"):
+            remain.set(False)
+    ww.set_on_close(on_close)
+    try:
+        writer = PackWriter(file_path, key, tab.notebook.key_cache)
+    except Exception as e:
+        ww.showerror("错误", f"加密失败，错误信息：{e}")
+        ww.destroy()
+        return
+    ww.config(current_count=1)
+    try:
+        for path, name in items:
+            if not remain.get(): writer.abort();ww.destroy();return
+            member = (name or Path(path).stem) + Path(path).suffix
+            ww.config(description=f'正在打包{len(items)}个文件，\n当前源路径："{path}"')
+            if not Path(path).is_file():
+                ww.showerror("错误", f'不存在源文件路径："{path}"\n已跳过此任务')
+            else:
+                try:
+                    writer.add_file(path, member)
+                except ValueError as e:
+                    ww.showerror("错误", f"{e}\n已跳过此任务")
+            ww.config(current_count=ww.current_count+1)
+        writer.close()
+    except Exception as e:
+        writer.abort()
+        ww.showerror("错误", f"加密失败，错误信息：{e}")
+    ww.destroy()
+
+
+def open_pack(file_path: str) -> None:
+    """
+    打开加密包，选择要解包的成员并解密到文件夹，只解密所选成员
+    需在子线程中调用
+    """
+    key = ask_password()
+    if not key: return
+    ww = WaitWindow("解密中", f'正在解密"{file_path}"的索引', 1)
+    try:
+        reader = PackReader(file_path, key)
+    except Exception as e:
+        ww.destroy()
+        messagebox.showerror("错误", "密码错误或文件已损坏")
+        print(e)
+        return
+    ww.destroy()
+    choice = ask_choice("解包", f"包内共{len(reader.members)}个成员，选择要解包的成员：",
+                        [ALL_MEMBERS] + reader.names())
+    if not choice: return
+    dir_path = filedialog.askdirectory(title="解包至")
+    if not dir_path: return
+    dir_path = Path(dir_path)
+    names = reader.names() if choice == ALL_MEMBERS else [choice]
+    remain = BooleanVar(value=True)
+    always_cover = False
+    ww = WaitWindow("解密中", "", len(names))
+    def on_close():
+        if messagebox.askyesno("停止解密", "确定停止解密吗？"):
+            remain.set(False)
+    ww.set_on_close(on_close)
+    for name in names:
+        if not remain.get(): ww.destroy();return
+        output = member_path(dir_path, name)
+        if output is None:
+            ww.showerror("错误", f'成员名"{name}"不能作为文件名\n已跳过此任务')
+            ww.config(current_count=ww.current_count+1)
+            continue
+        ww.config(description=f'正在解包{len(names)}个成员，\n当前输出路径："{output}"')
+        if output.exists() and not always_cover:
+            result = ww.showchoice("路径已存在",
+                                   f'输出路径："{output}"已存在，您希望：\n\n关闭窗口默认跳过此任务',
+                                   ["跳过此任务", "覆盖", "覆盖，本次解包都如此"], remain)
+            if not remain.get(): ww.destroy();return
+            match result:
+                case "跳过此任务"|None:
+                    ww.config(current_count=ww.current_count+1)
+                    continue
+                case "覆盖":
+                    pass
+                case "覆盖，本次解包都如此":
+                    always_cover = True
+        try:
+            output.parent.mkdir(parents=True, exist_ok=True)
+            reader.extract(name, output)
+        except Exception as e:
+            ww.showerror("错误", f"解包失败，错误信息：{e}\n已跳过此任务")
+        ww.config(current_count=ww.current_count+1)
+    ww.destroy()
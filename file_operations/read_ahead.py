@@ -0,0 +1,34 @@
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from encrip import recover_header
+
+
+# 预读使用的线程池，选择文件后立即开始读取，与输入密码同时进行
+_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="read-ahead")
+
+
+def _read(path: str) -> bytes:
+    # 更改密码中途崩溃时先用备份恢复文件头，否则会被误报为密码错误
+    recover_header(path)
+    with open(path, "rb") as f:
+        # 提示内核尽快把整个文件读入页缓存，网络盘、机械盘上可以合并为大块顺序读取
+        if hasattr(os, "posix_fadvise"):
+            try:
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            except OSError:
+                pass
+        return f.read()
+
+
+def read_ahead(path: str) -> Future:
+    """
+    在后台读取整个文件
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        结果为文件内容的 Future，读取出错时 result() 抛出对应异常
+    """
+    return _pool.submit(_read, path)
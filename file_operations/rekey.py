@@ -0,0 +1,100 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tkinter import messagebox, filedialog, BooleanVar
+from pathlib import Path
+from multithread import threadfunc
+from encrip import KeyCache, rekey_file
+from encpack import rekey_pack, EXTENSION as PACK_EXTENSION
+from ui.ask import ask_choice, ask_password
+from ui.waiting import WaitWindow
+from file_operations.current_space import get_current_space
+
+
+def _ask_new_password(title: str) -> tuple[str, str] | None:
+    """
+    询问原密码与两次新密码，取消或不一致时返回 None
+    """
+    old_key = ask_password(title, "请输入原密码：")
+    if not old_key: return None
+    new_key = ask_password(title, "请输入新密码：")
+    if not new_key: return None
+    if ask_password(title, "请再次输入新密码：") != new_key:
+        messagebox.showwarning("警告", "密钥输入不一致！")
+        return None
+    return old_key, new_key
+
+
+def _encrypted_files(dir_path: Path) -> list[Path]:
+    return [path for path in dir_path.rglob("*") if path.is_file() and path.suffix.lower().startswith(".enc")]
+
+
+@threadfunc(daemon=True)
+def change_file_password():
+    mode = ask_choice("更改文件密码", "选择要更改密码的文件：", ["选择文件", "选择文件夹（包括子文件夹中的加密文件）"])
+    if not mode: return
+    if mode == "选择文件":
+        paths = [Path(path) for path in filedialog.askopenfilenames(title="选择加密文件",
+                                                                     filetypes=[("加密文件", "*.enc*")])]
+    else:
+        dir_path = filedialog.askdirectory(title="选择加密文件所在文件夹")
+        if not dir_path: return
+        paths = _encrypted_files(Path(dir_path))
+    if not paths:
+        messagebox.showinfo("更改文件密码", "没有找到加密文件")
+        return
+    keys = _ask_new_password("更改文件密码")
+    if keys is None: return
+    old_key, new_key = keys
+    remain = BooleanVar(value=True)
+    ww = WaitWindow("更改密码中", f"正在更改{len(paths)}个文件的密码", len(paths))
+    def on_close():
+        if messagebox.askyesno("停止更改密码", "确定停止吗？\n已处理的文件使用新密码，其余文件仍使用原密码。"):
+            remain.set(False)
+    ww.set_on_close(on_close)
+    # 文件头中的盐值相同的文件只派生一次旧密钥，所有文件共用一次新密钥派生
+    cache = KeyCache()
+    def rekey(path: Path) -> bool:
+        if not remain.get():
+            return True
+        if path.suffix.lower() == PACK_EXTENSION:
+            return rekey_pack(path, old_key, new_key, cache)
+        return rekey_file(path, old_key, new_key, cache)
+    errors = {}
+    rewritten = 0
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as pool:
+        futures = {pool.submit(rekey, path): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                if not future.result():
+                    rewritten += 1
+            except Exception as e:
+                errors[str(futures[future])] = str(e)
+            ww.config(current_count=ww.current_count+1)
+    ww.destroy()
+    if not remain.get(): return
+    note = f"\n其中{rewritten}个旧格式文件已整体重新加密为新格式。" if rewritten else ""
+    if errors:
+        lines = "\n".join(f"{path}：{error}" for path, error in list(errors.items())[:30])
+        more = f"\n……共{len(errors)}项" if len(errors) > 30 else ""
+        messagebox.showerror("更改文件密码", f"{len(errors)}个文件更改失败：\n{lines}{more}{note}")
+    else:
+        messagebox.showinfo("更改文件密码", f"已更改{len(paths)}个文件的密码。{note}")
+
+
+@threadfunc(daemon=True)
+def change_space_password():
+    space = get_current_space()
+    if space is None:
+        messagebox.showinfo("无法更改密码", "未打开秘密空间")
+        return
+    keys = _ask_new_password("更改空间密码")
+    if keys is None: return
+    ww = WaitWindow("更改密码中", f'正在更改秘密空间"{space.path.name}"的密码', 1)
+    try:
+        space.rekey(*keys)
+    except Exception as e:
+        ww.destroy()
+        messagebox.showerror("错误", f"更改密码失败，错误信息：{e}")
+        return
+    ww.destroy()
+    messagebox.showinfo("更改空间密码", "已更改空间密码，数据无需重新加密。")
@@ -2,9 +2,12 @@ from tkinter import messagebox, filedialog, BooleanVar
 from pathlib import Path
 from multithread import threadfunc
 from encrip import encrip
+from atomic_file import AtomicWriter
+from filetype import make_header
 from ui.notebook import get_current_tab, rename_tab, mark_tab_modified
 from ui.waiting import WaitWindow
 from ui.frames.frame_type import FrameType
+from file_operations.encrypt_any import save_any_files
 
 
 @threadfunc(daemon=True)
@@ -34,13 +37,14 @@ def save_file():
                     ww.set_on_close(on_close)
                     try:
                         content: str = tab.notebook.text_editor.get("1.0", "end-1c")
-                        encription = encrip(content.encode("utf-8"), key, "")
+                        encription = encrip(content.encode("utf-8"), key, make_header("text/plain"), tab.notebook.key_cache)
                         for _ in range(7):
                             if not remain.get(): ww.destroy();return
                             ww.config(current_count=ww.current_count+1/7)
                             next(encription)
-                        with open(file_path, "wb") as f:
-                            f.write(next(encription))
+                        encrypted: bytes = next(encription)
+                        with AtomicWriter(file_path, len(encrypted)) as f:
+                            f.write(encrypted)
                         ww.destroy()
                         tab.notebook.path = file_path
                         rename_tab(tab, Path(file_path).name)
@@ -49,54 +53,7 @@ def save_file():
                         ww.destroy()
                         return
             case FrameType.ENC_ANY:
-                dir_path = filedialog.askdirectory(title="保存至")
-                if not dir_path: return
-                dir_path = Path(dir_path)
-                always_cover = False
-                count = len(tab.notebook.entry_vars)
-                ww = WaitWindow("加密中", "", count)
-                def on_close():
-                    if messagebox.askyesno("停止加密", "确定停止加密吗？"):
-                        remain.set(False)
-                ww.set_on_close(on_close)
-                for path_var, name_var in zip(tab.notebook.entry_vars, tab.notebook.name_vars):
-                    if not remain.get(): ww.destroy();return
-                    path = path_var.get()
-                    name = name_var.get()
-                    if not name: name = Path(path).stem
-                    if path:
-                        output = dir_path / (name + ".enc" + Path(path).suffix[1:])
-                        ww.config(description=f'正在加密{count}个文件，\n当前源路径："{path}"\n当前输出路径："{output}"')
-                        if not Path(path).is_file():
-                            ww.showerror("错误",f'不存在源文件路径："{path}"\n已跳过此任务')
-                            if not remain.get(): ww.destroy();return
-                            ww.config(current_count=ww.current_count+1)
-                            continue
-                        if not name:
-                            name = Path(path).stem
-                        if output.is_file() and not always_cover:
-                            result = ww.showchoice("路径已存在",
-                                                   f'输出路径："{output}"已存在，您希望：\n\n关闭窗口默认跳过此任务',
-                                                   ["跳过此任务", "覆盖", "覆盖，本次加密都如此"], remain)
-                            if not remain.get(): ww.destroy();return
-                            match result:
-                                case "跳过此任务"|None:
-                                    ww.config(current_count=ww.current_count+1)
-                                    continue
-                                case "覆盖":
-                                    pass
-                                case "覆盖，本次加密都如此":
-                                    always_cover = True
-                        with open(path, "rb") as f1:
-                            encription = encrip(f1.read(), key, "")
-                        for _ in range(7):
-                            if not remain.get(): ww.destroy();return
-                            ww.config(current_count=ww.current_count+1/7)
-                            next(encription)
-                        with open(output, "wb") as f2:
-                            f2.write(next(encription))
-                        ww.config(current_count=ww.current_count+1)
-                ww.destroy()
+                save_any_files(tab, key, "保存至")
     else:
         remain = BooleanVar(value=True)
         match tab.notebook.type:
@@ -107,13 +64,14 @@ def save_file():
                         remain.set(False)
                 ww.set_on_close(on_close)
                 content: str = tab.notebook.text_editor.get("1.0", "end-1c")
-                encription = encrip(content.encode("utf-8"), key, "")
+                encription = encrip(content.encode("utf-8"), key, make_header("text/plain"), tab.notebook.key_cache)
                 for _ in range(7):
                     if not remain.get(): ww.destroy();return
                     ww.config(current_count=ww.current_count+1/7)
                     next(encription)
-                with open(tab.notebook.path, "wb") as f:
-                    f.write(next(encription))
+                encrypted: bytes = next(encription)
+                with AtomicWriter(tab.notebook.path, len(encrypted)) as f:
+                    f.write(encrypted)
                 mark_tab_modified(tab, False)
             case _:
                 messagebox.showinfo("无法保存", "当前页面无法保存")
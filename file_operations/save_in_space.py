@@ -1,2 +1,99 @@
+from tkinter import messagebox, BooleanVar
+from tkinter.simpledialog import askstring
+from pathlib import Path
+from multithread import threadfunc
+from batch import parallel_walk
+from file_operations.pack import confirm_unreadable
+from file_operations.space_tools import ask_on_exists
+from secret_space.pipeline import unique_name, SKIP, OVERWRITE
+from ui.notebook import get_current_tab, mark_tab_modified
+from ui.waiting import WaitWindow
+from ui.frames.frame_type import FrameType
+from ui.space_list import refresh_space_list
+from file_operations.current_space import get_current_space
+
+
+@threadfunc(daemon=True)
 def save_in_space():
-    print("7")
+    space = get_current_space()
+    if space is None:
+        messagebox.showinfo("无法存入", "未打开秘密空间")
+        return
+    tab = get_current_tab()
+    remain = BooleanVar(value=True)
+    match tab.notebook.type:
+        case FrameType.TEXT:
+            if tab.notebook.space_entry:
+                default = tab.notebook.space_entry
+            else:
+                default = Path(tab.notebook.path).stem if tab.notebook.path else ""
+            name = askstring("存入空间", "条目名：", initialvalue=default)
+            if not name: return
+            if not name.endswith(".txt"): name += ".txt"
+            if name != tab.notebook.space_entry and name in space.entries and not messagebox.askyesno("条目已存在",
+                                                                 f'空间中已存在"{name}"，确定覆盖吗？'):
+                return
+            ww = WaitWindow("存入中", f'正在存入文本，\n条目名："{name}"', 1)
+            try:
+                content: str = tab.notebook.text_editor.get("1.0", "end-1c")
+                space.add_text(name, content)
+                space.commit()
+            except Exception as e:
+                ww.showerror("错误", f"存入失败，错误信息：{e}")
+                ww.destroy()
+                return
+            ww.destroy()
+            tab.notebook.space_entry = name
+            mark_tab_modified(tab, False)
+            refresh_space_list()
+        case FrameType.ENC_ANY:
+            items = []
+            unreadable = {}
+            for path_var, name_var in zip(tab.notebook.entry_vars, tab.notebook.name_vars):
+                path, name = path_var.get(), name_var.get()
+                if path and Path(path).is_dir():
+                    # 文件夹中的文件以"文件夹名/相对路径"为条目名
+                    base = name or Path(path).name
+                    items += [(str(Path(path) / relative), f"{base}/{relative.with_suffix('').as_posix()}")
+                              for relative in sorted(parallel_walk(Path(path), on_error=lambda d, e: unreadable.setdefault(str(d), e)))]
+                elif path:
+                    items.append((path, name))
+            if unreadable and not confirm_unreadable(unreadable): return
+            items = [(path, (name + Path(path).suffix) if name else Path(path).name) for path, name in items]
+            on_exists = ask_on_exists([name for _, name in items if name in space.entries])
+            if on_exists is None: return
+            # 同一次存入中重名的文件不互相覆盖
+            claimed = set()
+            taken = lambda candidate: candidate in claimed or candidate in space.entries
+            named = []
+            for path, name in items:
+                if name in claimed or (name in space.entries and on_exists != OVERWRITE):
+                    if on_exists == SKIP: continue
+                    name = unique_name(name, taken)
+                claimed.add(name)
+                named.append((path, name))
+            items = named
+            count = len(items)
+            if not count: return
+            ww = WaitWindow("存入中", "", count)
+            def on_close():
+                if messagebox.askyesno("停止存入", "确定停止存入吗？"):
+                    remain.set(False)
+            ww.set_on_close(on_close)
+            for path, name in items:
+                if not remain.get(): break
+                ww.config(description=f'正在存入{count}个文件，\n当前源路径："{path}"\n当前条目名："{name}"')
+                if not Path(path).is_file():
+                    ww.showerror("错误", f'不存在源文件路径："{path}"\n已跳过此任务')
+                else:
+                    try:
+                        space.add_file(path, name)
+                    except Exception as e:
+                        ww.showerror("错误", f'存入"{path}"失败，错误信息：{e}')
+                ww.config(current_count=ww.current_count+1)
+            # 已存入的块由索引引用后才算完成，中途停止也提交已完成的条目
+            space.commit()
+            ww.destroy()
+            refresh_space_list()
+        case _:
+            messagebox.showinfo("无法存入", "当前页面无法存入空间")
@@ -0,0 +1,333 @@
+import os
+import time
+from tkinter import messagebox, filedialog, BooleanVar
+from tkinter.simpledialog import askstring
+from pathlib import Path
+from multithread import threadfunc
+from secret_space.pipeline import import_paths, existing_names, export_entries, select_entries, SKIP, OVERWRITE, RENAME
+from secret_space.scrub import scrub_space, scrub_folder, quick_check_space, SCRUB_STATE_FILE, FOLDER_SCRUB_STATE_FILE
+from ui.ask import ask_choice, ask_password
+from ui.waiting import WaitWindow
+from ui.space_list import refresh_space_list
+from file_operations.current_space import get_current_space
+
+
+@threadfunc(daemon=True)
+def enable_fulltext():
+    space = get_current_space()
+    if space is None or space.fulltext is not None:
+        return
+    if not messagebox.askyesno("启用全文索引",
+                               "该空间未启用全文索引，是否现在为文本条目建立全文索引？\n索引同样加密存储在空间中。"):
+        return
+    ww = WaitWindow("建立索引中", f'正在为"{space.path.name}"中的文本条目建立全文索引', 1)
+    try:
+        space.enable_fulltext()
+        space.commit()
+    except Exception as e:
+        ww.showerror("错误", f"建立索引失败，错误信息：{e}")
+        ww.destroy()
+        return
+    ww.destroy()
+    refresh_space_list()
+
+
+
+def ask_on_exists(names: list[str]) -> str | None:
+    """
+    条目名已存在时询问一次处理方式
+
+    Args:
+        names: 空间中已存在的条目名，为空时不询问
+
+    Returns:
+        SKIP、OVERWRITE 或 RENAME，没有重名时为 RENAME；取消时返回 None
+    """
+    if not names:
+        return RENAME
+    lines = "\n".join(names[:10]) + (f"\n……共{len(names)}项" if len(names) > 10 else "")
+    choices = {"跳过已存在的条目": SKIP, "覆盖已存在的条目": OVERWRITE, "自动重命名": RENAME}
+    choice = ask_choice("条目已存在", f"空间中已存在以下同名条目：\n{lines}\n请选择处理方式：", list(choices))
+    return None if choice is None else choices[choice]
+
+
+
+@threadfunc(daemon=True)
+def import_dropped(paths: list[str]):
+    """
+    将拖入侧边栏的文件和文件夹并行导入当前秘密空间，文件夹保留其目录结构
+    """
+    space = get_current_space()
+    if space is None:
+        messagebox.showinfo("无法导入", "未打开秘密空间，请先创建或打开一个秘密空间")
+        return
+    on_exists = ask_on_exists(existing_names(space, paths))
+    if on_exists is None: return
+    remain = BooleanVar(value=True)
+    ww = WaitWindow("导入中", f'正在导入到秘密空间"{space.path.name}"', 1)
+    def on_close():
+        if messagebox.askyesno("停止导入", "确定停止导入吗？\n已导入的文件会被保留。"):
+            remain.set(False)
+    ww.set_on_close(on_close)
+    def progress(done, found, walked):
+        ww.config(total_count=max(found, 1), current_count=done,
+                  description=f"已导入{done}/{found}个文件" + ("" if walked else "，仍在扫描文件夹……"))
+    try:
+        count, errors, skipped = import_paths(space, paths, progress=progress,
+                                              should_stop=lambda: not remain.get(), on_exists=on_exists)
+    except Exception as e:
+        ww.showerror("错误", f"导入失败，错误信息：{e}")
+        ww.destroy()
+        refresh_space_list()
+        return
+    ww.destroy()
+    refresh_space_list()
+    if errors:
+        lines = "\n".join(f"{path}：{error}" for path, error in list(errors.items())[:30])
+        more = f"\n……共{len(errors)}项" if len(errors) > 30 else ""
+        messagebox.showerror("导入完成", f"已导入{count}个文件，{len(errors)}项导入失败：\n{lines}{more}")
+    elif skipped:
+        lines = "\n".join(skipped[:30])
+        more = f"\n……共{len(skipped)}项" if len(skipped) > 30 else ""
+        messagebox.showinfo("导入完成", f"已导入{count}个文件，以下{len(skipped)}个文件因空间中已存在同名条目而跳过：\n{lines}{more}")
+
+
+
+@threadfunc(daemon=True)
+def export_space():
+    space = get_current_space()
+    if space is None:
+        messagebox.showinfo("无法导出", "未打开秘密空间")
+        return
+    prefix = askstring("导出", "要导出的目录（如\"照片/2023\"），留空导出全部条目：")
+    if prefix is None: return
+    total = len(select_entries(space, prefix))
+    if not total:
+        messagebox.showinfo("无法导出", "没有可导出的条目")
+        return
+    dir_path = filedialog.askdirectory(title="选择导出到的文件夹")
+    if not dir_path: return
+    remain = BooleanVar(value=True)
+    ww = WaitWindow("导出中", f'正在导出秘密空间"{space.path.name}"', total)
+    def on_close():
+        if messagebox.askyesno("停止导出", "确定停止导出吗？\n已导出的文件会被保留，再次导出到同一文件夹时会跳过它们。"):
+            remain.set(False)
+    ww.set_on_close(on_close)
+    try:
+        count, errors = export_entries(space, dir_path, prefix,
+                                       progress=lambda done, total: ww.config(current_count=done),
+                                       should_stop=lambda: not remain.get())
+    except Exception as e:
+        ww.showerror("错误", f"导出失败，错误信息：{e}")
+        ww.destroy()
+        return
+    ww.destroy()
+    if errors:
+        lines = "\n".join(f"{name}：{error}" for name, error in list(errors.items())[:30])
+        more = f"\n……共{len(errors)}项" if len(errors) > 30 else ""
+        messagebox.showerror("导出完成", f"已导出{count}个文件，{len(errors)}个条目导出失败：\n{lines}{more}")
+    elif remain.get():
+        messagebox.showinfo("导出完成", f"已导出{count}个文件到\"{dir_path}\"")
+
+
+# 后台低速校验时的限速与线程数
+BACKGROUND_BYTES_PER_SEC = 20 * 1024 * 1024
+BACKGROUND_WORKERS = 2
+
+
+def _ask_scrub_options(state_path: Path) -> tuple[dict, bool] | None:
+    """
+    询问校验方式与是否继续上次的校验，取消时返回 None
+    """
+    mode = ask_choice("校验", "选择校验方式：", ["全速校验", "后台低速校验（20MB/s）"])
+    if not mode: return None
+    if mode == "全速校验":
+        options = {"workers": os.cpu_count() or 4, "bytes_per_sec": None}
+    else:
+        options = {"workers": BACKGROUND_WORKERS, "bytes_per_sec": BACKGROUND_BYTES_PER_SEC}
+    resume = state_path.is_file() and messagebox.askyesno("继续校验", "发现上次未完成的校验，是否从中断处继续？")
+    return options, resume
+
+
+def _run_scrub(title: str, description: str, scrub, **kwargs):
+    """
+    在等待窗口中运行校验，关闭窗口会在当前批次结束后停止并保存进度
+    """
+    remain = BooleanVar(value=True)
+    ww = WaitWindow(title, description, 1)
+    def on_close():
+        if messagebox.askyesno("停止校验", "确定停止校验吗？\n进度会被保存，下次可继续。"):
+            remain.set(False)
+    ww.set_on_close(on_close)
+    def progress(done, total):
+        ww.config(total_count=max(total, 1), current_count=done)
+    try:
+        result = scrub(progress=progress, should_stop=lambda: not remain.get(), **kwargs)
+    except Exception as e:
+        ww.showerror("错误", f"校验失败，错误信息：{e}")
+        ww.destroy()
+        return None
+    ww.destroy()
+    return result
+
+
+def _show_report(report: dict) -> None:
+    if not report:
+        messagebox.showinfo("校验完成", "未发现损坏。")
+        return
+    names = list(report)
+    lines = "\n".join(names[:30])
+    more = f"\n……共{len(names)}项" if len(names) > 30 else ""
+    messagebox.showerror("校验完成", f"发现{len(names)}项损坏：\n{lines}{more}")
+
+
+@threadfunc(daemon=True)
+def scrub_current_space():
+    space = get_current_space()
+    if space is None:
+        messagebox.showinfo("无法校验", "未打开秘密空间")
+        return
+    if ask_choice("校验秘密空间", "选择校验范围：",
+                  ["快速校验（核对 Merkle 树，不解密内容）", "完整校验（解密全部块）"]) == "快速校验（核对 Merkle 树，不解密内容）":
+        bad = _run_scrub("校验中", f'正在快速校验秘密空间"{space.path.name}"',
+                         lambda **kw: quick_check_space(space, workers=os.cpu_count() or 4, **kw))
+        if bad is not None:
+            _show_report({name: [] for name in bad})
+        return
+    asked = _ask_scrub_options(space.path / SCRUB_STATE_FILE)
+    if asked is None: return
+    options, resume = asked
+    report = _run_scrub("校验中", f'正在校验秘密空间"{space.path.name}"',
+                        lambda **kw: scrub_space(space, resume=resume, **options, **kw))
+    if report is not None:
+        _show_report(report)
+
+
+@threadfunc(daemon=True)
+def scrub_enc_folder():
+    dir_path = filedialog.askdirectory(title="选择要校验的加密文件所在文件夹")
+    if not dir_path: return
+    key = ask_password("校验加密文件", "请输入这些文件的密码：")
+    if not key: return
+    asked = _ask_scrub_options(Path(dir_path) / FOLDER_SCRUB_STATE_FILE)
+    if asked is None: return
+    options, resume = asked
+    report = _run_scrub("校验中", f'正在校验"{dir_path}"中的加密文件',
+                        lambda **kw: scrub_folder(dir_path, key, resume=resume, **options, **kw))
+    if report is not None:
+        _show_report(report)
+
+
+def _snapshot_title(snap: dict) -> str:
+    moment = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(snap["time"]))
+    return f'#{snap["id"]} {moment} {snap["label"]}'
+
+
+@threadfunc(daemon=True)
+def create_snapshot():
+    space = get_current_space()
+    if space is None:
+        messagebox.showinfo("无法创建快照", "未打开秘密空间")
+        return
+    label = askstring("创建快照", "快照说明：")
+    if label is None: return
+    try:
+        snap = space.snapshot(label)
+    except Exception as e:
+        messagebox.showerror("错误", f"创建快照失败，错误信息：{e}")
+        return
+    messagebox.showinfo("创建快照", f"已创建快照：{_snapshot_title(snap)}")
+
+
+@threadfunc(daemon=True)
+def manage_snapshots():
+    space = get_current_space()
+    if space is None:
+        messagebox.showinfo("无法查看快照", "未打开秘密空间")
+        return
+    if not space.snapshots:
+        messagebox.showinfo("快照", "该空间还没有快照")
+        return
+    titles = {_snapshot_title(snap): snap for snap in reversed(space.snapshots)}
+    chosen = ask_choice("快照与版本历史", "选择快照：", list(titles))
+    if not chosen: return
+    snap = titles[chosen]
+    action = ask_choice("快照与版本历史", f"对快照 {chosen}：", ["恢复单个条目", "回滚整个空间", "删除快照"])
+    try:
+        match action:
+            case "恢复单个条目":
+                names = sorted(space.snapshot_entries(snap["id"]))
+                if not names:
+                    messagebox.showinfo("快照", "该快照中没有条目")
+                    return
+                name = ask_choice("恢复单个条目", "选择要恢复的条目：", names)
+                if not name: return
+                target = askstring("恢复单个条目", "恢复为条目名：", initialvalue=name)
+                if not target: return
+                if target in space.entries and not messagebox.askyesno("条目已存在",
+                                                                       f'空间中已存在"{target}"，确定覆盖吗？'):
+                    return
+                space.restore_entry(snap["id"], name, target)
+                space.commit()
+            case "回滚整个空间":
+                if not messagebox.askyesno("回滚整个空间",
+                                           "确定将整个空间回滚到该快照吗？\n回滚前会先为当前状态创建快照。"):
+                    return
+                space.snapshot("回滚前")
+                space.restore_snapshot(snap["id"])
+                space.commit()
+            case "删除快照":
+                if not messagebox.askyesno("删除快照", f"确定删除快照 {chosen} 吗？"):
+                    return
+                space.delete_snapshot(snap["id"])
+                space.commit()
+                space.collect_garbage()
+            case _:
+                return
+    except Exception as e:
+        messagebox.showerror("错误", f"操作失败，错误信息：{e}")
+        return
+    refresh_space_list()
+
+
+@threadfunc(daemon=True)
+def toggle_auto_snapshot():
+    space = get_current_space()
+    if space is None:
+        messagebox.showinfo("无法设置", "未打开秘密空间")
+        return
+    state = "开启" if space.auto_snapshot else "关闭"
+    if not messagebox.askyesno("自动快照", f"每次保存时自动创建快照当前为{state}状态，是否切换？"):
+        return
+    space.auto_snapshot = not space.auto_snapshot
+    space.commit()
+
+
+@threadfunc(daemon=True)
+def manage_shards():
+    space = get_current_space()
+    if space is None:
+        messagebox.showinfo("无法设置", "未打开秘密空间")
+        return
+    current = "\n".join(space.shards) if space.shards else "（无）"
+    action = ask_choice("分片目录",
+                        f"块文件按块名分布到空间目录及以下分片目录中：\n{current}",
+                        ["添加分片目录", "移除所有分片目录"])
+    if action == "添加分片目录":
+        dir_path = filedialog.askdirectory(title="选择新的分片目录（建议位于另一块磁盘）")
+        if not dir_path: return
+        shards = space.shards + [dir_path]
+    elif action == "移除所有分片目录":
+        if not space.shards: return
+        shards = []
+    else:
+        return
+    ww = WaitWindow("迁移中", "正在将块文件迁移到新的分片布局，请勿关闭程序", 1)
+    try:
+        moved = space.set_shards(shards, workers=max(len(shards) + 1, 4))
+    except Exception as e:
+        ww.showerror("错误", f"迁移失败，错误信息：{e}\n空间仍可正常使用，再次设置分片目录即可继续迁移。")
+        ww.destroy()
+        return
+    ww.destroy()
+    messagebox.showinfo("分片目录", f"迁移完成，共移动{moved}个块文件。")
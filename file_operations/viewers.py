@@ -0,0 +1,168 @@
+import codecs
+import mimetypes
+from tkinter import messagebox
+from typing import Callable, Iterable
+from encrip import KeyCache
+from filetype import AUDIO_EXTENSIONS, VIDEO_EXTENSIONS, IMAGE_EXTENSIONS, SNIFF_SIZE, \
+    sniff_mime, mime_of_extension, guess_mime, make_header, parse_header
+from ui.notebook import add_tab, remove_tab, switch_to_tab, mark_tab_modified
+from ui.frames.text_frame import build_text_frame
+from ui.frames.audio_frame import audio_frame
+from ui.frames.video_frame import video_frame
+from ui.frames.picture_frame import picture_frame
+
+
+class StreamAborted(Exception):
+    """
+    逐块产出数据的迭代器被取消或出错时抛出，原因已提示过用户，页面只需关闭
+    """
+
+
+class Viewer:
+    """
+    一种查看页面
+
+    streaming 为 True 的页面可以直接消费逐块产出的数据，数据尚未全部解密时就打开页面；
+    否则需要完整的数据。
+    """
+
+    def __init__(self, name: str, mimes: set[str], streaming: bool, show: Callable[..., None]):
+        """
+        Args:
+            name: 页面名称
+            mimes: 支持的 MIME 类型，"audio/*" 表示该大类下的所有类型
+            streaming: 是否可以消费数据流
+            show: 打开页面的函数，参数为 (标题, 数据或数据块迭代器, **上下文)
+        """
+        self.name: str = name
+        self.mimes: set[str] = mimes
+        self.streaming: bool = streaming
+        self.show: Callable[..., None] = show
+
+    def accepts(self, mime: str) -> bool:
+        mime = mime.split(";")[0].strip().lower()
+        return mime in self.mimes or f"{mime.split('/')[0]}/*" in self.mimes
+
+    def open(self, title: str, source: bytes | Iterable[bytes], **context) -> None:
+        """
+        打开页面，不支持数据流的页面会先收集完整数据
+
+        Args:
+            title: 标签页标题
+            source: 完整数据或逐块产出数据的迭代器
+            context: path、key、cache、mime、space_entry 等上下文
+        """
+        if not self.streaming and not isinstance(source, (bytes, bytearray)):
+            try:
+                source = b"".join(source)
+            except StreamAborted:
+                return
+        self.show(title, source, **context)
+
+
+# 已注册的页面，按注册顺序匹配
+VIEWERS: list[Viewer] = []
+
+
+def register_viewer(viewer: Viewer) -> None:
+    VIEWERS.append(viewer)
+
+
+def find_viewer(mime: str | None) -> Viewer | None:
+    if not mime:
+        return None
+    for viewer in VIEWERS:
+        if viewer.accepts(mime):
+            return viewer
+    return None
+
+
+def choose_viewer(header: dict, head: bytes, ext: str) -> tuple[Viewer | None, str | None]:
+    """
+    为解密后的数据选择页面：依次使用文件头中的原始 MIME 类型、特征字节、原始扩展名
+
+    Args:
+        header: 解析后的文件头
+        head: 解密后数据的开头部分
+        ext: 原始扩展名，如".mp3"
+
+    Returns:
+        (页面, MIME 类型)，没有合适的页面时页面为 None
+    """
+    ext_mime = mime_of_extension(ext)
+    # 文本没有特征字节，以"BM"等开头的文本不应被当作图片
+    if ext_mime and ext_mime.startswith("text/"):
+        candidates = (header.get("mime"), ext_mime)
+    else:
+        candidates = (header.get("mime"), sniff_mime(head), ext_mime)
+    for mime in candidates:
+        viewer = find_viewer(mime)
+        if viewer is not None:
+            return viewer, mime
+    return None, None
+
+
+def _show_text(title: str, source: bytes | Iterable[bytes], path: str | None = None, key: str | None = None,
+               cache: KeyCache | None = None, space_entry: str | None = None, **_context) -> None:
+    tab = add_tab(title)
+    build_text_frame(tab)
+    switch_to_tab(tab)
+    tab.notebook.path = path
+    tab.notebook.space_entry = space_entry
+    if cache is not None:
+        tab.notebook.key_cache = cache
+    tab.notebook.set_values_safely(text_content="", key=key, confirm_key=key)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    # 逐块解码并追加，长文本在解密完成前就能看到开头；
+    # 中途取消或出错时关闭页面，以免不完整的文本被保存回去
+    try:
+        for data in ([source] if isinstance(source, (bytes, bytearray)) else source):
+            _append_text(tab, decoder.decode(data))
+        _append_text(tab, decoder.decode(b"", final=True))
+    except StreamAborted:
+        remove_tab(tab)
+        return
+    except UnicodeDecodeError as e:
+        remove_tab(tab)
+        messagebox.showerror("错误", "密码错误或文件已损坏")
+        print(e)
+        return
+    mark_tab_modified(tab, False)
+
+
+def _append_text(tab, text: str) -> None:
+    if not text:
+        return
+    notebook = tab.notebook
+    notebook.setting_value = True
+    try:
+        notebook.text_editor.insert("end-1c", text)
+        notebook.text_editor.edit_modified(False)
+    finally:
+        notebook.setting_value = False
+
+
+def _show_audio(title: str, data: bytes, **_context) -> None:
+    tab = add_tab(title)
+    audio_frame(tab, data)
+    switch_to_tab(tab)
+
+
+def _show_video(title: str, data: bytes, mime: str | None = None, extension: str | None = None, **_context) -> None:
+    tab = add_tab(title)
+    # 播放器按扩展名写出临时文件，原始扩展名未知时由 MIME 类型推测
+    extension = extension or (mime and mimetypes.guess_extension(mime.split(";")[0], strict=False)) or ".mp4"
+    video_frame(tab, data, extension=extension)
+    switch_to_tab(tab)
+
+
+def _show_picture(title: str, data: bytes, **_context) -> None:
+    tab = add_tab(title)
+    picture_frame(tab, data)
+    switch_to_tab(tab)
+
+
+register_viewer(Viewer("文本", {"text/*"}, True, _show_text))
+register_viewer(Viewer("音频", {"audio/*"}, False, _show_audio))
+register_viewer(Viewer("视频", {"video/*"}, False, _show_video))
+register_viewer(Viewer("图片", {"image/*"}, False, _show_picture))
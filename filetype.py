@@ -0,0 +1,103 @@
+import json
+import mimetypes
+from pathlib import Path
+
+
+AUDIO_EXTENSIONS = {
+    ".mp3", ".wav", ".flac", ".aac", ".ogg", ".wma", ".m4a", ".opus", ".aiff", ".au"
+}
+VIDEO_EXTENSIONS = {
+    ".mp4", ".avi", ".mkv", ".mov", ".wmv", ".flv", ".webm", ".m4v", ".mpg", ".mpeg"
+}
+IMAGE_EXTENSIONS = {
+    ".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff", ".tif", ".svg", ".webp", ".ico"
+}
+
+
+# 文件开头的特征字节与对应的 MIME 类型：(偏移, 特征字节, MIME)
+MAGIC_NUMBERS: list[tuple[int, bytes, str]] = [
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (0, b"II*\x00", "image/tiff"),
+    (0, b"MM\x00*", "image/tiff"),
+    (0, b"\x00\x00\x01\x00", "image/x-icon"),
+    (8, b"WEBP", "image/webp"),
+    (8, b"WAVE", "audio/wav"),
+    (8, b"AVI ", "video/x-msvideo"),
+    (8, b"AIFF", "audio/aiff"),
+    (0, b"ID3", "audio/mpeg"),
+    (0, b"\xff\xfb", "audio/mpeg"),
+    (0, b"\xff\xf3", "audio/mpeg"),
+    (0, b"\xff\xf1", "audio/aac"),
+    (0, b"\xff\xf9", "audio/aac"),
+    (0, b"fLaC", "audio/flac"),
+    (0, b"OggS", "audio/ogg"),
+    (0, b".snd", "audio/basic"),
+    (4, b"ftypM4A", "audio/mp4"),
+    (4, b"ftypqt", "video/quicktime"),
+    (4, b"ftyp", "video/mp4"),
+    (0, b"\x1aE\xdf\xa3", "video/x-matroska"),
+    (0, b"FLV", "video/x-flv"),
+    (0, b"\x00\x00\x01\xba", "video/mpeg"),
+    (0, b"\x00\x00\x01\xb3", "video/mpeg"),
+    (0, b"0&\xb2u\x8ef\xcf\x11", "video/x-ms-wmv"),
+    (0, b"BM", "image/bmp"),
+]
+# 识别文件类型最多需要读取的字节数
+SNIFF_SIZE: int = 64
+
+
+def sniff_mime(data: bytes) -> str | None:
+    """
+    根据文件开头的特征字节识别 MIME 类型，无法识别时返回 None
+    """
+    for offset, magic, mime in MAGIC_NUMBERS:
+        if data[offset:offset + len(magic)] == magic:
+            return mime
+    head = data[:SNIFF_SIZE].lstrip()
+    if head.startswith(b"<svg") or (head.startswith(b"<?xml") and b"<svg" in data[:1024]):
+        return "image/svg+xml"
+    return None
+
+
+def mime_of_extension(ext: str) -> str | None:
+    """
+    根据原始扩展名（如".mp3"，不含"enc"）推测 MIME 类型
+    """
+    ext = ext.lower()
+    if ext == ".txt":
+        return "text/plain"
+    mime = mimetypes.guess_type("file" + ext, strict=False)[0]
+    if mime is None:
+        for extensions, major in ((AUDIO_EXTENSIONS, "audio"), (VIDEO_EXTENSIONS, "video"), (IMAGE_EXTENSIONS, "image")):
+            if ext in extensions:
+                return f"{major}/{ext[1:]}"
+    return mime
+
+
+def guess_mime(path: str | Path, data: bytes) -> str | None:
+    """
+    加密前确定文件的 MIME 类型：优先使用特征字节，其次使用扩展名
+    """
+    return sniff_mime(data) or mime_of_extension(Path(path).suffix)
+
+
+def make_header(mime: str | None, name: str | None = None) -> str:
+    """
+    生成加密时的文件头，记录原始 MIME 类型与文件名，加密后成为单独加密的元数据，见 encrip.read_header
+    """
+    header = {key: value for key, value in (("mime", mime), ("name", name)) if value}
+    return json.dumps(header, ensure_ascii=False) if header else ""
+
+
+def parse_header(header: str) -> dict:
+    """
+    解析加密数据内部的文件头，旧文件的文件头为空字符串
+    """
+    try:
+        value = json.loads(header) if header else {}
+    except ValueError:
+        return {}
+    return value if isinstance(value, dict) else {}
@@ -9,8 +9,16 @@ from ui.menubar import menubar
 from ui.notebook import add_tab, get_current_tab
 from ui.frames.no_space import build_no_space_frame
 from ui.dropevent import on_drop_function
+from ui.space_list import space_list_function
 from ui.frames.frame_type import FrameType
 from file_operations import new_file, new_space, open_file, open_space, save_file, save_file_as, save_in_space
+from file_operations.open_entry import open_entry
+from file_operations.current_space import entry_cache
+from file_operations.space_tools import enable_fulltext, scrub_current_space, scrub_enc_folder, \
+    create_snapshot, manage_snapshots, toggle_auto_snapshot, manage_shards, import_dropped, \
+    export_space
+from file_operations.rekey import change_file_password, change_space_password
+from file_operations.decrypt_files import decrypt_to_folder
 
 
 
@@ -22,6 +30,9 @@ EXE_PATH = Path(sys.executable if not debug else __file__).parent
 class Setting(jsonvar.JsonVar):
     _path = EXE_PATH / "setting.json"
     recent_secret_space = ""
+    # 已解密条目缓存的预算（MB）与淘汰时是否清零
+    entry_cache_mb = 256
+    entry_cache_zero = True
 
 if (EXE_PATH / "setting.json").is_file():
     try:
@@ -34,6 +45,7 @@ if (EXE_PATH / "setting.json").is_file():
             sys.exit(1)
 else:
     Setting.dump()
+entry_cache.configure(Setting.entry_cache_mb * 1024 * 1024, Setting.entry_cache_zero)
 
 
 
@@ -56,6 +68,9 @@ def on_drop(paths: list[str]):
                 if path not in existing_paths:
                     tab.notebook.add_file(path)
 on_drop_function.right_panel = on_drop
+on_drop_function.sidebar = import_dropped
+space_list_function.open_entry = open_entry
+space_list_function.enable_fulltext = enable_fulltext
 
 
 def setting():
@@ -75,7 +90,19 @@ menubar(root,
         "2":None,
         "保存":(save_file, "Ctrl+S"),
         "另存为":(save_file_as, "Ctrl+Shift+S"),
-        "存入空间":(save_in_space, "Alt+S")},
+        "存入空间":(save_in_space, "Alt+S"),
+        "3":None,
+        "解密到文件夹":decrypt_to_folder,
+        "校验加密文件夹":scrub_enc_folder,
+        "更改文件密码":change_file_password},
+"空间":{"创建快照":create_snapshot,
+        "快照与版本历史":manage_snapshots,
+        "自动快照开关":toggle_auto_snapshot,
+        "1":None,
+        "分片目录":manage_shards,
+        "更改空间密码":change_space_password,
+        "导出空间":export_space,
+        "校验秘密空间":scrub_current_space},
 "设置":setting,
 "帮助":help_item
 }
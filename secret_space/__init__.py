@@ -0,0 +1,9 @@
+from .space import SecretSpace, is_space
+
+
+
+
+__all__ = [
+    "SecretSpace",
+    "is_space",
+]
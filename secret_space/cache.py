@@ -0,0 +1,92 @@
+import threading
+from collections import OrderedDict
+
+
+class EntryCache:
+    """
+    已解密条目的 LRU 缓存，总字节数不超过预算
+
+    缓存内部持有 bytearray，取出时返回副本，所以淘汰时可以安全地将缓冲区清零，
+    不会影响正在使用副本的界面组件。以条目哈希作为版本，条目被修改后旧内容自动失效。
+    """
+
+    def __init__(self, budget: int = 256 * 1024 * 1024, zero_on_evict: bool = True):
+        """
+        Args:
+            budget: 缓存的明文总字节数上限，0 表示不缓存
+            zero_on_evict: 淘汰时是否将缓冲区清零
+        """
+        self.budget: int = budget
+        self.zero_on_evict: bool = zero_on_evict
+        self._items: OrderedDict[str, tuple[str, bytearray]] = OrderedDict()
+        self._size: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def _evict(self, name: str) -> None:
+        _, buffer = self._items.pop(name)
+        self._size -= len(buffer)
+        if self.zero_on_evict:
+            buffer[:] = bytes(len(buffer))
+
+    def _shrink(self) -> None:
+        while self._items and self._size > self.budget:
+            self._evict(next(iter(self._items)))
+
+    def configure(self, budget: int | None = None, zero_on_evict: bool | None = None) -> None:
+        """
+        调整预算或清零策略，缩小预算时立即淘汰多出的条目
+        """
+        with self._lock:
+            if budget is not None:
+                self.budget = budget
+            if zero_on_evict is not None:
+                self.zero_on_evict = zero_on_evict
+            self._shrink()
+
+    def get(self, name: str, digest: str) -> bytes | None:
+        """
+        取出缓存的条目内容
+
+        Args:
+            name: 条目名
+            digest: 条目当前的哈希，与缓存时不同则视为失效
+
+        Returns:
+            内容副本，未命中时为 None
+        """
+        with self._lock:
+            item = self._items.get(name)
+            if item is None:
+                return None
+            if item[0] != digest:
+                self._evict(name)
+                return None
+            self._items.move_to_end(name)
+            return bytes(item[1])
+
+    def put(self, name: str, digest: str, data: bytes) -> None:
+        """
+        缓存条目内容，单个条目超过预算时不缓存
+        """
+        if len(data) > self.budget:
+            return
+        with self._lock:
+            if name in self._items:
+                self._evict(name)
+            self._items[name] = (digest, bytearray(data))
+            self._size += len(data)
+            self._shrink()
+
+    def discard(self, name: str) -> None:
+        with self._lock:
+            if name in self._items:
+                self._evict(name)
+
+    def clear(self) -> None:
+        with self._lock:
+            for name in list(self._items):
+                self._evict(name)
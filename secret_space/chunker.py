@@ -0,0 +1,153 @@
+import hashlib
+from typing import BinaryIO, Callable, Iterator
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# 内容定义分块（FastCDC 的 Gear 滚动哈希 + 归一化分块）参数
+MIN_SIZE: int = 16 * 1024
+AVG_SIZE: int = 64 * 1024
+MAX_SIZE: int = 256 * 1024
+
+# 平均块大小之前使用更严格的掩码，之后使用更宽松的掩码，使块大小集中在 AVG_SIZE 附近
+_MASK_S: int = 0x184468272e700000
+_MASK_L: int = 0x1840280726700000
+_U64: int = 0xFFFFFFFFFFFFFFFF
+
+# Gear 表必须在不同运行之间保持一致，否则同样的内容会切出不同的块，去重失效
+_GEAR: tuple[int, ...] = tuple(
+    int.from_bytes(hashlib.sha256(b"file-locker-gear" + bytes([i])).digest()[:8], "big")
+    for i in range(256)
+)
+
+_GEAR_ARRAY = np.array(_GEAR, dtype=np.uint64) if np is not None else None
+# 滚动哈希的窗口：左移 64 次后旧字节的贡献全部移出，每个位置的哈希只取决于以它结尾的 64 字节
+_WINDOW: int = 64
+
+# 流式读取时每次读入的大小
+READ_SIZE: int = 4 * 1024 * 1024
+
+
+def cut_point(data: bytes | memoryview, start: int = 0, end: int | None = None) -> int:
+    """
+    在 data[start:end] 中寻找下一个切分点
+
+    Args:
+        data: 数据
+        start: 起始偏移
+        end: 结束偏移，默认为数据末尾
+
+    Returns:
+        切分点（相对 data 的绝对偏移），块为 data[start:返回值]
+    """
+    if end is None:
+        end = len(data)
+    n = end - start
+    if n <= MIN_SIZE:
+        return end
+    if n > MAX_SIZE:
+        n = MAX_SIZE
+    normal = AVG_SIZE if n > AVG_SIZE else n
+    gear = _GEAR
+    fp = 0
+    # 前 MIN_SIZE 字节不可能成为切分点，直接跳过以减少哈希计算
+    i = start + MIN_SIZE
+    stop = start + normal
+    while i < stop:
+        fp = ((fp << 1) + gear[data[i]]) & _U64
+        if not fp & _MASK_S:
+            return i + 1
+        i += 1
+    stop = start + n
+    while i < stop:
+        fp = ((fp << 1) + gear[data[i]]) & _U64
+        if not fp & _MASK_L:
+            return i + 1
+        i += 1
+    return stop
+
+
+def _vector_cutter(data: bytes) -> Callable[[int], int]:
+    """
+    用 numpy 一次算出 data 中每个位置的 Gear 哈希并找出所有满足掩码的位置
+
+    Returns:
+        与 cut_point(data, start) 结果完全相同的函数，切分出的块与逐字节计算时一致，去重不受影响
+    """
+    fp = _GEAR_ARRAY[np.frombuffer(data, dtype=np.uint8)]
+    # 倍增地合并相邻窗口：宽 2w 的窗口哈希 = 宽 w 的窗口哈希 + 前 w 个位置的窗口哈希左移 w 位，
+    # 6 次向量运算即得到所有位置的 64 字节窗口哈希
+    temp = np.empty_like(fp)
+    width = 1
+    while width < _WINDOW:
+        np.left_shift(fp[:-width], np.uint64(width), out=temp[width:])
+        np.add(fp[width:], temp[width:], out=fp[width:])
+        width *= 2
+    small = np.flatnonzero(np.bitwise_and(fp, np.uint64(_MASK_S), out=temp) == 0)
+    large = np.flatnonzero(np.bitwise_and(fp, np.uint64(_MASK_L), out=temp) == 0)
+    length = len(data)
+
+    def find(start: int) -> int:
+        n = length - start
+        if n <= MIN_SIZE:
+            return length
+        if n > MAX_SIZE:
+            n = MAX_SIZE
+        normal = AVG_SIZE if n > AVG_SIZE else n
+        first = start + MIN_SIZE
+        middle = start + normal
+        stop = start + n
+        # cut_point 的哈希在 first 处从 0 开始滚动，窗口填满之前与预先算出的不同，逐字节计算
+        warm = min(first + _WINDOW - 1, stop)
+        fp = 0
+        for i in range(first, warm):
+            fp = ((fp << 1) + _GEAR[data[i]]) & _U64
+            if not fp & (_MASK_S if i < middle else _MASK_L):
+                return i + 1
+        for candidates, low, high in ((small, warm, middle), (large, max(warm, middle), stop)):
+            if low < high:
+                index = int(np.searchsorted(candidates, low))
+                if index < len(candidates) and candidates[index] < high:
+                    return int(candidates[index]) + 1
+        return stop
+
+    return find
+
+
+def iter_chunks(stream: BinaryIO) -> Iterator[bytes]:
+    """
+    以内容定义分块的方式流式切分数据，内存占用与文件大小无关
+    安装了 numpy 时整块缓冲区的哈希一次算出（见 _vector_cutter），否则逐字节计算（见 cut_point），两者结果相同
+
+    Args:
+        stream: 以二进制模式打开的可读对象
+
+    Returns:
+        逐个产出数据块的迭代器
+    """
+    buffer = b""
+    eof = False
+    while True:
+        # 保证缓冲区中至少有一个最大块的数据，除非已经读到末尾
+        while not eof and len(buffer) < MAX_SIZE:
+            data = stream.read(READ_SIZE)
+            if not data:
+                eof = True
+            else:
+                buffer += data
+        if not buffer:
+            return
+        view = memoryview(buffer)
+        find = _vector_cutter(buffer) if np is not None else lambda start: cut_point(view, start)
+        pos = 0
+        while len(buffer) - pos >= MAX_SIZE or (eof and pos < len(buffer)):
+            cut = find(pos)
+            yield bytes(view[pos:cut])
+            pos = cut
+        view.release()
+        buffer = buffer[pos:]
+        if eof and not buffer:
+            return
@@ -0,0 +1,198 @@
+import hmac
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from atomic_file import AtomicWriter, TEMP_SUFFIX
+from secret_space.store import NONCE_SIZE
+
+
+# 倒排表按词的带密钥哈希分到固定数量的桶中，每个桶单独加密存储，
+# 查询时只需解密查询词所在的桶
+BUCKETS: int = 256
+
+# 英文、数字按单词切分；中日韩文字没有分隔符，按相邻两字切分
+_WORD = re.compile("[0-9a-z_]+|[\\u3040-\\u30ff\\u3400-\\u4dbf\\u4e00-\\u9fff\\uac00-\\ud7af]+")
+_CJK = re.compile("[\\u3040-\\u30ff\\u3400-\\u4dbf\\u4e00-\\u9fff\\uac00-\\ud7af]")
+
+
+def tokenize(text: str) -> set[str]:
+    """
+    切分文本为检索词
+
+    Args:
+        text: 文本
+
+    Returns:
+        检索词集合
+    """
+    terms = set()
+    for word in _WORD.findall(text.lower()):
+        if _CJK.match(word):
+            if len(word) == 1:
+                terms.add(word)
+            else:
+                terms.update(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            terms.add(word)
+    return terms
+
+
+class FullTextIndex:
+    """
+    文本条目的加密倒排索引
+
+    每个桶是一个加密文件，内容为 {检索词: [条目名, ...]}。桶文件名和桶号都由
+    带密钥的哈希得到，所以不知道空间密钥时无法得知哪些词出现过。
+    条目记录自己出现在哪些桶中，更新、删除时只需改写这些桶，无需解密旧文本。
+    """
+
+    def __init__(self, root: Path, key: bytes):
+        """
+        初始化倒排索引
+
+        Args:
+            root: 存放桶文件的目录
+            key: 倒排索引密钥
+        """
+        self.root: Path = Path(root)
+        self._key: bytes = key
+        self._aead: AESGCM = AESGCM(key)
+        # 已解密的桶：桶号 -> {检索词: 条目名集合}
+        self._buckets: dict[int, dict[str, set[str]]] = {}
+        self._dirty: set[int] = set()
+        self._lock: threading.Lock = threading.Lock()
+
+    def _bucket_of(self, term: str) -> int:
+        digest = hmac.new(self._key, term.encode(), hashlib.sha256).digest()
+        return int.from_bytes(digest[:4], "big") % BUCKETS
+
+    def _bucket_name(self, bucket: int) -> str:
+        return hmac.new(self._key, b"bucket" + bucket.to_bytes(2, "big"), hashlib.sha256).hexdigest()[:32]
+
+    def _load(self, bucket: int) -> dict[str, set[str]]:
+        if bucket in self._buckets:
+            return self._buckets[bucket]
+        name = self._bucket_name(bucket)
+        path = self.root / name
+        postings = {}
+        if path.is_file():
+            with open(path, "rb") as f:
+                sealed = f.read()
+            raw = self._aead.decrypt(sealed[:NONCE_SIZE], sealed[NONCE_SIZE:], name.encode())
+            postings = {term: set(docs) for term, docs in json.loads(raw).items()}
+        self._buckets[bucket] = postings
+        return postings
+
+    def _discard(self, doc: str, buckets) -> None:
+        for bucket in buckets:
+            postings = self._load(bucket)
+            for term in [term for term, docs in postings.items() if doc in docs]:
+                postings[term].discard(doc)
+                if not postings[term]:
+                    del postings[term]
+            self._dirty.add(bucket)
+
+    def update(self, doc: str, text: str, old_buckets=()) -> list[int]:
+        """
+        为条目建立或更新索引
+
+        Args:
+            doc: 条目名
+            text: 条目文本
+            old_buckets: 该条目上次所在的桶
+
+        Returns:
+            该条目现在所在的桶，需记录在条目中供下次更新使用
+        """
+        with self._lock:
+            self._discard(doc, old_buckets)
+            buckets = set()
+            for term in tokenize(text):
+                bucket = self._bucket_of(term)
+                self._load(bucket).setdefault(term, set()).add(doc)
+                self._dirty.add(bucket)
+                buckets.add(bucket)
+            return sorted(buckets)
+
+    def remove(self, doc: str, buckets) -> None:
+        """
+        从索引中移除条目
+
+        Args:
+            doc: 条目名
+            buckets: 该条目所在的桶
+        """
+        with self._lock:
+            self._discard(doc, buckets)
+
+    def clear(self) -> None:
+        """
+        清空索引，随后 flush 时所有桶都会被改写为空
+        """
+        with self._lock:
+            self._buckets = {bucket: {} for bucket in range(BUCKETS)}
+            self._dirty = set(range(BUCKETS))
+
+    def search(self, query: str) -> set[str]:
+        """
+        查找包含全部检索词的条目，只解密检索词所在的桶
+
+        Args:
+            query: 查询文本
+
+        Returns:
+            条目名集合
+        """
+        terms = tokenize(query)
+        if not terms:
+            return set()
+        with self._lock:
+            result = None
+            for term in terms:
+                docs = self._load(self._bucket_of(term)).get(term, set())
+                result = set(docs) if result is None else result & docs
+                if not result:
+                    return set()
+            return result
+
+    def verify(self) -> list[str]:
+        """
+        校验所有桶文件的认证标签，不影响已缓存的桶
+
+        Returns:
+            损坏的桶文件名列表
+        """
+        broken = []
+        if not self.root.is_dir():
+            return broken
+        for path in self.root.iterdir():
+            if path.name.endswith(TEMP_SUFFIX):
+                continue
+            try:
+                with open(path, "rb") as f:
+                    sealed = f.read()
+                self._aead.decrypt(sealed[:NONCE_SIZE], sealed[NONCE_SIZE:], path.name.encode())
+            except Exception:
+                broken.append(path.name)
+        return broken
+
+    def flush(self) -> None:
+        """
+        加密并写回被修改过的桶
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            self.root.mkdir(parents=True, exist_ok=True)
+            for bucket in sorted(self._dirty):
+                name = self._bucket_name(bucket)
+                postings = self._buckets[bucket]
+                raw = json.dumps({term: sorted(docs) for term, docs in postings.items()}).encode()
+                nonce = os.urandom(NONCE_SIZE)
+                with AtomicWriter(self.root / name) as f:
+                    f.write(nonce + self._aead.encrypt(nonce, raw, name.encode()))
+            self._dirty.clear()
@@ -0,0 +1,195 @@
+import errno
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+LOCK_FILE: str = "space.lock"
+LEASE_FILE: str = "lease.json"
+# 写入租约的有效期，持有者每隔三分之一有效期续约一次
+LEASE_SECONDS: float = 30.0
+
+
+class FileLock:
+    """
+    跨进程的读写锁，基于空间目录下的锁文件
+
+    读取根索引时持有共享锁，写入根索引、租约时持有排他锁，多个只读实例之间互不阻塞。
+    每次加锁都单独打开锁文件，所以同一进程的不同线程之间同样互斥。
+    Windows 上没有共享锁，退化为短暂的排他锁。
+    共享锁以只读方式打开锁文件；只读介质或只读挂载上的空间无法被修改，读取时无法打开或创建锁文件则不加锁。
+    """
+
+    def __init__(self, path: str | Path):
+        self.path: Path = Path(path)
+
+    def _open(self, shared: bool) -> int | None:
+        try:
+            if shared:
+                try:
+                    return os.open(self.path, os.O_RDONLY)
+                except FileNotFoundError:
+                    pass
+            return os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        except OSError as e:
+            if shared and e.errno in (errno.EROFS, errno.EACCES, errno.EPERM):
+                return None
+            raise
+
+    @contextmanager
+    def _locked(self, shared: bool):
+        fd = self._open(shared)
+        if fd is None:
+            yield
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            else:
+                while True:
+                    try:
+                        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+                else:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+
+    def shared(self):
+        return self._locked(True)
+
+    def exclusive(self):
+        return self._locked(False)
+
+
+def _pid_alive(pid: int) -> bool:
+    if fcntl is None:
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Lease:
+    """
+    空间的写入租约，同一时间只有一个实例可以修改空间
+
+    租约记录在租约文件中：持有者令牌、主机名、进程号与到期时间。持有期间由后台线程续约，
+    程序崩溃后租约最迟在有效期结束时失效；同一主机上持有者进程已退出时立即失效。
+    """
+
+    def __init__(self, path: str | Path, lock: FileLock):
+        """
+        Args:
+            path: 租约文件
+            lock: 读写租约文件时使用的锁
+        """
+        self.path: Path = Path(path)
+        self._lock: FileLock = lock
+        self._token: str = os.urandom(16).hex()
+        self._held: bool = False
+        self._stop: threading.Event = threading.Event()
+
+    @property
+    def held(self) -> bool:
+        return self._held
+
+    def _read(self) -> dict | None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write(self) -> None:
+        record = {"token": self._token,
+                  "host": socket.gethostname(),
+                  "pid": os.getpid(),
+                  "expires": time.time() + LEASE_SECONDS}
+        temp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(record, f)
+        os.replace(temp, self.path)
+
+    def _valid_other(self, record: dict | None) -> bool:
+        """
+        租约文件中的记录是否为其他实例持有的有效租约
+        """
+        if record is None or record.get("token") == self._token:
+            return False
+        if record.get("expires", 0) < time.time():
+            return False
+        if record.get("host") == socket.gethostname() and not _pid_alive(record.get("pid", 0)):
+            return False
+        return True
+
+    def holder(self) -> dict | None:
+        """
+        当前持有租约的其他实例，无人持有或由本实例持有时返回 None
+        """
+        with self._lock.shared():
+            record = self._read()
+        return record if self._valid_other(record) else None
+
+    def acquire(self) -> dict | None:
+        """
+        取得租约并开始后台续约
+
+        Returns:
+            成功时为 None，租约被其他实例持有时为其记录
+        """
+        with self._lock.exclusive():
+            record = self._read()
+            if self._valid_other(record):
+                return record
+            self._write()
+        if not self._held:
+            self._held = True
+            self._stop = threading.Event()
+            threading.Thread(target=self._renew_loop, args=(self._stop,), daemon=True).start()
+        return None
+
+    def check(self) -> bool:
+        """
+        租约是否仍由本实例持有，调用者需持有排他锁
+        """
+        return self._held and (self._read() or {}).get("token") == self._token
+
+    def _renew_loop(self, stop: threading.Event) -> None:
+        while not stop.wait(LEASE_SECONDS / 3):
+            with self._lock.exclusive():
+                if (self._read() or {}).get("token") != self._token:
+                    self._held = False
+                    return
+                self._write()
+
+    def release(self) -> None:
+        if not self._held:
+            return
+        self._stop.set()
+        self._held = False
+        with self._lock.exclusive():
+            if (self._read() or {}).get("token") == self._token:
+                self.path.unlink(missing_ok=True)
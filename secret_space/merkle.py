@@ -0,0 +1,95 @@
+import hashlib
+import threading
+
+
+# 根节点下的分组数，条目按名称哈希的首字节分组
+FANOUT: int = 256
+
+
+def chunk_leaf(chunk_id: str, tag: bytes) -> bytes:
+    """
+    块的叶子哈希：块名与其 GCM 认证标签
+    """
+    return hashlib.sha256(chunk_id.encode() + tag).digest()
+
+
+def entry_digest(name: str, size: int, leaves: list[bytes]) -> str:
+    """
+    条目的哈希：条目名、大小与所有块的叶子哈希
+
+    Returns:
+        十六进制哈希
+    """
+    h = hashlib.sha256()
+    h.update(name.encode())
+    h.update(b"\0")
+    h.update(size.to_bytes(8, "big"))
+    for leaf in leaves:
+        h.update(leaf)
+    return h.hexdigest()
+
+
+def group_of(name: str) -> int:
+    """
+    条目所在的分组，索引分页也按此分组
+    """
+    return hashlib.sha256(name.encode()).digest()[0] % FANOUT
+
+
+class MerkleTree:
+    """
+    覆盖所有条目哈希的 Merkle 树
+
+    树分为三层：条目哈希 -> 分组哈希 -> 根。修改条目只会使所在分组失效，
+    计算根时只重新计算失效的分组，其他分组的哈希直接复用。
+    根保存在经过认证的索引中，所以只要索引通过认证，根就可信；
+    单个条目只需读取其块的认证标签重新计算条目哈希即可对照。
+    """
+
+    def __init__(self, digests: dict[str, str] | None = None):
+        """
+        Args:
+            digests: {条目名: 条目哈希}
+        """
+        self._lock: threading.Lock = threading.Lock()
+        self._groups: list[dict[str, str]] = [{} for _ in range(FANOUT)]
+        self._group_hashes: list[bytes | None] = [None] * FANOUT
+        for name, digest in (digests or {}).items():
+            self._groups[group_of(name)][name] = digest
+
+    def set(self, name: str, digest: str) -> None:
+        group = group_of(name)
+        with self._lock:
+            self._groups[group][name] = digest
+            self._group_hashes[group] = None
+
+    def remove(self, name: str) -> None:
+        group = group_of(name)
+        with self._lock:
+            if self._groups[group].pop(name, None) is not None:
+                self._group_hashes[group] = None
+
+    def get(self, name: str) -> str | None:
+        return self._groups[group_of(name)].get(name)
+
+    def names_in(self, group: int) -> list[str]:
+        with self._lock:
+            return sorted(self._groups[group])
+
+    def root(self) -> str:
+        """
+        计算根哈希，只重新计算发生变化的分组
+
+        Returns:
+            十六进制根哈希
+        """
+        with self._lock:
+            h = hashlib.sha256()
+            for group in range(FANOUT):
+                if self._group_hashes[group] is None:
+                    gh = hashlib.sha256()
+                    for name in sorted(self._groups[group]):
+                        gh.update(bytes.fromhex(self._groups[group][name]))
+                    self._group_hashes[group] = gh.digest()
+                h.update(self._group_hashes[group])
+            return h.hexdigest()
@@ -0,0 +1,288 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from queue import Queue
+from typing import Callable, Iterator
+from batch import SKIP, OVERWRITE, RENAME
+
+
+# 导入时读取、分块文件的工作线程数（导出时为同时导出的条目数），以及加密、写入（导出时为读取、解密）块的线程数
+READ_WORKERS: int = 4
+WRITE_WORKERS: int = 4
+# 遍历与读取之间的队列长度，遍历领先太多时阻塞，内存占用与文件总数无关
+QUEUE_SIZE: int = 256
+# 每导入多少个文件提交一次索引，中途停止或崩溃时已提交的部分不会丢失
+COMMIT_EVERY: int = 1000
+
+_DONE = object()
+
+
+def walk_paths(paths: list[str],
+               on_error: Callable[[Path, OSError], None] | None = None) -> Iterator[tuple[Path, str]]:
+    """
+    遍历拖入的文件和文件夹
+
+    Args:
+        paths: 文件或文件夹路径
+        on_error: 无法读取的文件夹及其错误；为 None 时抛出该错误，以免其中的文件被悄悄遗漏
+
+    Returns:
+        (文件路径, 条目名) 的迭代器，文件夹中的文件以"文件夹名/相对路径"为条目名
+    """
+    for path in map(Path, paths):
+        if path.is_file():
+            yield path, path.name
+        elif path.is_dir():
+            stack = [(path, path.name)]
+            while stack:
+                directory, prefix = stack.pop()
+                try:
+                    with os.scandir(directory) as it:
+                        for item in it:
+                            name = f"{prefix}/{item.name}"
+                            if item.is_dir(follow_symlinks=False):
+                                stack.append((Path(item.path), name))
+                            elif item.is_file():
+                                yield Path(item.path), name
+                except OSError as e:
+                    if on_error is None:
+                        raise
+                    on_error(directory, e)
+
+
+def existing_names(space, paths: list[str]) -> list[str]:
+    """
+    拖入的文件和文件夹中与空间已有条目重名的顶层名称，不遍历文件夹，用于导入前询问
+    """
+    names = []
+    for path in map(Path, paths):
+        name = path.name
+        if path.is_dir():
+            if any(entry.startswith(name + "/") for entry in space.entries):
+                names.append(name + "/")
+        elif name in space.entries:
+            names.append(name)
+    return names
+
+
+def unique_name(name: str, taken: Callable[[str], bool]) -> str:
+    """
+    为重名的条目生成"名称 (n).扩展名"形式的新条目名
+    """
+    directory, slash, base = name.rpartition("/")
+    stem, dot, suffix = base.rpartition(".")
+    if not stem:
+        stem, dot, suffix = base, "", ""
+    number = 1
+    while True:
+        candidate = f"{directory}{slash}{stem} ({number}){dot}{suffix}"
+        if not taken(candidate):
+            return candidate
+        number += 1
+
+
+def import_paths(space,
+                 paths: list[str],
+                 progress: Callable[[int, int, bool], None] | None = None,
+                 should_stop: Callable[[], bool] | None = None,
+                 on_exists: str = SKIP) -> tuple[int, dict[str, str], list[str]]:
+    """
+    流式并行地将文件和文件夹导入秘密空间
+
+    遍历线程 -> 有界队列 -> 读取、分块线程 -> 共享的加密、写入线程池。
+    遍历开始后立即开始写入，队列满时遍历暂停，所以内存占用与文件数无关。
+
+    Args:
+        space: 已打开的 SecretSpace
+        paths: 文件或文件夹路径
+        progress: 进度回调 (已导入数, 已发现数, 是否遍历完毕)
+        should_stop: 返回 True 时停止，已导入的文件会被提交
+        on_exists: 条目名已存在时的处理方式，SKIP、OVERWRITE 或 RENAME；
+            本次导入中重名的文件不会互相覆盖，SKIP 时跳过，否则改名
+
+    Returns:
+        (导入的文件数, {源路径: 错误信息}, 因重名跳过的源路径)，无法读取的文件夹也记入错误信息
+    """
+    queue: Queue = Queue(maxsize=QUEUE_SIZE)
+    lock = threading.Lock()
+    stopped = threading.Event()
+    errors: dict[str, str] = {}
+    skipped: list[str] = []
+    unreadable: dict[str, str] = {}
+    claimed: set[str] = set()
+    counts = {"found": 0, "done": 0, "walked": False}
+
+    def claim(path, name):
+        """
+        按 on_exists 决定条目名，跳过时返回 None
+        """
+        taken = lambda candidate: candidate in claimed or candidate in space.entries
+        with lock:
+            if name in claimed or (name in space.entries and on_exists != OVERWRITE):
+                if on_exists == SKIP:
+                    skipped.append(str(path))
+                    return None
+                name = unique_name(name, taken)
+            claimed.add(name)
+            return name
+
+    def report():
+        if progress: progress(counts["done"], counts["found"], counts["walked"])
+
+    def on_error(directory, e):
+        unreadable[str(directory)] = f"无法读取文件夹：{e}"
+
+    def walker():
+        try:
+            for item in walk_paths(paths, on_error):
+                if stopped.is_set():
+                    break
+                with lock:
+                    counts["found"] += 1
+                queue.put(item)
+        finally:
+            with lock:
+                counts["walked"] = True
+            for _ in range(READ_WORKERS):
+                queue.put(_DONE)
+
+    def reader(pool):
+        while True:
+            item = queue.get()
+            if item is _DONE:
+                return
+            if stopped.is_set():
+                continue
+            path, name = item
+            name = claim(path, name)
+            try:
+                if name is not None:
+                    space.add_file(path, name, pool)
+            except Exception as e:
+                with lock:
+                    errors[str(path)] = str(e)
+            with lock:
+                counts["done"] += 1
+                need_commit = counts["done"] % COMMIT_EVERY == 0
+            if need_commit:
+                space.commit()
+            report()
+            if should_stop and should_stop():
+                stopped.set()
+
+    with ThreadPoolExecutor(max_workers=WRITE_WORKERS) as pool:
+        threads = [threading.Thread(target=walker, daemon=True)]
+        threads += [threading.Thread(target=reader, args=(pool,), daemon=True) for _ in range(READ_WORKERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    space.commit()
+    report()
+    count = counts["done"] - len(errors) - len(skipped)
+    errors.update(unreadable)
+    return count, errors, skipped
+
+
+def _export_path(target: Path, relative: str) -> Path:
+    """
+    条目在导出目录中的路径，拒绝会跳出导出目录的条目名
+    """
+    parts = relative.split("/")
+    if any(part in ("", ".", "..") or "\\" in part or ":" in part for part in parts):
+        raise ValueError(f'条目名"{relative}"不能作为路径')
+    return target.joinpath(*parts)
+
+
+def select_entries(space, prefix: str = "") -> list[tuple[str, str]]:
+    """
+    选出要导出的条目
+
+    Args:
+        space: 已打开的 SecretSpace
+        prefix: 要导出的目录，如"照片/2023"，为空时导出全部条目
+
+    Returns:
+        (条目名, 导出的相对路径) 的列表，相对路径保留所选目录本身的名称
+    """
+    prefix = prefix.strip("/")
+    if not prefix:
+        return [(name, name) for name in space.names()]
+    parent = prefix.rpartition("/")[0]
+    cut = len(parent) + 1 if parent else 0
+    return [(name, name[cut:]) for name in space.names()
+            if name == prefix or name.startswith(prefix + "/")]
+
+
+def export_entries(space,
+                   target: str | Path,
+                   prefix: str = "",
+                   progress: Callable[[int, int], None] | None = None,
+                   should_stop: Callable[[], bool] | None = None) -> tuple[int, dict[str, str]]:
+    """
+    流式并行地将秘密空间或其中一个目录导出为普通文件
+
+    多个条目同时导出，每个条目的块又由共享的读取、解密线程池预读，磁盘与 CPU 都能跑满。
+    文件先写入临时文件，完成后改名并设置修改时间；再次导出到同一目录时，
+    大小与修改时间都一致的文件会被跳过，所以中断后重新导出即可从中断处继续。
+
+    Args:
+        space: 已打开的 SecretSpace
+        target: 导出目录
+        prefix: 要导出的目录，为空时导出全部条目
+        progress: 进度回调 (已处理数, 总数)
+        should_stop: 返回 True 时停止，已导出的文件会被保留
+
+    Returns:
+        (导出的文件数, {条目名: 错误信息})，跳过的文件也计入导出数
+    """
+    target = Path(target)
+    items = select_entries(space, prefix)
+    lock = threading.Lock()
+    stopped = threading.Event()
+    errors: dict[str, str] = {}
+    counts = {"done": 0}
+
+    def export(pool, name, relative):
+        if stopped.is_set():
+            return
+        try:
+            path = _export_path(target, relative)
+            entry = space.entries[name]
+            try:
+                stat = path.stat()
+                up_to_date = stat.st_size == entry["size"] and int(stat.st_mtime) == int(entry["mtime"])
+            except FileNotFoundError:
+                up_to_date = False
+            if not up_to_date:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                temp = path.with_name(f".{path.name}.{threading.get_ident()}.part")
+                try:
+                    with open(temp, "wb") as f:
+                        for data in space.iter_read(name, pool):
+                            if stopped.is_set():
+                                break
+                            f.write(data)
+                    if stopped.is_set():
+                        temp.unlink(missing_ok=True)
+                        return
+                    os.replace(temp, path)
+                except BaseException:
+                    temp.unlink(missing_ok=True)
+                    raise
+                os.utime(path, (entry["mtime"], entry["mtime"]))
+        except Exception as e:
+            with lock:
+                errors[name] = str(e)
+        with lock:
+            counts["done"] += 1
+        if progress: progress(counts["done"], len(items))
+        if should_stop and should_stop():
+            stopped.set()
+
+    with ThreadPoolExecutor(max_workers=WRITE_WORKERS) as pool:
+        with ThreadPoolExecutor(max_workers=READ_WORKERS) as workers:
+            for name, relative in items:
+                workers.submit(export, pool, name, relative)
+    return counts["done"] - len(errors), errors
@@ -0,0 +1,234 @@
+import json
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+from encrip import KeyCache, iter_decrypt, recover_header
+from encpack import PackReader, EXTENSION as PACK_EXTENSION
+from atomic_file import AtomicWriter
+
+
+# 校验进度文件，只记录块名（带密钥的哈希）和相对路径，不含任何明文
+SCRUB_STATE_FILE: str = "scrub.json"
+FOLDER_SCRUB_STATE_FILE: str = ".filelocker-scrub.json"
+
+# 每处理完一批保存一次进度
+BATCH_SIZE: int = 256
+
+
+class Throttle:
+    """
+    按字节数限速，多个线程共享同一个限速器
+    """
+
+    def __init__(self, bytes_per_sec: float | None):
+        """
+        Args:
+            bytes_per_sec: 每秒最多处理的字节数，None 表示不限速
+        """
+        self.bytes_per_sec: float | None = bytes_per_sec
+        self._lock: threading.Lock = threading.Lock()
+        self._next: float = time.monotonic()
+
+    def consume(self, count: int) -> None:
+        """
+        登记处理了 count 字节，超出速率时阻塞当前线程
+        """
+        if not self.bytes_per_sec:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next, now)
+            self._next = start + count / self.bytes_per_sec
+            delay = start - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _load_state(path: Path) -> dict:
+    if path.is_file():
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return {"cursor": "", "bad": {}}
+
+
+def _run(items: list[str],
+         state_path: Path,
+         check: Callable[[str], tuple[int, str | None]],
+         workers: int,
+         throttle: Throttle,
+         progress: Callable[[int, int], None] | None,
+         should_stop: Callable[[], bool] | None,
+         resume: bool) -> dict[str, str] | None:
+    """
+    按顺序分批并行校验，每批完成后保存游标，中断后从游标处继续
+
+    Returns:
+        {项目: 错误信息}，被中断时返回 None
+    """
+    state = _load_state(state_path) if resume else {"cursor": "", "bad": {}}
+    items = sorted(items)
+    cursor = state["cursor"]
+    known = set(items)
+    bad: dict[str, str] = {k: v for k, v in state["bad"].items() if k in known}
+    todo = [item for item in items if item > cursor]
+    done = len(items) - len(todo)
+    if progress: progress(done, len(items))
+
+    def job(item):
+        size, error = check(item)
+        throttle.consume(size)
+        return item, error
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(todo), BATCH_SIZE):
+            if should_stop and should_stop():
+                return None
+            batch = todo[start:start + BATCH_SIZE]
+            for item, error in pool.map(job, batch):
+                if error is not None:
+                    bad[item] = error
+            done += len(batch)
+            with AtomicWriter(state_path) as f:
+                f.write(json.dumps({"cursor": batch[-1], "bad": bad}).encode())
+            if progress: progress(done, len(items))
+    # 完整校验完毕后删除进度文件，下次从头开始
+    try:
+        os.remove(state_path)
+    except FileNotFoundError:
+        pass
+    return bad
+
+
+def scrub_space(space,
+                workers: int = 4,
+                bytes_per_sec: float | None = None,
+                progress: Callable[[int, int], None] | None = None,
+                should_stop: Callable[[], bool] | None = None,
+                resume: bool = True) -> dict[str, list[str]] | None:
+    """
+    并行校验秘密空间中所有块和索引的认证标签
+
+    Args:
+        space: 已打开的 SecretSpace
+        workers: 工作线程数
+        bytes_per_sec: 限速，None 表示不限速，可在后台低速运行
+        progress: 进度回调 (已完成数, 总数)
+        should_stop: 返回 True 时在当前批次结束后停止，进度会被保存
+        resume: 是否从上次中断处继续
+
+    Returns:
+        {损坏的条目名或索引文件: [损坏的块名]}，全部完好时为空字典，被中断时返回 None
+    """
+    report: dict[str, list[str]] = {}
+    try:
+        space.verify_index()
+    except Exception as e:
+        report["<索引>"] = [str(e)]
+        return report
+    if space.fulltext is not None:
+        broken = space.fulltext.verify()
+        if broken:
+            report["<全文索引>"] = broken
+
+    entries = space.chunk_lists()
+    chunk_ids = {chunk_id for chunks in entries.values() for chunk_id in chunks}
+
+    def check(chunk_id):
+        try:
+            return len(space.store.get(chunk_id)), None
+        except FileNotFoundError:
+            return 0, "缺失"
+        except Exception as e:
+            return 0, f"认证失败：{e!r}"
+
+    bad = _run(list(chunk_ids), space.path / SCRUB_STATE_FILE, check,
+               workers, Throttle(bytes_per_sec), progress, should_stop, resume)
+    if bad is None:
+        return None
+    for name, chunks in entries.items():
+        broken = [chunk_id for chunk_id in chunks if chunk_id in bad]
+        if broken:
+            report[name] = broken
+    return report
+
+
+def quick_check_space(space,
+                      workers: int = 4,
+                      progress: Callable[[int, int], None] | None = None,
+                      should_stop: Callable[[], bool] | None = None) -> list[str] | None:
+    """
+    快速校验：读取每个条目各块的认证标签并与 Merkle 树对照，不解密块内容
+
+    Args:
+        space: 已打开的 SecretSpace
+        workers: 工作线程数
+        progress: 进度回调 (已完成数, 总数)
+        should_stop: 返回 True 时停止
+
+    Returns:
+        不一致的条目名列表，被中断时返回 None
+    """
+    names = sorted(space.names())
+    bad = []
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(names), BATCH_SIZE):
+            if should_stop and should_stop():
+                return None
+            batch = names[start:start + BATCH_SIZE]
+            bad.extend(name for name, ok in zip(batch, pool.map(space.verify_entry, batch)) if not ok)
+            done += len(batch)
+            if progress: progress(done, len(names))
+    return bad
+
+
+def scrub_folder(folder: str | Path,
+                 password: str,
+                 workers: int = 4,
+                 bytes_per_sec: float | None = None,
+                 progress: Callable[[int, int], None] | None = None,
+                 should_stop: Callable[[], bool] | None = None,
+                 resume: bool = True) -> dict[str, str] | None:
+    """
+    并行校验文件夹（含子文件夹）中所有 .enc* 文件能否用 password 解密并通过认证
+
+    Args:
+        folder: 文件夹
+        password: 这些文件共用的密码
+        其余参数见 scrub_space
+
+    Returns:
+        {相对路径: 错误信息}，被中断时返回 None
+    """
+    folder = Path(folder)
+    # 只按扩展名筛选，文件头备份（.rekey）与写入中的临时文件（.part）不参与校验
+    items = [path.relative_to(folder).as_posix()
+             for path in folder.rglob("*.enc*") if path.is_file() and path.suffix.lower().startswith(".enc")]
+    # 同一批加密的文件往往共用盐值，共用派生缓存时只派生一次
+    cache = KeyCache()
+
+    def check(relative):
+        try:
+            if relative.lower().endswith(PACK_EXTENSION):
+                reader = PackReader(folder / relative, password)
+                for name in reader.names():
+                    for _ in reader.iter_read(name):
+                        pass
+                return (folder / relative).stat().st_size, None
+            recover_header(folder / relative)
+            with open(folder / relative, "rb") as f:
+                _, chunks = iter_decrypt(f, password, cache)
+                for _ in chunks:
+                    pass
+            return (folder / relative).stat().st_size, None
+        except Exception:
+            return 0, "密码错误或文件已损坏"
+
+    return _run(items, folder / FOLDER_SCRUB_STATE_FILE, check,
+                workers, Throttle(bytes_per_sec), progress, should_stop, resume)
@@ -0,0 +1,141 @@
+import bisect
+import threading
+
+
+# 子串查询使用的 n-gram 长度，短于此长度的查询退化为线性扫描
+GRAM: int = 3
+
+
+def _grams(text: str) -> set[str]:
+    return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+class NameIndex:
+    """
+    条目名的内存搜索索引，只在空间解锁后由解密的索引构建，从不写入磁盘
+
+    前缀查询使用有序列表二分查找，子串查询使用三元组倒排表求交后再逐个核对，
+    均不区分大小写。插入、删除都是增量的。
+    """
+
+    def __init__(self, names=()):
+        """
+        初始化索引
+
+        Args:
+            names: 初始条目名
+        """
+        self._lock: threading.Lock = threading.Lock()
+        # 小写名 -> 原名集合，不同大小写的条目名可能折叠为同一个小写名
+        self._names: dict[str, set[str]] = {}
+        self._sorted: list[str] = []
+        self._postings: dict[str, set[str]] = {}
+        for name in names:
+            key = self._add(name)
+            if key is not None:
+                self._sorted.append(key)
+        self._sorted.sort()
+
+    def _add(self, name: str) -> str | None:
+        """
+        登记条目名，返回新出现的小写名，已有同名（忽略大小写）时返回 None
+        """
+        key = name.lower()
+        if key in self._names:
+            self._names[key].add(name)
+            return None
+        self._names[key] = {name}
+        for gram in _grams(key):
+            self._postings.setdefault(gram, set()).add(key)
+        return key
+
+    def add(self, name: str) -> None:
+        with self._lock:
+            key = self._add(name)
+            if key is not None:
+                bisect.insort(self._sorted, key)
+
+    def remove(self, name: str) -> None:
+        with self._lock:
+            key = name.lower()
+            originals = self._names.get(key)
+            if not originals or name not in originals:
+                return
+            originals.discard(name)
+            if originals:
+                return
+            del self._names[key]
+            i = bisect.bisect_left(self._sorted, key)
+            if i < len(self._sorted) and self._sorted[i] == key:
+                del self._sorted[i]
+            for gram in _grams(key):
+                posting = self._postings.get(gram)
+                if posting is not None:
+                    posting.discard(key)
+                    if not posting:
+                        del self._postings[gram]
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def _expand(self, keys, limit: int | None) -> list[str]:
+        result = []
+        for key in keys:
+            result.extend(sorted(self._names[key]))
+            if limit is not None and len(result) >= limit:
+                return result[:limit]
+        return result
+
+    def prefix(self, query: str, limit: int | None = None) -> list[str]:
+        """
+        查找以 query 开头的条目名
+
+        Args:
+            query: 前缀
+            limit: 最多返回的数量
+
+        Returns:
+            按名称排序的条目名列表
+        """
+        query = query.lower()
+        with self._lock:
+            i = bisect.bisect_left(self._sorted, query)
+            keys = []
+            while i < len(self._sorted) and self._sorted[i].startswith(query):
+                keys.append(self._sorted[i])
+                if limit is not None and len(keys) >= limit:
+                    break
+                i += 1
+            return self._expand(keys, limit)
+
+    def search(self, query: str, limit: int | None = None) -> list[str]:
+        """
+        查找包含 query 的条目名
+
+        Args:
+            query: 子串
+            limit: 最多返回的数量
+
+        Returns:
+            按名称排序的条目名列表
+        """
+        query = query.lower()
+        with self._lock:
+            if len(query) < GRAM:
+                keys = (key for key in self._sorted if query in key)
+            else:
+                postings = []
+                for gram in _grams(query):
+                    posting = self._postings.get(gram)
+                    if not posting:
+                        return []
+                    postings.append(posting)
+                # 从最短的倒排表开始求交，减少集合运算量
+                postings.sort(key=len)
+                candidates = set(postings[0])
+                for posting in postings[1:]:
+                    candidates &= posting
+                    if not candidates:
+                        return []
+                keys = sorted(key for key in candidates if query in key)
+            return self._expand(keys, limit)
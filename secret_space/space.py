@@ -0,0 +1,788 @@
+import hmac
+import hashlib
+import itertools
+import json
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from atomic_file import AtomicWriter
+from encrip import derive_key
+from secret_space.chunker import iter_chunks
+from secret_space.store import ChunkStore, NONCE_SIZE
+from secret_space.search import NameIndex
+from secret_space.fulltext import FullTextIndex
+from secret_space.merkle import MerkleTree, FANOUT, group_of, chunk_leaf, entry_digest
+from secret_space.lock import FileLock, Lease, LOCK_FILE, LEASE_FILE
+from secret_space.watch import FileWatcher
+
+
+MAGIC: bytes = b"FLSPACE1"
+HEADER_FILE: str = "space.flk"
+INDEX_FILE: str = "index.enc"
+CHUNK_DIR: str = "chunks"
+FULLTEXT_DIR: str = "fulltext"
+
+# 读写块时并行的线程数，以及预读、预写的块数上限
+IO_WORKERS: int = 4
+IO_WINDOW: int = IO_WORKERS * 2
+
+# 自动快照的标签与保留数量，手动快照不受数量限制
+AUTO_SNAPSHOT_LABEL: str = "自动"
+MAX_AUTO_SNAPSHOTS: int = 100
+
+
+def is_space(path: str | Path) -> bool:
+    """
+    判断目录是否为秘密空间
+    """
+    header = Path(path) / HEADER_FILE
+    if not header.is_file():
+        return False
+    with open(header, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _subkey(master_key: bytes, label: bytes) -> bytes:
+    """
+    从空间主密钥派生用途各异的子密钥
+    """
+    return hmac.new(master_key, label, hashlib.sha256).digest()
+
+
+class SecretSpace:
+    """
+    秘密空间
+
+    空间是一个目录，包含：
+        space.flk  文件头：魔数、三层 KDF 的盐值、被密码密钥包裹的随机主密钥
+        index.enc  加密的根索引：各索引页的块名、Merkle 根、快照列表等
+        chunks/    内容寻址的加密块，见 ChunkStore；可另外添加位于其他磁盘的分片目录
+        fulltext/  可选的文本条目加密倒排索引，见 FullTextIndex
+        space.lock 跨进程读写锁，lease.json 写入租约，见 lock 模块
+
+    条目内容经内容定义分块后存入块仓库，相同的块只存储一次，
+    所以导入修改过的大文件时只会加密、写入变化的部分。
+
+    条目（块列表、大小、修改时间、条目哈希）按 Merkle 分组分为若干索引页，
+    每页同样作为块存入块仓库，提交时只写入发生变化的页。快照只是一个记录了
+    所有页块名的小块，与当前索引共享未变化的页和数据块（写时复制），
+    所以创建快照的开销只与上次提交后的变化量有关。
+
+    多个程序可以同时打开同一个空间：只读的实例互不阻塞，第一次修改时取得写入租约，
+    租约被其他实例持有时修改会失败。其他实例提交后，通过 watch 只重新载入块名变化的索引页。
+    """
+
+    def __init__(self, path: str | Path, master_key: bytes):
+        """
+        使用已解开的主密钥初始化空间，一般通过 create 或 open 获取实例
+
+        Args:
+            path: 空间目录
+            master_key: 空间主密钥
+        """
+        self.path: Path = Path(path)
+        self._master_key: bytes = master_key
+        self._index_aead: AESGCM = AESGCM(_subkey(master_key, b"index"))
+        self.store: ChunkStore = ChunkStore(self.path / CHUNK_DIR,
+                                            _subkey(master_key, b"chunk-enc"),
+                                            _subkey(master_key, b"chunk-id"))
+        self.entries: dict[str, dict] = {}
+        # 条目名搜索索引，只存在于内存中
+        self.name_index: NameIndex = NameIndex()
+        # 覆盖所有条目哈希的 Merkle 树
+        self.merkle: MerkleTree = MerkleTree()
+        # 全文索引，未启用时为 None
+        self.fulltext: FullTextIndex | None = None
+        # 各分组索引页的块名，空分组为 None
+        self._pages: list[str | None] = [None] * FANOUT
+        # 上次提交后发生变化的分组
+        self._dirty_pages: set[int] = set()
+        # 快照列表：{"id", "root", "time", "label"}
+        self.snapshots: list[dict] = []
+        # 是否在每次提交时自动创建快照
+        self.auto_snapshot: bool = False
+        # 除空间目录下 chunks 以外的分片目录
+        self.shards: list[str] = []
+        # 迁移分片未完成时迁移前的分片目录，完成后为 None
+        self.old_shards: list[str] | None = None
+        self._lock: threading.RLock = threading.RLock()
+        # 正在写入块的 add_stream 数，清理无用块时等待其归零
+        self._streams: int = 0
+        self._idle: threading.Condition = threading.Condition(self._lock)
+        self._file_lock: FileLock = FileLock(self.path / LOCK_FILE)
+        self._lease: Lease = Lease(self.path / LEASE_FILE, self._file_lock)
+        # 监视其他实例提交的根索引，未开始监视时为 None
+        self._watcher: FileWatcher | None = None
+
+    @classmethod
+    def create(cls, path: str | Path, password: str) -> "SecretSpace":
+        """
+        新建秘密空间
+
+        Args:
+            path: 空间目录，不存在时自动创建，已存在时必须为空
+            password: 空间密码
+
+        Returns:
+            新建的空间
+        """
+        path = Path(path)
+        if path.exists() and any(path.iterdir()):
+            raise FileExistsError(f'目录"{path}"不为空')
+        path.mkdir(parents=True, exist_ok=True)
+        master_key = os.urandom(32)
+        salts = os.urandom(96)
+        kek = derive_key(password, salts[:32], salts[32:64], salts[64:])
+        nonce = os.urandom(NONCE_SIZE)
+        wrapped = AESGCM(kek).encrypt(nonce, master_key, MAGIC)
+        with AtomicWriter(path / HEADER_FILE) as f:
+            f.write(MAGIC + salts + nonce + wrapped)
+        space = cls(path, master_key)
+        space.commit()
+        return space
+
+    @classmethod
+    def open(cls, path: str | Path, password: str) -> "SecretSpace":
+        """
+        打开秘密空间
+
+        Args:
+            path: 空间目录
+            password: 空间密码
+
+        Returns:
+            打开的空间，密码错误或空间损坏时抛出 ValueError
+        """
+        path = Path(path)
+        if not is_space(path):
+            raise ValueError(f'"{path}"不是秘密空间')
+        with open(path / HEADER_FILE, "rb") as f:
+            header = f.read()
+        salts = header[8:104]
+        nonce = header[104:104 + NONCE_SIZE]
+        wrapped = header[104 + NONCE_SIZE:]
+        kek = derive_key(password, salts[:32], salts[32:64], salts[64:])
+        try:
+            master_key = AESGCM(kek).decrypt(nonce, wrapped, MAGIC)
+        except InvalidTag:
+            raise ValueError("密码错误或空间已损坏")
+        space = cls(path, master_key)
+        space.reload()
+        return space
+
+    def rekey(self, old_password: str, new_password: str) -> None:
+        """
+        更改空间密码，只以新密码重新包裹主密钥并改写文件头，数据块与索引都不需要重新加密
+
+        Args:
+            old_password: 原密码，错误时抛出 ValueError
+            new_password: 新密码
+        """
+        with open(self.path / HEADER_FILE, "rb") as f:
+            header = f.read()
+        salts = header[8:104]
+        nonce = header[104:104 + NONCE_SIZE]
+        kek = derive_key(old_password, salts[:32], salts[32:64], salts[64:])
+        try:
+            master_key = AESGCM(kek).decrypt(nonce, header[104 + NONCE_SIZE:], MAGIC)
+        except InvalidTag:
+            raise ValueError("原密码错误")
+        if master_key != self._master_key:
+            raise ValueError("原密码错误")
+        salts = os.urandom(96)
+        kek = derive_key(new_password, salts[:32], salts[32:64], salts[64:])
+        nonce = os.urandom(NONCE_SIZE)
+        wrapped = AESGCM(kek).encrypt(nonce, master_key, MAGIC)
+        with self._file_lock.exclusive():
+            with AtomicWriter(self.path / HEADER_FILE) as f:
+                f.write(MAGIC + salts + nonce + wrapped)
+
+    def _read_index(self) -> dict:
+        with self._file_lock.shared():
+            with open(self.path / INDEX_FILE, "rb") as f:
+                sealed = f.read()
+        try:
+            raw = self._index_aead.decrypt(sealed[:NONCE_SIZE], sealed[NONCE_SIZE:], b"index")
+        except InvalidTag:
+            raise ValueError("空间索引已损坏")
+        return json.loads(raw)
+
+    def _load_pages(self, pages) -> dict[str, dict]:
+        entries = {}
+        for page_id in pages:
+            if page_id:
+                entries.update(json.loads(self.store.get(page_id)))
+        return entries
+
+    def verify_index(self) -> None:
+        """
+        校验磁盘上根索引及各索引页的认证标签，不影响内存中的条目，损坏时抛出 ValueError
+        """
+        index = self._read_index()
+        try:
+            self._load_pages(index.get("pages", ()))
+        except (OSError, InvalidTag):
+            raise ValueError("空间索引页已损坏")
+
+    def reload(self) -> None:
+        """
+        从磁盘重新读取并解密索引
+        """
+        index = self._read_index()
+        # 索引页也存放在块仓库中，需先确定分片目录
+        self._load_shards(index)
+        if "pages" in index:
+            pages = index["pages"]
+            entries = self._load_pages(pages)
+            dirty = set()
+        else:
+            # 旧版本空间的索引直接内嵌条目，下次提交时改写为分页格式
+            pages = [None] * FANOUT
+            entries = index["entries"]
+            dirty = set(range(FANOUT))
+        # 旧版本空间的条目没有条目哈希，读取块的认证标签补上
+        for name, entry in entries.items():
+            if "digest" not in entry:
+                entry["digest"] = self._digest_of(name, entry)
+                dirty.add(group_of(name))
+        merkle = MerkleTree({name: entry["digest"] for name, entry in entries.items()})
+        if "merkle_root" in index and merkle.root() != index["merkle_root"]:
+            raise ValueError("空间索引与 Merkle 根不一致")
+        with self._lock:
+            self.entries = entries
+            self.merkle = merkle
+            self.name_index = NameIndex(self.entries)
+            self.fulltext = self._fulltext_index() if index.get("fulltext") else None
+            self._pages = pages
+            self._dirty_pages = dirty
+            self.snapshots = index.get("snapshots", [])
+            self.auto_snapshot = index.get("auto_snapshot", False)
+
+    def _write_pages(self) -> None:
+        for group in sorted(self._dirty_pages):
+            names = self.merkle.names_in(group)
+            if names:
+                page = {name: self.entries[name] for name in names}
+                self._pages[group], _, _ = self.store.put(json.dumps(page, sort_keys=True).encode())
+            else:
+                self._pages[group] = None
+        self._dirty_pages.clear()
+
+    def _write_root(self) -> None:
+        # 根索引引用的块与索引页先落盘
+        self.store.sync()
+        raw = json.dumps({"version": 2,
+                          "fulltext": self.fulltext is not None,
+                          "merkle_root": self.merkle.root(),
+                          "auto_snapshot": self.auto_snapshot,
+                          "shards": self.shards,
+                          "old_shards": self.old_shards,
+                          "pages": self._pages,
+                          "snapshots": self.snapshots}).encode()
+        nonce = os.urandom(NONCE_SIZE)
+        sealed = nonce + self._index_aead.encrypt(nonce, raw, b"index")
+        with self._file_lock.exclusive():
+            if not self._lease.check():
+                raise RuntimeError("写入租约已失效，空间可能已被其他程序修改，本次提交已取消")
+            with AtomicWriter(self.path / INDEX_FILE) as f:
+                f.write(sealed)
+
+    def _begin_write(self) -> None:
+        """
+        修改空间前取得写入租约，取得时先载入其他实例已提交的变化，租约被占用时抛出 RuntimeError
+        """
+        if self._lease.held:
+            return
+        with self._lock:
+            if self._lease.held:
+                return
+            holder = self._lease.acquire()
+            if holder is not None:
+                raise RuntimeError(f'空间正被其他程序（{holder["host"]}上的进程{holder["pid"]}）修改，当前只能查看')
+            self.refresh()
+
+    def refresh(self) -> bool:
+        """
+        载入其他实例提交的变化，只读取块名发生变化的索引页，本实例未提交的分组保持不变
+
+        Returns:
+            是否有变化
+        """
+        if not (self.path / INDEX_FILE).is_file():
+            return False
+        index = self._read_index()
+        if "pages" not in index:
+            return False
+        with self._lock:
+            if index.get("shards", []) != self.shards or index.get("old_shards") != self.old_shards:
+                self._load_shards(index)
+            groups = [group for group in range(FANOUT)
+                      if index["pages"][group] != self._pages[group] and group not in self._dirty_pages]
+        pages = {group: json.loads(self.store.get(index["pages"][group])) if index["pages"][group] else {}
+                 for group in groups}
+        with self._lock:
+            for group, page in pages.items():
+                for name in self.merkle.names_in(group):
+                    del self.entries[name]
+                    self.name_index.remove(name)
+                    self.merkle.remove(name)
+                for name, entry in page.items():
+                    self.entries[name] = entry
+                    self.name_index.add(name)
+                    self.merkle.set(name, entry["digest"])
+                self._pages[group] = index["pages"][group]
+            if not self._dirty_pages and "merkle_root" in index and self.merkle.root() != index["merkle_root"]:
+                raise ValueError("空间索引与 Merkle 根不一致")
+            changed = bool(groups) or self.snapshots != index.get("snapshots", []) \
+                or self.auto_snapshot != index.get("auto_snapshot", False)
+            self.snapshots = index.get("snapshots", [])
+            self.auto_snapshot = index.get("auto_snapshot", False)
+            # 倒排索引的桶在内存中有缓存，其他实例修改过条目后重新打开
+            if not self._dirty_pages and (groups or index.get("fulltext") != (self.fulltext is not None)):
+                self.fulltext = self._fulltext_index() if index.get("fulltext") else None
+                changed = True
+            return changed
+
+    def watch(self, on_change: Callable[[], None]) -> None:
+        """
+        监视其他实例的提交，发生变化时增量载入并调用回调，回调在监视线程中执行
+        本实例持有写入租约时其他实例无法提交，变化只可能来自自己，不做处理
+        """
+        def changed():
+            if self._lease.held:
+                return
+            try:
+                if self.refresh():
+                    on_change()
+            except Exception as e:
+                print(e)
+        if self._watcher is not None:
+            self._watcher.stop()
+        self._watcher = FileWatcher(self.path / INDEX_FILE, changed)
+        self._watcher.start()
+
+    def close(self) -> None:
+        """
+        停止监视并释放写入租约，未提交的修改会丢失
+        """
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+        self._lease.release()
+
+    def _shard_roots(self, shards: list[str]) -> list[Path]:
+        return [self.path / CHUNK_DIR] + [Path(shard) for shard in shards]
+
+    def _load_shards(self, index: dict) -> None:
+        self.shards = index.get("shards", [])
+        self.old_shards = index.get("old_shards")
+        self.store.roots = self._shard_roots(self.shards)
+        # 迁移未完成时块可能在新旧任一分片目录中
+        self.store.fallback_roots = [] if self.old_shards is None else \
+            list(dict.fromkeys(self._shard_roots(self.old_shards) + self.store.roots))
+
+    def set_shards(self, shards: list[str], workers: int = IO_WORKERS) -> int:
+        """
+        更换额外的分片目录并迁移块，迁移期间不应有其他读写
+
+        迁移前先在根索引中记录新旧分片目录，中途崩溃或出错（如磁盘已满）后仍能在所有目录中找到块，
+        以相同参数再次调用即可继续迁移；迁移完成后才清除旧分片目录的记录。
+
+        Args:
+            shards: 除空间目录下 chunks 以外的分片目录
+            workers: 并行迁移的线程数
+
+        Returns:
+            迁移的块数
+        """
+        self._begin_write()
+        with self._lock:
+            if self.fulltext is not None:
+                self.fulltext.flush()
+            self._write_pages()
+            # 上次迁移未完成时，新旧分片目录中都可能有块
+            self.old_shards = list(dict.fromkeys((self.old_shards or []) + self.shards))
+            self.shards = [str(Path(shard)) for shard in shards]
+            self.store.fallback_roots = self.store.all_roots()
+            self.store.roots = self._shard_roots(self.shards)
+            self._write_root()
+            moved = self.store.reshard(self.store.roots, workers)
+            self.old_shards = None
+            self._write_root()
+            return moved
+
+    def _take_snapshot(self, label: str) -> dict:
+        root = {"pages": self._pages, "merkle_root": self.merkle.root()}
+        root_id, _, _ = self.store.put(json.dumps(root).encode())
+        # 自动快照与上一个快照内容相同时不重复创建
+        if label == AUTO_SNAPSHOT_LABEL and self.snapshots and self.snapshots[-1]["root"] == root_id:
+            return self.snapshots[-1]
+        snap = {"id": max((s["id"] for s in self.snapshots), default=0) + 1,
+                "root": root_id,
+                "time": time.time(),
+                "label": label}
+        self.snapshots.append(snap)
+        autos = [s for s in self.snapshots if s["label"] == AUTO_SNAPSHOT_LABEL]
+        for old in autos[:-MAX_AUTO_SNAPSHOTS]:
+            self.snapshots.remove(old)
+        return snap
+
+    def commit(self) -> None:
+        """
+        写入变化的索引页，加密根索引并原子地写回磁盘，开启自动快照时同时创建快照
+        """
+        self._begin_write()
+        with self._lock:
+            if self.fulltext is not None:
+                self.fulltext.flush()
+            self._write_pages()
+            if self.auto_snapshot:
+                self._take_snapshot(AUTO_SNAPSHOT_LABEL)
+            self._write_root()
+
+    def snapshot(self, label: str = "") -> dict:
+        """
+        提交当前状态并创建快照，开销只与上次提交后的变化量有关
+
+        Args:
+            label: 快照说明
+
+        Returns:
+            快照记录
+        """
+        self._begin_write()
+        with self._lock:
+            if self.fulltext is not None:
+                self.fulltext.flush()
+            self._write_pages()
+            snap = self._take_snapshot(label)
+            self._write_root()
+            return snap
+
+    def _snapshot_root(self, snap_id: int) -> dict:
+        for snap in self.snapshots:
+            if snap["id"] == snap_id:
+                return json.loads(self.store.get(snap["root"]))
+        raise KeyError(f"不存在快照{snap_id}")
+
+    def snapshot_entries(self, snap_id: int) -> dict[str, dict]:
+        """
+        读取快照中的所有条目
+        """
+        return self._load_pages(self._snapshot_root(snap_id)["pages"])
+
+    def _reindex_text(self, name: str) -> None:
+        entry = self.entries[name]
+        entry.pop("fulltext", None)
+        if self.fulltext is not None and entry.get("kind") == "text":
+            entry["fulltext"] = self.fulltext.update(name, self.read(name).decode("utf-8"))
+
+    def restore_entry(self, snap_id: int, name: str, as_name: str | None = None) -> None:
+        """
+        从快照中恢复单个条目，只复制条目记录，数据块与快照共享，需要随后 commit
+
+        Args:
+            snap_id: 快照编号
+            name: 快照中的条目名
+            as_name: 恢复为的条目名，默认为原名
+        """
+        self._begin_write()
+        entry = dict(self.snapshot_entries(snap_id)[name])
+        target = as_name or name
+        if target != name:
+            entry["digest"] = self._digest_of(target, entry)
+        with self._lock:
+            old = self.entries.get(target)
+            if old and "fulltext" in old and self.fulltext is not None:
+                self.fulltext.remove(target, old["fulltext"])
+            self.entries[target] = entry
+            self.name_index.add(target)
+            self.merkle.set(target, entry["digest"])
+            self._dirty_pages.add(group_of(target))
+            self._reindex_text(target)
+
+    def restore_snapshot(self, snap_id: int) -> None:
+        """
+        将整个空间回滚到快照，之后的快照仍然保留，需要随后 commit
+        """
+        self._begin_write()
+        root = self._snapshot_root(snap_id)
+        entries = self._load_pages(root["pages"])
+        with self._lock:
+            self.entries = entries
+            self.merkle = MerkleTree({name: entry["digest"] for name, entry in entries.items()})
+            self.name_index = NameIndex(entries)
+            self._pages = list(root["pages"])
+            self._dirty_pages = set()
+            if self.fulltext is not None:
+                # 倒排索引不随快照保存，回滚后为文本条目重建
+                self.fulltext.clear()
+                for name in entries:
+                    if entries[name].get("kind") == "text":
+                        self._reindex_text(name)
+                        self._dirty_pages.add(group_of(name))
+
+    def delete_snapshot(self, snap_id: int) -> None:
+        """
+        删除快照，只被该快照引用的块需 collect_garbage 后才会被删除，需要随后 commit
+        """
+        self._begin_write()
+        with self._lock:
+            self.snapshots = [snap for snap in self.snapshots if snap["id"] != snap_id]
+
+    def names(self) -> list[str]:
+        with self._lock:
+            return list(self.entries)
+
+    def chunk_lists(self) -> dict[str, list[str]]:
+        """
+        获取所有条目的块列表副本
+        """
+        with self._lock:
+            return {name: list(entry["chunks"]) for name, entry in self.entries.items()}
+
+    def add_stream(self, name: str, stream: BinaryIO, mtime: float | None = None,
+                   pool: ThreadPoolExecutor | None = None) -> int:
+        """
+        以流的方式存入条目，同名条目会被替换
+
+        Args:
+            name: 条目名，使用"/"分隔的相对路径
+            stream: 以二进制模式打开的可读对象
+            mtime: 修改时间，默认为当前时间
+            pool: 加密、写入块使用的线程池，默认临时创建；批量导入时可共用一个
+
+        Returns:
+            实际新写入的明文字节数，已存在的块不计入
+        """
+        self._begin_write()
+        with self._lock:
+            self._streams += 1
+        try:
+            return self._add_stream(name, stream, mtime, pool)
+        finally:
+            with self._lock:
+                self._streams -= 1
+                self._idle.notify_all()
+
+    def _add_stream(self, name: str, stream: BinaryIO, mtime: float | None,
+                    pool: ThreadPoolExecutor | None) -> int:
+        chunks = []
+        leaves = []
+        size = 0
+        written = 0
+
+        def collect(length, future):
+            nonlocal size, written
+            chunk_id, new, tag = future.result()
+            chunks.append(chunk_id)
+            leaves.append(chunk_leaf(chunk_id, tag))
+            size += length
+            if new:
+                written += length
+
+        # 分块在当前线程进行，加密与写入交给线程池，已提交未完成的块数有上限以限制内存
+        pending = deque()
+        own_pool = pool is None
+        if own_pool:
+            pool = ThreadPoolExecutor(max_workers=IO_WORKERS)
+        try:
+            for data in iter_chunks(stream):
+                pending.append((len(data), pool.submit(self.store.put, data)))
+                if len(pending) >= IO_WINDOW:
+                    collect(*pending.popleft())
+            while pending:
+                collect(*pending.popleft())
+        finally:
+            if own_pool:
+                pool.shutdown()
+        digest = entry_digest(name, size, leaves)
+        with self._lock:
+            old = self.entries.get(name)
+            self.entries[name] = {"chunks": chunks,
+                                  "size": size,
+                                  "mtime": time.time() if mtime is None else mtime,
+                                  "digest": digest}
+            self.name_index.add(name)
+            self.merkle.set(name, digest)
+            self._dirty_pages.add(group_of(name))
+            if old and "fulltext" in old and self.fulltext is not None:
+                self.fulltext.remove(name, old["fulltext"])
+        return written
+
+    def add_file(self, path: str | Path, name: str | None = None,
+                 pool: ThreadPoolExecutor | None = None) -> int:
+        """
+        存入磁盘上的文件，参见 add_stream
+        """
+        path = Path(path)
+        with open(path, "rb") as f:
+            return self.add_stream(name or path.name, f, path.stat().st_mtime, pool)
+
+    def add_bytes(self, name: str, data: bytes) -> int:
+        """
+        存入内存中的数据，参见 add_stream
+        """
+        return self.add_stream(name, BytesIO(data))
+
+    def add_text(self, name: str, text: str) -> int:
+        """
+        存入文本条目，启用了全文索引时同时增量更新索引，参见 add_stream
+        """
+        written = self.add_bytes(name, text.encode("utf-8"))
+        with self._lock:
+            entry = self.entries[name]
+            entry["kind"] = "text"
+            if self.fulltext is not None:
+                entry["fulltext"] = self.fulltext.update(name, text)
+        return written
+
+    def _fulltext_index(self) -> FullTextIndex:
+        return FullTextIndex(self.path / FULLTEXT_DIR, _subkey(self._master_key, b"fulltext"))
+
+    def enable_fulltext(self) -> None:
+        """
+        启用全文索引，并为已有的文本条目建立索引，需要随后 commit
+        """
+        if self.fulltext is not None:
+            return
+        self._begin_write()
+        fulltext = self._fulltext_index()
+        with self._lock:
+            names = [name for name, entry in self.entries.items() if entry.get("kind") == "text"]
+        for name in names:
+            text = self.read(name).decode("utf-8")
+            with self._lock:
+                self.entries[name]["fulltext"] = fulltext.update(name, text)
+                self._dirty_pages.add(group_of(name))
+        with self._lock:
+            self.fulltext = fulltext
+
+    def search_text(self, query: str) -> list[str]:
+        """
+        在文本条目中全文搜索，只解密索引中相关的桶而不解密条目本身
+
+        Args:
+            query: 查询文本
+
+        Returns:
+            包含全部检索词的条目名列表，未启用全文索引时为空
+        """
+        if self.fulltext is None:
+            return []
+        return sorted(self.fulltext.search(query))
+
+    def iter_read(self, name: str, pool: ThreadPoolExecutor | None = None) -> Iterator[bytes]:
+        """
+        逐块读取并解密条目
+
+        Args:
+            name: 条目名
+            pool: 读取、解密块使用的线程池，默认临时创建；批量导出时可共用一个
+
+        Returns:
+            明文数据块的迭代器
+        """
+        with self._lock:
+            chunks = list(self.entries[name]["chunks"])
+        # 并行预读后续的块，按顺序产出
+        own_pool = pool is None
+        if own_pool:
+            pool = ThreadPoolExecutor(max_workers=IO_WORKERS)
+        pending = deque()
+        try:
+            remaining = iter(chunks)
+            pending.extend(pool.submit(self.store.get, chunk_id)
+                           for chunk_id in itertools.islice(remaining, IO_WINDOW))
+            while pending:
+                data = pending.popleft().result()
+                chunk_id = next(remaining, None)
+                if chunk_id is not None:
+                    pending.append(pool.submit(self.store.get, chunk_id))
+                yield data
+        finally:
+            for future in pending:
+                future.cancel()
+            if own_pool:
+                pool.shutdown(wait=False)
+
+    def read(self, name: str) -> bytes:
+        return b"".join(self.iter_read(name))
+
+    def remove(self, name: str) -> None:
+        self._begin_write()
+        with self._lock:
+            entry = self.entries.pop(name)
+            self.name_index.remove(name)
+            self.merkle.remove(name)
+            self._dirty_pages.add(group_of(name))
+            if "fulltext" in entry and self.fulltext is not None:
+                self.fulltext.remove(name, entry["fulltext"])
+
+    def _digest_of(self, name: str, entry: dict) -> str:
+        leaves = [chunk_leaf(chunk_id, self.store.tag(chunk_id)) for chunk_id in entry["chunks"]]
+        return entry_digest(name, entry["size"], leaves)
+
+    def verify_entry(self, name: str) -> bool:
+        """
+        只读取条目各块的认证标签，与 Merkle 树中的条目哈希对照，不解密条目内容
+        可发现缺失、被替换或被回滚的块；块内容的位翻转需要完整校验才能发现
+
+        Args:
+            name: 条目名
+
+        Returns:
+            是否一致
+        """
+        with self._lock:
+            entry = dict(self.entries[name])
+        try:
+            digest = self._digest_of(name, entry)
+        except OSError:
+            return False
+        return digest == self.merkle.get(name)
+
+    def collect_garbage(self) -> int:
+        """
+        删除不再被任何条目、索引页或快照引用的块
+
+        未提交的修改不影响已提交索引与快照引用的块；整个过程持有锁，并等待正在写入的 add_stream 完成，
+        期间新的写入会等待，所以已写入但尚未记入条目的块不会被删除
+
+        Returns:
+            删除的块数
+        """
+        self._begin_write()
+        with self._lock:
+            while self._streams:
+                self._idle.wait()
+            used = {c for entry in self.entries.values() for c in entry["chunks"]}
+            # 已提交的根索引与各快照引用的每一页都要读出，页内条目可能已在内存中被删除或替换
+            committed = self._read_index()
+            for entry in committed.get("entries", {}).values():
+                used.update(entry["chunks"])
+            roots = [{"pages": self._pages}, {"pages": committed.get("pages", [])}]
+            for snap in self.snapshots:
+                used.add(snap["root"])
+                roots.append(json.loads(self.store.get(snap["root"])))
+            read = set()
+            for root in roots:
+                for page_id in root["pages"]:
+                    if page_id and page_id not in read:
+                        read.add(page_id)
+                        for entry in json.loads(self.store.get(page_id)).values():
+                            used.update(entry["chunks"])
+            used.update(read)
+            count = 0
+            for chunk_id in list(self.store.iter_ids()):
+                if chunk_id not in used:
+                    self.store.delete(chunk_id)
+                    count += 1
+        return count
@@ -0,0 +1,223 @@
+import hmac
+import hashlib
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from atomic_file import SyncBatch, fsync_dir
+
+
+NONCE_SIZE: int = 12
+TAG_SIZE: int = 16
+# 写入块时按块名分段加锁的锁数
+PUT_LOCKS: int = 64
+
+
+class ChunkStore:
+    """
+    内容寻址的加密块仓库
+
+    块以带密钥的哈希（HMAC-SHA256）命名，相同内容只存储、加密一次，
+    且不知道空间密钥就无法从块名推测出内容。
+
+    仓库可由多个分片目录组成（例如分别位于不同磁盘），块按块名首字节分配到分片，
+    每个块是一个独立文件，所以多个线程的读写可以同时落在不同磁盘、不同队列上，
+    也不会产生难以增量备份的超大单文件。
+    """
+
+    def __init__(self, roots: Path | list[Path], enc_key: bytes, mac_key: bytes):
+        """
+        初始化块仓库
+
+        Args:
+            roots: 存放块文件的目录，或多个分片目录
+            enc_key: 加密块内容的密钥
+            mac_key: 计算块名的密钥
+        """
+        self.roots: list[Path] = [Path(root) for root in roots] if isinstance(roots, list) else [Path(roots)]
+        # 迁移分片未完成时的旧分片目录，块不在应在的分片中时到这些目录中查找
+        self.fallback_roots: list[Path] = []
+        self._aead: AESGCM = AESGCM(enc_key)
+        self._mac_key: bytes = mac_key
+        # 同一块名的检查与写入在同一把锁下进行，并发写入相同的块时只有一个线程真正写入
+        self._put_locks: list[threading.Lock] = [threading.Lock() for _ in range(PUT_LOCKS)]
+        # 上次 sync 后新写入、尚未落盘的块文件
+        self._unsynced: SyncBatch = SyncBatch()
+
+    def shard_of(self, chunk_id: str, count: int | None = None) -> int:
+        """
+        块所在的分片序号
+
+        Args:
+            chunk_id: 块名
+            count: 分片数，默认为当前分片数
+        """
+        return int(chunk_id[:2], 16) % (count or len(self.roots))
+
+    def chunk_id(self, data: bytes) -> str:
+        """
+        计算数据块的名称
+
+        Args:
+            data: 明文数据块
+
+        Returns:
+            十六进制块名
+        """
+        return hmac.new(self._mac_key, data, hashlib.sha256).hexdigest()
+
+    def all_roots(self) -> list[Path]:
+        """
+        当前分片目录与迁移未完成时的旧分片目录，不重复
+        """
+        return list(dict.fromkeys(self.roots + self.fallback_roots))
+
+    def path_of(self, chunk_id: str) -> Path:
+        """
+        获取块文件路径，按前两位分目录以避免单个目录下文件过多
+        迁移分片未完成时，块不在应在的分片中则依次到所有分片目录中查找
+        """
+        path = self.roots[self.shard_of(chunk_id)] / chunk_id[:2] / chunk_id
+        if self.fallback_roots and not path.is_file():
+            for root in self.all_roots():
+                candidate = root / chunk_id[:2] / chunk_id
+                if candidate.is_file():
+                    return candidate
+        return path
+
+    def has(self, chunk_id: str) -> bool:
+        return self.path_of(chunk_id).is_file()
+
+    def put(self, data: bytes) -> tuple[str, bool, bytes]:
+        """
+        存入数据块，已存在时跳过加密和写入
+
+        Args:
+            data: 明文数据块
+
+        Returns:
+            (块名, 是否实际写入了新块, 块的认证标签)
+        """
+        chunk_id = self.chunk_id(data)
+        # 每次加密的随机数不同，同一块被两个线程各写一次时先返回的认证标签会与磁盘上的不符
+        with self._put_locks[int(chunk_id[:4], 16) % PUT_LOCKS]:
+            path = self.path_of(chunk_id)
+            if path.is_file():
+                return chunk_id, False, self.tag(chunk_id)
+            nonce = os.urandom(NONCE_SIZE)
+            sealed = nonce + self._aead.encrypt(nonce, data, chunk_id.encode())
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # 先写临时文件再替换，保证块文件要么完整要么不存在
+            tmp = path.with_name(f"{chunk_id}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, "wb") as f:
+                f.write(sealed)
+            os.replace(tmp, path)
+            self._unsynced.add(path)
+            return chunk_id, True, sealed[-TAG_SIZE:]
+
+    def sync(self) -> None:
+        """
+        落盘上次调用后新写入的块文件及其所在目录
+
+        块写入时不逐个落盘，多个块一起落盘时系统可以合并写回；
+        写入引用这些块的根索引前必须调用，否则断电后根索引可能指向空的或不存在的块文件。
+        """
+        self._unsynced.sync()
+
+    def tag(self, chunk_id: str) -> bytes:
+        """
+        只读取块文件末尾的 GCM 认证标签，不解密块内容
+        """
+        with open(self.path_of(chunk_id), "rb") as f:
+            f.seek(-TAG_SIZE, os.SEEK_END)
+            return f.read(TAG_SIZE)
+
+    def get(self, chunk_id: str) -> bytes:
+        """
+        读取并解密数据块，内容被篡改或损坏时抛出 cryptography.exceptions.InvalidTag
+
+        Args:
+            chunk_id: 块名
+
+        Returns:
+            明文数据块
+        """
+        with open(self.path_of(chunk_id), "rb") as f:
+            sealed = f.read()
+        return self._aead.decrypt(sealed[:NONCE_SIZE], sealed[NONCE_SIZE:], chunk_id.encode())
+
+    def delete(self, chunk_id: str) -> None:
+        # 迁移中途崩溃时同一块可能在新旧分片中各有一份
+        roots = self.all_roots() if self.fallback_roots else [self.roots[self.shard_of(chunk_id)]]
+        for root in roots:
+            try:
+                os.remove(root / chunk_id[:2] / chunk_id)
+            except FileNotFoundError:
+                pass
+
+    def iter_ids(self):
+        """
+        遍历仓库所有分片（包括迁移未完成时的旧分片）中的块名，不重复
+        """
+        seen = set()
+        for root in self.all_roots():
+            if not root.is_dir():
+                continue
+            for sub in root.iterdir():
+                if sub.is_dir():
+                    for path in sub.iterdir():
+                        if not path.name.endswith(".tmp") and path.name not in seen:
+                            seen.add(path.name)
+                            yield path.name
+
+    def reshard(self, roots: list[Path], workers: int = 4) -> int:
+        """
+        更换分片目录，并行地把不在正确分片中的块移动过去
+
+        调用前应先持久化记录新旧分片目录（见 SecretSpace.set_shards），迁移期间及中途失败后
+        新旧目录都在 fallback_roots 中，块在任何一个目录里都能找到；再次调用即可继续迁移。
+
+        Args:
+            roots: 新的分片目录列表
+            workers: 并行移动的线程数
+
+        Returns:
+            移动的块数
+        """
+        new_roots = [Path(root) for root in roots]
+        old_roots = list(dict.fromkeys(self.all_roots() + new_roots))
+        self.fallback_roots = old_roots
+        self.roots = new_roots
+
+        def move(item):
+            root, chunk_id = item
+            target = new_roots[self.shard_of(chunk_id, len(new_roots))] / chunk_id[:2] / chunk_id
+            source = root / chunk_id[:2] / chunk_id
+            if target == source:
+                return 0
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if target.is_file():
+                # 上次迁移复制完成后、删除源文件前中断
+                os.remove(source)
+                return 1
+            # 跨磁盘时 os.replace 不可用，先复制到临时文件再替换
+            tmp = target.with_name(f"{chunk_id}.{os.getpid()}.{threading.get_ident()}.tmp")
+            shutil.copyfile(source, tmp)
+            # 随后删除源文件，副本必须先落盘
+            with open(tmp, "rb") as f:
+                os.fsync(f.fileno())
+            os.replace(tmp, target)
+            fsync_dir(target.parent)
+            os.remove(source)
+            return 1
+
+        items = [(root, path.name)
+                 for root in old_roots if root.is_dir()
+                 for sub in root.iterdir() if sub.is_dir()
+                 for path in sub.iterdir() if not path.name.endswith(".tmp")]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            moved = sum(pool.map(move, items))
+        self.fallback_roots = []
+        return moved
@@ -0,0 +1,112 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+from pathlib import Path
+from typing import Callable
+
+
+# inotify 事件：写入后关闭、移入（原子替换）
+IN_CLOSE_WRITE: int = 0x00000008
+IN_MOVED_TO: int = 0x00000080
+_EVENT = struct.Struct("iIII")
+
+# 无法使用 inotify 时轮询文件状态的间隔
+POLL_INTERVAL: float = 1.0
+
+
+def _inotify_fd(directory: Path) -> int | None:
+    """
+    为目录创建 inotify 监听，不支持时返回 None
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return None
+        if libc.inotify_add_watch(fd, str(directory).encode(), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+
+def _stamp(path: Path) -> tuple | None:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class FileWatcher:
+    """
+    监视单个文件的变化，Linux 上使用 inotify 监听所在目录，其他平台轮询文件状态
+
+    文件被原子替换或写入后调用回调，同一批事件只调用一次。回调在监视线程中执行。
+    """
+
+    def __init__(self, path: str | Path, on_change: Callable[[], None]):
+        """
+        Args:
+            path: 要监视的文件
+            on_change: 文件变化时的回调
+        """
+        self.path: Path = Path(path)
+        self.on_change: Callable[[], None] = on_change
+        self._stop: threading.Event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        # 每次启动使用新的停止事件，已停止的旧线程不会被重新唤起
+        self._stop = threading.Event()
+        # 在当前线程中开始监听，start 返回后发生的变化都不会遗漏
+        fd = _inotify_fd(self.path.parent)
+        self._thread = threading.Thread(target=self._run, args=(fd, _stamp(self.path), self._stop), daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread = None
+
+    def _run(self, fd: int | None, stamp: tuple | None, stop: threading.Event) -> None:
+        if fd is None:
+            self._poll(stamp, stop)
+            return
+        try:
+            name = self.path.name.encode()
+            while not stop.is_set():
+                readable, _, _ = select.select([fd], [], [], POLL_INTERVAL)
+                if not readable:
+                    continue
+                changed = False
+                try:
+                    buffer = os.read(fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                offset = 0
+                while offset < len(buffer):
+                    _, _, _, length = _EVENT.unpack_from(buffer, offset)
+                    offset += _EVENT.size
+                    if buffer[offset:offset + length].rstrip(b"\0") == name:
+                        changed = True
+                    offset += length
+                if changed and not stop.is_set():
+                    self.on_change()
+        finally:
+            os.close(fd)
+
+    def _poll(self, last: tuple | None, stop: threading.Event) -> None:
+        while not stop.wait(POLL_INTERVAL):
+            stamp = _stamp(self.path)
+            if stamp != last:
+                last = stamp
+                self.on_change()
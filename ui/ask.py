@@ -108,4 +108,80 @@ def ask_password(title: str = "输入密码", message: str = "请输入密码：
     key_entry.focus()
 
     root.wait_window(top)
-    return result
\ No newline at end of file
+    return result
+
+
+
+def ask_conflicts(title: str, message: str, paths: list[str], choices: list[str]) -> dict[str, str] | None:
+    """
+    弹出一次性处理多个冲突的窗口，可以逐个或对全部路径选择处理方式。
+    返回 {路径: 所选方式}，默认均为 choices[0]；若取消则返回 None。
+    """
+    top = tk.Toplevel(root)
+    top.title(title)
+    top.transient(root)
+    top.grab_set()
+    top.withdraw()
+
+    ttk.Label(top, text=message, padding=12).pack()
+
+    actions = {path: choices[0] for path in paths}
+
+    list_frame = ttk.Frame(top)
+    list_frame.pack(fill="both", expand=True, padx=12)
+    tree = ttk.Treeview(list_frame, columns=("path", "action"), show="headings", height=12)
+    tree.heading("path", text="路径")
+    tree.heading("action", text="处理方式")
+    tree.column("path", width=480)
+    tree.column("action", width=100, anchor="center")
+    scroll = ttk.Scrollbar(list_frame, orient="vertical", command=tree.yview)
+    tree.configure(yscrollcommand=scroll.set)
+    scroll.pack(side="right", fill="y")
+    tree.pack(side="left", fill="both", expand=True)
+    for index, path in enumerate(paths):
+        tree.insert("", "end", iid=str(index), values=(path, actions[path]))
+
+    def apply(choice: str, selected_only: bool):
+        indexes = tree.selection() if selected_only else tree.get_children()
+        for iid in indexes:
+            path = paths[int(iid)]
+            actions[path] = choice
+            tree.set(iid, "action", choice)
+
+    choice_frame = ttk.Frame(top)
+    choice_frame.pack(pady=(8, 0))
+    ttk.Label(choice_frame, text="所选项：").grid(row=0, column=0, sticky="e")
+    ttk.Label(choice_frame, text="全部：").grid(row=1, column=0, sticky="e")
+    for column, choice in enumerate(choices, start=1):
+        ttk.Button(choice_frame, text=choice, command=lambda c=choice: apply(c, True)).grid(row=0, column=column, padx=3, pady=2)
+        ttk.Button(choice_frame, text=choice, command=lambda c=choice: apply(c, False)).grid(row=1, column=column, padx=3, pady=2)
+
+    result = None
+
+    def on_ok():
+        nonlocal result
+        result = dict(actions)
+        top.destroy()
+
+    def on_cancel():
+        top.destroy()
+
+    btn_frame = ttk.Frame(top)
+    btn_frame.pack(pady=8)
+    ttk.Button(btn_frame, text="确定", command=on_ok).pack(side="left", padx=6)
+    ttk.Button(btn_frame, text="取消", command=on_cancel).pack(side="left", padx=6)
+
+    top.update_idletasks()
+    w = top.winfo_width()
+    h = top.winfo_height()
+    parent_x = root.winfo_rootx()
+    parent_y = root.winfo_rooty()
+    parent_w = root.winfo_width()
+    parent_h = root.winfo_height()
+    x = parent_x + (parent_w - w) // 2
+    y = parent_y + (parent_h - h) // 2
+    top.geometry(f"+{x}+{y}")
+    top.deiconify()
+
+    root.wait_window(top)
+    return result
@@ -2,6 +2,8 @@ import tkinter as tk
 from tkinter import ttk, filedialog
 from ui.notebook import remove_tab
 from ui.frames.frame_type import FrameType
+from ui.frames.speculative_key import bind_speculative_key
+from encrip import KeyCache
 
 
 
@@ -23,7 +25,7 @@ def build_any_file_frame(parent: tk.Widget) -> None:
 
     # 提示标签
     tip = tk.Label(parent,
-                   text="选择要加密的文件，支持拖拽。",
+                   text="选择要加密的文件或文件夹，支持拖拽。",
                    font=(None, 12),
                    fg="#555555",
                    bg="#d9d9d9")
@@ -172,12 +174,26 @@ def build_any_file_frame(parent: tk.Widget) -> None:
         """添加一个新的空文件项"""
         _add_file()
     
-    # 按钮区域 - 只保留添加按钮
+    # 按钮区域 - 添加文件与添加文件夹
     btn_frame = ttk.Frame(parent)
     btn_frame.place(anchor="center", relx=0.5, rely=0.85)
     
     add_btn = ttk.Button(btn_frame, text="添加文件", command=add_new_file)
     add_btn.pack(side=tk.LEFT)
+
+    def add_folder():
+        """添加一个文件夹，保存时保留其目录结构"""
+        dir_path = filedialog.askdirectory()
+        if not dir_path:
+            return
+        if len(entry_vars) == 1 and not entry_vars[0].get():
+            entry_vars[0].set(dir_path)
+        else:
+            _add_file(dir_path)
+        _refresh_canvas()
+
+    add_folder_btn = ttk.Button(btn_frame, text="添加文件夹", command=add_folder)
+    add_folder_btn.pack(side=tk.LEFT, padx=(4, 0))
     
     # 密钥输入区域（同一行，与列表框宽度对齐）
     key_frame = ttk.Frame(parent)
@@ -218,12 +234,16 @@ def build_any_file_frame(parent: tk.Widget) -> None:
             self.close_btn = close_btn
             # 类型
             self.type = FrameType.ENC_ANY
+            # 密钥派生缓存，同一批文件共用一次派生
+            self.key_cache = KeyCache()
         
         def add_file(self, path: str = ""):
             """添加一个文件项"""
             return _add_file(path)
     
     parent.notebook = NoteBook()
+    # 密码输入完毕后在后台预先派生密钥
+    bind_speculative_key(parent, key_var, confirm_key_var, lambda: parent.notebook.key_cache)
     
     # 为容器绑定滚轮事件
     parent.bind("<MouseWheel>", _on_mouse_wheel)
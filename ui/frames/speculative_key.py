@@ -0,0 +1,40 @@
+import tkinter as tk
+from typing import Callable
+from encrip import KeyCache
+
+
+# 两个密码框停止输入多久后开始预先派生（毫秒）
+IDLE_MS: int = 600
+
+
+def bind_speculative_key(widget: tk.Widget,
+                         key_var: tk.StringVar,
+                         confirm_key_var: tk.StringVar,
+                         get_cache: Callable[[], KeyCache]) -> None:
+    """
+    两个密码框内容一致且停止输入片刻后，在后台预先派生之后保存时使用的密钥
+    密码再次改变时，未被使用的派生结果会被丢弃，见 KeyCache.prepare
+
+    Args:
+        widget: 用于定时的组件
+        key_var: 密码变量
+        confirm_key_var: 确认密码变量
+        get_cache: 获取标签页当前的派生缓存
+    """
+    pending = None
+
+    def start():
+        nonlocal pending
+        pending = None
+        key = key_var.get()
+        if key and key == confirm_key_var.get():
+            get_cache().prepare(key)
+
+    def schedule(*_args):
+        nonlocal pending
+        if pending is not None:
+            widget.after_cancel(pending)
+        pending = widget.after(IDLE_MS, start)
+
+    key_var.trace_add("write", schedule)
+    confirm_key_var.trace_add("write", schedule)
@@ -2,6 +2,8 @@ import tkinter as tk
 from tkinter import ttk
 from ui.notebook import remove_tab, mark_tab_modified
 from ui.frames.frame_type import FrameType
+from encrip import KeyCache
+from ui.frames.speculative_key import bind_speculative_key
 
 
 
@@ -129,6 +131,10 @@ def build_text_frame(parent: tk.Widget) -> None:
             self.confirm_key_label = confirm_key_label
             # 类型
             self.type = FrameType.TEXT
+            # 对应的秘密空间条目名，不是从空间打开时为 None
+            self.space_entry = None
+            # 打开、保存时的密钥派生缓存，密码不变时重复保存不再派生密钥
+            self.key_cache = KeyCache()
             # 标志位：控制是否应该触发修改标记
             self.setting_value = False
         
@@ -151,3 +157,5 @@ def build_text_frame(parent: tk.Widget) -> None:
                 self.setting_value = False
     
     parent.notebook = NoteBook()
+    # 密码输入完毕后在后台预先派生密钥
+    bind_speculative_key(parent, key_var, confirm_key_var, lambda: parent.notebook.key_cache)
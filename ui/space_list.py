@@ -0,0 +1,101 @@
+import tkinter as tk
+from tkinter import ttk
+from ui import root, sidebar
+
+
+# 列表中最多显示的条目数，避免一次插入过多行导致界面卡顿
+MAX_SHOWN = 1000
+
+
+class SpaceListFunc:
+    def __init__(self) -> None:
+        self.open_entry = lambda name:None
+        self.enable_fulltext = lambda:None
+space_list_function = SpaceListFunc()
+
+
+title_label = ttk.Label(sidebar, text="未打开秘密空间", padding=(6, 6, 6, 2))
+title_label.pack(side=tk.TOP, fill=tk.X)
+
+# 搜索框：输入子串进行模糊搜索，以 ^ 开头时按前缀搜索
+search_var = tk.StringVar()
+search_entry = ttk.Entry(sidebar, textvariable=search_var)
+search_entry.pack(side=tk.TOP, fill=tk.X, padx=6, pady=(0, 4))
+
+# 勾选后在文本条目的内容中搜索（需要空间启用全文索引）
+content_var = tk.BooleanVar(value=False)
+content_check = ttk.Checkbutton(sidebar, text="搜索文本内容", variable=content_var)
+content_check.pack(side=tk.TOP, anchor="w", padx=6, pady=(0, 4))
+
+count_label = ttk.Label(sidebar, text="", padding=(6, 0, 6, 4))
+count_label.pack(side=tk.BOTTOM, fill=tk.X)
+
+list_frame = ttk.Frame(sidebar)
+list_frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True, padx=6)
+list_scroll = ttk.Scrollbar(list_frame)
+list_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+listbox = tk.Listbox(list_frame, yscrollcommand=list_scroll.set, activestyle="none")
+listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+list_scroll.config(command=listbox.yview)
+
+_space = None
+
+
+def _refresh() -> None:
+    listbox.delete(0, tk.END)
+    if _space is None:
+        title_label.config(text="未打开秘密空间")
+        count_label.config(text="")
+        return
+    title_label.config(text=_space.path.name)
+    query = search_var.get()
+    if content_var.get():
+        if _space.fulltext is None:
+            count_label.config(text="该空间未启用全文索引")
+            return
+        names = _space.search_text(query)[:MAX_SHOWN] if query else []
+    elif query.startswith("^"):
+        names = _space.name_index.prefix(query[1:], MAX_SHOWN)
+    elif query:
+        names = _space.name_index.search(query, MAX_SHOWN)
+    else:
+        names = _space.name_index.prefix("", MAX_SHOWN)
+    if names:
+        listbox.insert(tk.END, *names)
+    total = len(_space.name_index)
+    shown = f"（仅显示前{MAX_SHOWN}项）" if len(names) >= MAX_SHOWN else ""
+    count_label.config(text=f"{len(names)}/{total}{shown}")
+
+
+def refresh_space_list() -> None:
+    """
+    刷新侧栏中的条目列表，可在任意线程中调用
+    """
+    root.after(0, _refresh)
+
+
+def show_space(space) -> None:
+    """
+    在侧栏中展示秘密空间的条目，传入 None 则清空
+    """
+    global _space
+    _space = space
+    refresh_space_list()
+
+
+def _on_double_click(_event=None):
+    selection = listbox.curselection()
+    if selection:
+        space_list_function.open_entry(listbox.get(selection[0]))
+
+
+def _on_content_toggle():
+    if content_var.get() and _space is not None and _space.fulltext is None:
+        space_list_function.enable_fulltext()
+    _refresh()
+
+
+search_var.trace_add("write", lambda *_args: _refresh())
+content_check.config(command=_on_content_toggle)
+listbox.bind("<Double-Button-1>", _on_double_click)
+listbox.bind("<Return>", _on_double_click)
@@ -269,6 +269,10 @@ class WaitWindow:
         Args:
             kwargs: 配置参数
         """
+        if "total_count" in kwargs:
+            self.total_count = kwargs["total_count"]
+            kwargs.setdefault("current_count", self.current_count)
+
         if "current_count" in kwargs:
             self.current_count = kwargs["current_count"]
             if self.window and self.progress_var: